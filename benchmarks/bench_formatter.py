@@ -0,0 +1,127 @@
+"""Compare MessageFormatter with the formatter it replaced, which goes through every field's descriptor each time it's
+printed. That one is timed appending every token to the Text, like it used to, and with buffered output.
+
+Usage: python benchmarks/bench_formatter.py [MessageName ...] [--repeat N]
+
+Every message is filled with made up values, repeated fields get N elements each (default 20), up to a nesting
+depth of 6. Without names, a few messages that get big in practice are used.
+"""
+
+import argparse
+import time
+
+from google.protobuf import descriptor
+from google.protobuf.message import Message
+from rich.console import Console
+from rich.segment import Segment
+from rich.style import Style
+from rich.text import Text
+
+from formatter_baseline import FieldFormatter
+from trafficlight import protos
+from trafficlight.proto_utils.proto_format import MessageFormatter
+
+DEFAULT_MESSAGES = ["GetMapObjectsOutProto", "GetInventoryOutProto", "GetPlayerOutProto"]
+MAX_DEPTH = 6
+
+
+class TextAppendFormatter(FieldFormatter):
+    """Appends to the Text right away, the way the formatter did before it buffered its output"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._text = Text()
+
+    @property
+    def out(self) -> Text:
+        return self._text
+
+    def append(self, text: str, style: Style | None = None) -> None:
+        self._text.append(text, style)
+
+
+def _value(field: descriptor.FieldDescriptor, i: int):
+    if field.type == descriptor.FieldDescriptor.TYPE_ENUM:
+        values = field.enum_type.values
+        return values[i % len(values)].number
+    if field.type == descriptor.FieldDescriptor.TYPE_BOOL:
+        return i % 2 == 0
+    if field.type == descriptor.FieldDescriptor.TYPE_STRING:
+        return f"{field.name} {i}"
+    if field.type == descriptor.FieldDescriptor.TYPE_BYTES:
+        return bytes(range(i % 8, i % 8 + 8))
+    if field.cpp_type in (descriptor.FieldDescriptor.CPPTYPE_FLOAT, descriptor.FieldDescriptor.CPPTYPE_DOUBLE):
+        return i * 1.5
+    return i
+
+
+def _fill(message: Message, repeat: int, depth: int = 0, i: int = 1) -> None:
+    for field in message.DESCRIPTOR.fields:
+        if field.containing_oneof is not None and field.containing_oneof.fields[0] is not field:
+            continue
+
+        is_message = field.cpp_type == descriptor.FieldDescriptor.CPPTYPE_MESSAGE
+        if is_message and (depth >= MAX_DEPTH or field.message_type.GetOptions().map_entry):
+            continue
+
+        if field.label == descriptor.FieldDescriptor.LABEL_REPEATED:
+            values = getattr(message, field.name)
+            for n in range(repeat):
+                if is_message:
+                    _fill(values.add(), max(1, repeat // 4), depth + 1, i + n)
+                else:
+                    values.append(_value(field, i + n))
+        elif is_message:
+            _fill(getattr(message, field.name), repeat, depth + 1, i)
+        else:
+            setattr(message, field.name, _value(field, i))
+
+
+def _render(text: Text) -> list[Segment]:
+    console = Console(width=200, color_system="truecolor", legacy_windows=False)
+    return list(Segment.simplify(console.render(text)))
+
+
+def _time(formatter_class: type[MessageFormatter] | type[FieldFormatter], message: Message, runs: int) -> float:
+    start = time.perf_counter()
+    for _ in range(runs):
+        formatter = formatter_class()
+        formatter.print_message(message)
+        formatter.out
+    return (time.perf_counter() - start) / runs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("messages", nargs="*", default=None)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    names = args.messages or [name for name in DEFAULT_MESSAGES if name in protos.DESCRIPTOR.message_types_by_name]
+    for name in names:
+        message = getattr(protos, name)()
+        _fill(message, args.repeat)
+
+        planned = MessageFormatter()
+        planned.print_message(message)
+        rendered = _render(planned.out)
+        for formatter_class in (TextAppendFormatter, FieldFormatter):
+            formatter = formatter_class()
+            formatter.print_message(message)
+            assert formatter.out.plain == planned.out.plain, (name, formatter_class.__name__)
+            assert _render(formatter.out) == rendered, (name, formatter_class.__name__)
+
+        runs = 5
+        append_time = _time(TextAppendFormatter, message, runs)
+        buffer_time = _time(FieldFormatter, message, runs)
+        plan_time = _time(MessageFormatter, message, runs)
+
+        lines = planned.out.plain.count("\n")
+        print(f"{name}: {message.ByteSize()} bytes, {lines} lines, {len(planned.out.spans)} spans")
+        print(f"  per field, Text.append: {append_time * 1000:8.1f} ms")
+        print(f"  per field, buffered:    {buffer_time * 1000:8.1f} ms ({append_time / buffer_time:.1f}x)")
+        print(f"  plans, buffered:        {plan_time * 1000:8.1f} ms ({append_time / plan_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
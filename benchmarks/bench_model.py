@@ -0,0 +1,57 @@
+"""Compare pydantic validation of incoming records with the fast path in trafficlight.model.
+
+Usage: python benchmarks/bench_model.py [recorded.ndjson]
+
+The file should contain one recorded POST body (a record or a list of records) per line.
+Without a file, a synthetic sample is used.
+"""
+
+import json
+import sys
+import timeit
+
+from trafficlight.model import RequestModel, parse_request
+
+
+def _load_records(path: str | None) -> list[dict]:
+    if path is None:
+        sample = {
+            "rpcid": 1234,
+            "rpcstatus": 1,
+            "rpchandle": 4321,
+            "protos": [
+                {"method": 106, "request": "CgQIARAB" * 8, "response": "EgQIARAB" * 256},
+                {"method": 2, "request": "", "response": "CAE="},
+            ],
+        }
+        aliased = {"contents": [{"type": 5012, "request": "CAE=", "payload": "CAE="}]}
+        return [sample, aliased] * 500
+
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            records.extend(data if isinstance(data, list) else [data])
+    return records
+
+
+def main() -> None:
+    records = _load_records(sys.argv[1] if len(sys.argv) > 1 else None)
+
+    for record in records:
+        assert parse_request(record) == RequestModel(**record), record
+
+    runs = 20
+    pydantic_time = timeit.timeit(lambda: [RequestModel(**r) for r in records], number=runs)
+    fast_time = timeit.timeit(lambda: [parse_request(r) for r in records], number=runs)
+
+    per_record = 1_000_000 / (len(records) * runs)
+    print(f"{len(records)} records, {runs} runs")
+    print(f"pydantic:  {pydantic_time * per_record:8.2f} µs/record")
+    print(f"fast path: {fast_time * per_record:8.2f} µs/record ({pydantic_time / fast_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Measure the startup time of `trafficlight show` and `trafficlight run`.
+
+Usage: python benchmarks/bench_startup.py [runs] [--cold]
+
+Every measurement runs in a fresh interpreter. `show` runs the whole command, `run` everything up to the point
+where the receiver would start listening. With --cold, the cached proto descriptor is deleted before every run.
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from trafficlight.cache import get_cache_dir
+
+COMMANDS = {
+    "cli show": "from trafficlight.cli import cli; cli(['show', 'GetMapObjectsOutProto'], standalone_mode=False)",
+    "cli run (print)": (
+        "from trafficlight.config import Output; from trafficlight.output import get_output; "
+        "from trafficlight.trafficlight import TrafficReceiver; "
+        "TrafficReceiver(get_output(Output.PRINT)).get_app()"
+    ),
+    "cli run (ui)": (
+        "from trafficlight.config import Output; from trafficlight.output import get_output; "
+        "from trafficlight.trafficlight import TrafficReceiver; "
+        "TrafficReceiver(get_output(Output.UI)).get_app()"
+    ),
+}
+
+
+def _clear_descriptor_cache() -> None:
+    for cache_file in get_cache_dir().glob("pogo_descriptor-*"):
+        cache_file.unlink()
+
+
+def _measure(code: str, cold: bool) -> float:
+    if cold:
+        _clear_descriptor_cache()
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True, stdout=subprocess.DEVNULL, env=os.environ.copy())
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    runs = int(args[0]) if args else 5
+    cold = "--cold" in sys.argv
+
+    # warm up the OS file cache and the descriptor cache
+    _measure(COMMANDS["cli show"], cold=False)
+
+    print(f"{runs} runs each, {'cold' if cold else 'warm'} descriptor cache")
+    for name, code in COMMANDS.items():
+        timings = [_measure(code, cold) for _ in range(runs)]
+        print(f"{name:<16} median {statistics.median(timings) * 1000:7.0f} ms   min {min(timings) * 1000:7.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""The formatter as it was before it compiled a plan per message type: every field is looked at through its
+descriptor each time it's printed. Kept unchanged, as the baseline for bench_formatter.py
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+from google.protobuf import descriptor, text_encoding
+from google.protobuf.message import Message
+from rich.style import Style
+from rich.text import Text
+
+from trafficlight.proto_utils.proto_format import (
+    BOOLEAN,
+    BRACKETS,
+    ENUM,
+    INDENT_GUIDE,
+    NUMBER,
+    OTHERVALUE,
+    STRING,
+    SUB_MESSAGE_NAME,
+    TYPE,
+    TYPES,
+    _STYLE_IDS,
+    _build_text,
+    _get_style_id,
+)
+
+
+class FieldFormatter:
+    def __init__(
+        self,
+        text: Text | None = None,
+        indent: int = 4,
+        indent_guides: bool = True,
+        one_line: bool = False,
+        types: bool = True,
+        type_emphasize: bool = False,
+    ):
+        self._out: Text | None = text
+        # what's been written since out was last built, with (start, end, style id) spans into it
+        self._parts: list[str] = []
+        self._length: int = 0
+        self._spans: list[tuple[int, int, int]] = []
+
+        self.indent_size = indent
+        self.current_indent: int = 1
+        self.type_emphasize: bool = type_emphasize
+
+        self._indent_guides: bool = indent_guides
+        self._one_line: bool = one_line
+        self._types: bool = types
+
+        self.__current_recursin_stack: list[str] = []
+
+    @property
+    def out(self) -> Text:
+        """Everything formatted so far. Text is only built here, in one go, as appending each token to it is slow"""
+        if self._parts or self._out is None:
+            text = _build_text("".join(self._parts), self._spans)
+            if self._out is None:
+                self._out = text
+            else:
+                self._out.append_text(text)
+
+            self._parts = []
+            self._length = 0
+            self._spans = []
+        return self._out
+
+    def append(self, text: str, style: Style | None = None) -> None:
+        start = self._length
+        end = self._length = start + len(text)
+        self._parts.append(text)
+
+        if style is not None:
+            style_id = _STYLE_IDS.get(style)
+            if style_id is None:
+                style_id = _get_style_id(style)
+
+            spans = self._spans
+            # tokens next to each other in the same style share a span
+            if spans and spans[-1][1] == start and spans[-1][2] == style_id:
+                spans[-1] = (spans[-1][0], end, style_id)
+            else:
+                spans.append((start, end, style_id))
+
+    def new_line(self) -> None:
+        if not self._one_line:
+            self.append("\n")
+
+    def add_indent(self) -> None:
+        if self._one_line:
+            indent_template = " "
+        elif self._indent_guides:
+            indent_template = ("│" + " " * (self.indent_size - 1)) * self.current_indent
+        else:
+            indent_template = " " * self.indent_size * self.current_indent
+
+        self.append(indent_template, style=INDENT_GUIDE)
+
+    def print_message(self, message: Message) -> None:
+        fields = message.ListFields()
+        fields = sorted(fields, key=lambda f: 1 if f[0].cpp_type == descriptor.FieldDescriptor.CPPTYPE_MESSAGE else 0)
+        # message fields should come last
+
+        for field, value in fields:
+            if self._is_map_entry(field):
+                for key in sorted(value):
+                    entry_submsg = value.GetEntryClass()(key=key, value=value[key])
+                    self.print_field(field, entry_submsg)
+            elif field.label == descriptor.FieldDescriptor.LABEL_REPEATED:
+                for element in value:
+                    self.print_field(field, element)
+            else:
+                self.print_field(field, value)
+
+    @staticmethod
+    def _is_map_entry(field: descriptor.FieldDescriptor) -> bool:
+        return (
+            field.type == descriptor.FieldDescriptor.TYPE_MESSAGE
+            and field.message_type.has_options
+            and field.message_type.GetOptions().map_entry
+        )
+
+    def print_field(self, field: descriptor.FieldDescriptor, value: Any) -> None:
+        """Print a single field name/value pair."""
+        self._print_field_name(field)
+        self.append(" ")
+        self.print_field_value(field, value)
+        self.new_line()
+
+    def _print_field_name(self, field: descriptor.FieldDescriptor) -> None:
+        self.add_indent()
+
+        def _add_repeated():
+            if field.label == descriptor.FieldDescriptor.LABEL_REPEATED:
+                self.append(" repeated", style=TYPE)
+
+        if field.is_extension:
+            self.append("[", style=BRACKETS)
+            if (
+                field.containing_type.GetOptions().message_set_wire_format
+                and field.type == descriptor.FieldDescriptor.TYPE_MESSAGE
+                and field.label == descriptor.FieldDescriptor.LABEL_OPTIONAL
+            ):
+                self.append(field.message_type.full_name)
+            else:
+                self.append(field.full_name)
+            self.append("]", style=BRACKETS)
+        elif field.type == descriptor.FieldDescriptor.TYPE_GROUP:
+            # For groups, use the capitalized name.
+            self.append(field.message_type.name)
+        elif field.cpp_type == descriptor.FieldDescriptor.CPPTYPE_MESSAGE:
+            self.new_line()
+            self.add_indent()
+
+            if self.type_emphasize:
+                self.append(field.name + ": ")
+                self.append(field.message_type.name, style=SUB_MESSAGE_NAME)
+                _add_repeated()
+            else:
+                if self._types:
+                    self.append(field.message_type.name + " ", style=SUB_MESSAGE_NAME)
+                self.append(field.name)
+        elif field.enum_type is not None and self.type_emphasize:
+            self.new_line()
+            self.add_indent()
+
+            self.append(field.name + ": ")
+
+            full_name = field.enum_type.name
+            containg_type: descriptor.Descriptor | None = field.enum_type.containing_type
+
+            if containg_type is not None:
+                i = field.enum_type.full_name.find(field.enum_type.containing_type.name)
+                if i > 0:
+                    full_name = field.enum_type.full_name[i:]
+            self.append(full_name, style=ENUM)
+            _add_repeated()
+        else:
+            type_name = TYPES.get(field.type)
+
+            if self.type_emphasize:
+                self.append(field.name + ": ")
+
+                if field.cpp_type == descriptor.FieldDescriptor.CPPTYPE_STRING:
+                    style = STRING
+                elif field.cpp_type == descriptor.FieldDescriptor.CPPTYPE_BOOL:
+                    style = BOOLEAN
+                elif field.cpp_type in (
+                    descriptor.FieldDescriptor.CPPTYPE_FLOAT,
+                    descriptor.FieldDescriptor.CPPTYPE_DOUBLE,
+                ):
+                    style = NUMBER
+                elif field.cpp_type in (
+                    descriptor.FieldDescriptor.CPPTYPE_INT32,
+                    descriptor.FieldDescriptor.CPPTYPE_INT64,
+                    descriptor.FieldDescriptor.CPPTYPE_UINT32,
+                    descriptor.FieldDescriptor.CPPTYPE_UINT64,
+                ):
+                    style = NUMBER
+                else:
+                    style = OTHERVALUE
+
+                self.append(type_name, style=style)
+                _add_repeated()
+            else:
+                if type_name is not None and self._types:
+                    self.append(f"{type_name} ", style=TYPE)
+                self.append(field.name)
+
+    def print_field_value(self, field: descriptor.FieldDescriptor, value: Any) -> None:
+        """Print a single field value (not including name).
+
+        For repeated fields, the value should be a single element.
+
+        Args:
+          field: The descriptor of the field to be printed.
+          value: The value of the field.
+        """
+        if field.cpp_type == descriptor.FieldDescriptor.CPPTYPE_MESSAGE:
+            self.print_message_field_value(value)
+        elif field.cpp_type == descriptor.FieldDescriptor.CPPTYPE_ENUM:
+            enum_value = field.enum_type.values_by_number.get(value, None)
+            if enum_value is not None:
+                self.append(f"{field.enum_type.name}.{enum_value.name}:{value}", style=ENUM)
+            else:
+                self.append(str(value), style=ENUM)
+        elif field.cpp_type == descriptor.FieldDescriptor.CPPTYPE_STRING:
+            self.append('"', style=STRING)
+            if field.type == descriptor.FieldDescriptor.TYPE_BYTES:
+                # We always need to escape all binary data in TYPE_BYTES fields.
+                out_as_utf8 = False
+            else:
+                out_as_utf8 = True
+            self.append(text_encoding.CEscape(value, out_as_utf8), style=STRING)
+            self.append('"', style=STRING)
+        elif field.cpp_type == descriptor.FieldDescriptor.CPPTYPE_BOOL:
+            if value:
+                self.append("true", style=BOOLEAN)
+            else:
+                self.append("false", style=BOOLEAN)
+        elif field.cpp_type in (descriptor.FieldDescriptor.CPPTYPE_FLOAT, descriptor.FieldDescriptor.CPPTYPE_DOUBLE):
+            self.append(str(value), style=NUMBER)
+        elif field.cpp_type in (
+            descriptor.FieldDescriptor.CPPTYPE_INT32,
+            descriptor.FieldDescriptor.CPPTYPE_INT64,
+            descriptor.FieldDescriptor.CPPTYPE_UINT32,
+            descriptor.FieldDescriptor.CPPTYPE_UINT64,
+        ):
+            self.append(str(value), style=NUMBER)
+        else:
+            self.append(str(value), style=OTHERVALUE)
+
+    def print_message_field_value(self, value: Message) -> None:
+        if not value.ListFields():
+            self.append("{}", style=BRACKETS)
+        else:
+            self.append("{", style=BRACKETS)
+            self.new_line()
+            self.current_indent += 1
+            self.print_message(value)
+            self.current_indent -= 1
+            self.add_indent()
+            self.append("}", style=BRACKETS)
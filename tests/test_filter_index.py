@@ -0,0 +1,104 @@
+import base64
+from datetime import datetime
+
+from trafficlight import protos
+from trafficlight.proto_utils import Proto
+from trafficlight.tui.filter_index import FilterIndex
+from trafficlight.tui.models import Mode
+from trafficlight.tui.records import Record, RecordStore
+
+
+def _record(rpc_id: int, name: str) -> Record:
+    response = protos.GetPlayerOutProto(success=True)
+    response.player.name = name
+    payload = base64.b64encode(response.SerializeToString()).decode()
+    return Record(datetime.now(), rpc_id, 1, [Proto(rpc_id, 2, "", payload)])
+
+
+def _index(max_records: int = 0) -> tuple[RecordStore, FilterIndex]:
+    store = RecordStore(max_records=max_records)
+    return store, FilterIndex(store)
+
+
+def _add(store: RecordStore, index: FilterIndex, records: list[Record]) -> None:
+    evicted = store.add(records)
+    index.add([record for record in records if store.get(record.id) is record])
+    if evicted:
+        index.remove(evicted)
+
+
+def test_names():
+    store, index = _index()
+    _add(store, index, [_record(0, "ash"), _record(1, "misty")])
+
+    assert index.candidates(Mode.FILTER_METHODS, "get_player") == {0, 1}
+    assert index.candidates(Mode.FILTER_MESSAGES, "getplayerout") == {0, 1}
+    assert index.candidates(Mode.FILTER_MESSAGES, "encounter") == set()
+    assert index.candidates(Mode.FILTER_METHODS, "") is None
+
+
+def test_text_is_only_indexed_by_the_worker(monkeypatch):
+    store, index = _index()
+    _add(store, index, [_record(0, "ash"), _record(1, "misty")])
+    # nothing is indexed before the first text search
+    assert index.candidates(Mode.FILTER_TEXT, "misty") is None
+
+    index.update_text()
+    assert set(index.candidates(Mode.FILTER_TEXT, "misty")) == {1}
+
+    decoded = []
+    monkeypatch.setattr(Record, "get_text", lambda record, i: decoded.append(record.id) or "")
+    _add(store, index, [_record(2, "misty"), _record(3, "brock")])
+    assert decoded == []
+    # records that aren't indexed yet can always match
+    assert set(index.candidates(Mode.FILTER_TEXT, "misty")) == {1, 2, 3}
+    monkeypatch.undo()
+
+    index.update_text()
+    assert set(index.candidates(Mode.FILTER_TEXT, "misty")) == {1, 2}
+    assert set(index.candidates(Mode.FILTER_TEXT, "brock")) == {3}
+    assert set(index.candidates(Mode.FILTER_TEXT, "gary")) == set()
+
+
+def test_cancelled_update_keeps_the_rest_queued():
+    store, index = _index()
+    _add(store, index, [_record(i, f"trainer{i}") for i in range(4)])
+
+    calls = []
+    index.update_text(lambda: calls.append(None) or len(calls) > 2)
+    assert set(index.candidates(Mode.FILTER_TEXT, "trainer")) == {0, 1, 2, 3}
+    assert set(index.candidates(Mode.FILTER_TEXT, "trainer1")) == {1, 2, 3}
+
+    index.update_text()
+    assert set(index.candidates(Mode.FILTER_TEXT, "trainer1")) == {1}
+
+
+def test_eviction():
+    store, index = _index(max_records=3)
+    _add(store, index, [_record(i, f"trainer{i}") for i in range(3)])
+    index.update_text()
+
+    _add(store, index, [_record(3, "trainer3"), _record(4, "trainer4")])
+    assert set(index.candidates(Mode.FILTER_TEXT, "trainer")) == {2, 3, 4}
+    index.update_text()
+    assert set(index.candidates(Mode.FILTER_TEXT, "trainer")) == {2, 3, 4}
+    assert index.candidates(Mode.FILTER_MESSAGES, "getplayerout") == {2, 3, 4}
+
+    # enough evicted records get them dropped from the index
+    _add(store, index, [_record(5 + i, f"trainer{5 + i}") for i in range(5)])
+    index.update_text()
+    assert set(index.candidates(Mode.FILTER_TEXT, "trainer")) == {7, 8, 9}
+
+
+def test_clear_during_update():
+    store, index = _index()
+    _add(store, index, [_record(0, "ash")])
+
+    def clear() -> bool:
+        index.clear()
+        store.clear()
+        return False
+
+    index.update_text(clear)
+    # what the update found before the clear isn't added afterwards
+    assert index.candidates(Mode.FILTER_TEXT, "ash") is None
@@ -0,0 +1,80 @@
+import base64
+import threading
+
+from trafficlight import protos
+from trafficlight.proto_utils import Proto
+from trafficlight.proto_utils.proto import DecodeCache, Request, Respone
+
+
+def _player(name: str) -> Proto:
+    response = protos.GetPlayerOutProto(success=True)
+    response.player.name = name
+    return Proto(1, 2, "", base64.b64encode(response.SerializeToString()).decode())
+
+
+def test_lazy_attributes():
+    proto = _player("ash")
+
+    assert proto.response.name == "GetPlayerOutProto"
+    assert proto.response.payload.player.name == "ash"
+    assert proto.response.payload is proto.response.payload
+    assert proto.response.blackbox is None
+    assert proto.proxy is None
+    assert proto.rendered is proto.rendered
+
+
+def test_cached_payloads_are_copies():
+    first, second = _player("gary").response, _player("gary").response
+    assert first.payload == second.payload
+    assert first.payload is not second.payload
+
+    first.payload.player.name = "changed"
+    assert _player("gary").response.payload.player.name == "gary"
+
+
+def test_cache_copies_on_every_get():
+    cache = DecodeCache(max_entries=10, max_bytes=1000)
+    created = cache.get_or_create("key", lambda: {"a": [1]}, lambda _: 1, copy=lambda value: {"a": list(value["a"])})
+    created["a"].append(2)
+
+    cached = cache.get_or_create("key", lambda: {"a": []}, lambda _: 1, copy=lambda value: {"a": list(value["a"])})
+    assert cached == {"a": [1]}
+    assert cache.hits == 1
+
+
+def test_round_trip_through_decoded():
+    proto = Proto.from_decoded(1, _player("misty").to_decoded())
+
+    assert proto.proxy is None
+    assert proto.response.payload.player.name == "misty"
+    assert proto.response.has_payload
+
+
+def test_decoding_in_another_thread_doesnt_block():
+    # both have to be decoded for the first time, no other test may use these names
+    stuck = _player("slow to decode").response
+    started, release = threading.Event(), threading.Event()
+    decode = Respone.decode_proto
+
+    def decode_slowly(message):
+        if message is stuck:
+            started.set()
+            release.wait(5)
+        return decode(message)
+
+    Respone.decode_proto = decode_slowly
+    try:
+        thread = threading.Thread(target=lambda: stuck.payload)
+        thread.start()
+        assert started.wait(5)
+
+        # a different message decodes while the other thread is still busy
+        other = _player("decoded meanwhile")
+        assert other.response.payload.player.name == "decoded meanwhile"
+        assert isinstance(other.request, Request)
+        assert thread.is_alive()
+    finally:
+        release.set()
+        Respone.decode_proto = decode
+        thread.join()
+    assert stuck.payload.player.name == "slow to decode"
@@ -0,0 +1,133 @@
+import base64
+
+import pytest
+
+from trafficlight import protos
+from trafficlight.proto_utils import Proto, QueryError, compile_query
+from trafficlight.proto_utils.query import _tokenize
+
+
+def _map_objects(*pokemon: tuple[int, int], status: int = 1) -> Proto:
+    response = protos.GetMapObjectsOutProto(status=status)
+    cell = response.map_cell.add(s2_cell_id=7)
+    for pokemon_id, cp in pokemon:
+        wild = cell.wild_pokemon.add()
+        wild.pokemon.pokemon_id = pokemon_id
+        wild.pokemon.cp = cp
+    return Proto(1, 106, "", base64.b64encode(response.SerializeToString()).decode())
+
+
+def _player(name: str, success: bool = True) -> Proto:
+    response = protos.GetPlayerOutProto(success=success)
+    response.player.name = name
+    return Proto(1, 2, "", base64.b64encode(response.SerializeToString()).decode())
+
+
+PIKACHU = protos.HoloPokemonId.Value("PIKACHU")
+BULBASAUR = protos.HoloPokemonId.Value("BULBASAUR")
+
+
+def test_tokenize():
+    assert _tokenize("a.b==\"x y\" and c<='it\\'s'") == [
+        ("word", "a.b"),
+        ("op", "=="),
+        ("string", "x y"),
+        ("word", "and"),
+        ("word", "c"),
+        ("op", "<="),
+        ("string", "it's"),
+    ]
+    assert _tokenize("  ") == []
+
+
+def test_groups():
+    query = compile_query("response.success or GetPlayerOutProto.player.name == ash and response.status == success")
+    assert [len(group) for group in query.groups] == [1, 2]
+    assert query.message_names is None
+
+    query = compile_query("getmapobjectsoutproto.status == 1 or GetPlayerOutProto.success == true")
+    assert query.message_names == {"GetMapObjectsOutProto", "GetPlayerOutProto"}
+
+
+@pytest.mark.parametrize(
+    "text, error",
+    [
+        ("", "empty query"),
+        ("foo.bar", "unknown message foo"),
+        ("GetPlayerOutProto", "a path needs at least one field"),
+        ("GetPlayerOutProto.nope", "GetPlayerOutProto has no field nope"),
+        ("GetPlayerOutProto.player == 1", "player is a message"),
+        ("GetPlayerOutProto.success == yes", "success is a bool"),
+        ("GetMapObjectsOutProto.status == bogus", "bogus isn't a value of"),
+        ("GetMapObjectsOutProto.map_cell.s2_cell_id > x", "s2_cell_id is a number, x isn't"),
+        ("GetPlayerOutProto.success.x", "success isn't a message"),
+        ("GetPlayerOutProto.success ==", "== needs a value"),
+        ("GetPlayerOutProto.success and", "and needs another condition"),
+        ("GetPlayerOutProto.success xor response.status", 'expected "and" or "or" instead of xor'),
+        ("== 1", "expected a path instead of =="),
+    ],
+)
+def test_errors(text, error):
+    with pytest.raises(QueryError, match=error):
+        compile_query(text)
+
+
+def test_error_of_best_match():
+    # only some responses have map_cell, the error is about the one that does
+    with pytest.raises(QueryError, match="map_cell is a message, it can only be checked for being set"):
+        compile_query("response.map_cell == 1")
+    with pytest.raises(QueryError, match="s2_cell_id is a number"):
+        compile_query("response.map_cell.s2_cell_id == abc")
+
+
+def _matches(text: str, proto: Proto) -> bool:
+    return compile_query(text).matches(proto)
+
+
+def test_match_values():
+    proto = _map_objects((PIKACHU, 10), (BULBASAUR, 500))
+
+    assert _matches("GetMapObjectsOutProto.map_cell.wild_pokemon.pokemon.pokemon_id == PIKACHU", proto)
+    assert _matches("response.status == success", proto)
+    assert not _matches("response.status == error", proto)
+    assert _matches("response.map_cell.s2_cell_id == 7", proto)
+    assert _matches("response.map_cell.wild_pokemon.pokemon.cp > 400", proto)
+    assert not _matches("response.map_cell.wild_pokemon.pokemon.cp > 500", proto)
+
+    assert _matches("GetPlayerOutProto.player.name == ASH", _player("Ash"))
+    assert _matches("GetPlayerOutProto.player.name == 'ash'", _player("Ash"))
+    assert not _matches("GetPlayerOutProto.player.name == misty", _player("Ash"))
+
+
+def test_match_repeated():
+    proto = _map_objects((PIKACHU, 10), (BULBASAUR, 500))
+
+    # any element can match, != only if none does
+    assert _matches("response.map_cell.wild_pokemon.pokemon.pokemon_id == bulbasaur", proto)
+    assert not _matches("response.map_cell.wild_pokemon.pokemon.pokemon_id != bulbasaur", proto)
+    assert _matches("response.map_cell.wild_pokemon.pokemon.pokemon_id != 4", proto)
+    # nothing to compare isn't a match either
+    assert not _matches("response.map_cell.wild_pokemon.pokemon.pokemon_id != 4", _map_objects())
+
+
+def test_match_set():
+    assert _matches("response.map_cell", _map_objects())
+    assert not _matches("response.map_cell.wild_pokemon", _map_objects())
+    assert _matches("GetPlayerOutProto.player", _player(""))
+    assert not _matches("response.success", _player("ash", success=False))
+
+
+def test_match_kinds_and_groups():
+    proto = _player("ash")
+
+    assert _matches("message.success", proto)
+    with pytest.raises(QueryError, match="no request matches request.success"):
+        compile_query("request.success")
+    assert not _matches("GetMapObjectsOutProto.status == success", proto)
+
+    assert _matches("response.success and GetPlayerOutProto.player.name == ash", proto)
+    assert not _matches("response.success and GetPlayerOutProto.player.name == misty", proto)
+    assert _matches("response.status == success or GetPlayerOutProto.player.name == ash", proto)
+    # "and" binds tighter than "or"
+    assert _matches("response.status == success and response.success or response.success", proto)
+    assert not _matches("response.status == success or response.success and response.status == 1", proto)
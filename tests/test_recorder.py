@@ -0,0 +1,146 @@
+import base64
+import struct
+
+import pytest
+
+from trafficlight.model import parse_request
+from trafficlight.recorder import INDEX_MAGIC, SessionReader, SessionRecorder, _INDEX_ENTRY
+
+
+def _request(rpc_id: int, methods: list[int], base64_payloads: bool = False):
+    raw = bytes([rpc_id % 256]) * 4
+    payload = base64.b64encode(raw).decode() if base64_payloads else raw
+    return parse_request(
+        {
+            "rpcid": rpc_id,
+            "rpchandle": None,
+            "rpcstatus": 1,
+            "contents": [{"type": method, "request": payload, "payload": b""} for method in methods],
+        }
+    )
+
+
+def _record(path, *batches, received_from: float = 1000.0):
+    recorder = SessionRecorder(path, sync_interval=0)
+    recorder.start()
+    for i, batch in enumerate(batches):
+        recorder.record(batch, received_from + i)
+    recorder.close()
+    return recorder
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "session.tlrec"
+    recorder = _record(path, [_request(1, [10, 11])], [_request(2, [12], base64_payloads=True)])
+    assert recorder.stats.recorded == 2
+    assert recorder.stats.failed == 0
+
+    records = list(SessionReader(path))
+    assert [record["rpcid"] for record in records] == [1, 2]
+    assert records[0]["time"] == 1000.0
+    assert [proto["method"] for proto in records[0]["protos"]] == [10, 11]
+    # base64 payloads are stored as the bytes they stand for
+    assert records[1]["protos"][0]["request"] == bytes([2]) * 4
+
+
+def test_append(tmp_path):
+    path = tmp_path / "session.tlrec"
+    _record(path, [_request(1, [10])])
+    _record(path, [_request(2, [10])], received_from=2000.0)
+
+    reader = SessionReader(path)
+    assert [record["rpcid"] for record in reader] == [1, 2]
+    assert [reader.read(offset)["rpcid"] for offset in reader.find(method=10)] == [1, 2]
+
+
+def test_find(tmp_path):
+    path = tmp_path / "session.tlrec"
+    _record(path, *([_request(i, [i % 3, 100])] for i in range(10)))
+    reader = SessionReader(path)
+
+    assert [reader.read(offset)["rpcid"] for offset in reader.find(method=1)] == [1, 4, 7]
+    # a record is found once, even with several matching protos
+    assert len(reader.find()) == 10
+    assert len(reader.find(method=100)) == 10
+    assert [reader.read(offset)["rpcid"] for offset in reader.find(start=1002, end=1004)] == [2, 3, 4]
+    assert [reader.read(offset)["rpcid"] for offset in reader.find(method=0, start=1002.5)] == [3, 6, 9]
+    assert reader.find(method=5) == []
+
+
+def test_method_out_of_range(tmp_path):
+    path = tmp_path / "session.tlrec"
+    recorder = _record(path, [_request(1, [-1])], [_request(2, [2**64])], [_request(3, [3])])
+
+    assert recorder.stats.recorded == 2
+    assert recorder.stats.failed == 1
+    reader = SessionReader(path)
+    assert [record["rpcid"] for record in reader] == [1, 3]
+    assert len(reader.find(method=-1)) == 1
+
+
+def test_record_without_writer(tmp_path):
+    recorder = SessionRecorder(tmp_path / "session.tlrec")
+    recorder.record([_request(1, [1])])
+    assert recorder.stats.failed == 1
+    assert recorder.get_stats()["running"] is False
+    assert recorder.pending == 0
+
+
+def test_recover_partial_frame(tmp_path):
+    path = tmp_path / "session.tlrec"
+    _record(path, [_request(1, [1])])
+    with open(path, "ab") as file:
+        file.write(struct.pack(">I", 100) + b"cut off")
+    with open(str(path) + ".idx", "ab") as file:
+        file.write(b"\x01\x02")
+
+    _record(path, [_request(2, [2])])
+    reader = SessionReader(path)
+    assert [record["rpcid"] for record in reader] == [1, 2]
+    assert [reader.read(offset)["rpcid"] for offset in reader.find()] == [1, 2]
+
+
+def test_recover_missing_index_entries(tmp_path):
+    path = tmp_path / "session.tlrec"
+    index_path = tmp_path / "session.tlrec.idx"
+    _record(path, [_request(1, [1])], [_request(2, [1, 2, 3])])
+
+    # the last record's frame made it, only one of its index entries didn't
+    index = index_path.read_bytes()
+    index_path.write_bytes(index[: -_INDEX_ENTRY.size])
+    _record(path)
+
+    reader = SessionReader(path)
+    assert reader.methods == [1, 1, 2, 3]
+    assert [reader.read(offset)["rpcid"] for offset in reader.find(method=3)] == [2]
+
+
+def test_recover_lost_index(tmp_path):
+    path = tmp_path / "session.tlrec"
+    index_path = tmp_path / "session.tlrec.idx"
+    _record(path, [_request(1, [1])], [_request(2, [2])])
+
+    index_path.write_bytes(INDEX_MAGIC)
+    _record(path)
+    assert SessionReader(path).methods == [1, 2]
+
+
+def test_recover_index_past_data(tmp_path):
+    path = tmp_path / "session.tlrec"
+    _record(path, [_request(1, [1])], [_request(2, [2, 3])])
+    path.write_bytes(path.read_bytes()[:-3])
+
+    _record(path)
+    reader = SessionReader(path)
+    assert [record["rpcid"] for record in reader] == [1]
+    assert reader.methods == [1]
+
+
+def test_not_a_recording(tmp_path):
+    path = tmp_path / "other"
+    path.write_bytes(b"hello")
+
+    with pytest.raises(ValueError):
+        SessionRecorder(path).start()
+    assert path.read_bytes() == b"hello"
+    assert not (tmp_path / "other.idx").exists()
@@ -0,0 +1,173 @@
+import asyncio
+import base64
+import threading
+from datetime import datetime
+
+from trafficlight import protos
+from trafficlight.proto_utils import Proto
+from trafficlight.tui import TrafficLightGui
+from trafficlight.tui.models import Mode
+from trafficlight.tui.records import Record, RecordStore
+from trafficlight.tui.widget_request import RequestWidget
+
+
+def _record(rpc_id: int, size: int = 0) -> Record:
+    return Record(time=datetime.now(), rpc_id=rpc_id, rpc_status=1, protos=[Proto(rpc_id, 2, b"x" * size, b"")])
+
+
+def _player_record(rpc_id: int) -> Record:
+    response = protos.GetPlayerOutProto(success=True)
+    response.player.name = f"worker{rpc_id}"
+    payload = base64.b64encode(response.SerializeToString()).decode()
+    return Record(datetime.now(), rpc_id, 1, [Proto(rpc_id, 2, "", payload)])
+
+
+def test_ids():
+    store = RecordStore()
+    records = [_record(i) for i in range(5)]
+    assert store.add(records) == []
+
+    assert [record.id for record in records] == [0, 1, 2, 3, 4]
+    assert store.next_id == 5
+    assert store.get(3) is records[3]
+    assert store.get(5) is None
+    assert store.get(-1) is None
+
+
+def test_evict_by_count():
+    store = RecordStore(max_records=3)
+    records = [_record(i, size=10) for i in range(5)]
+    evicted = store.add(records[:2])
+    assert evicted == []
+
+    evicted = store.add(records[2:])
+    assert evicted == records[:2]
+    assert list(store) == records[2:]
+    assert store.size == 30
+    assert store.get(1) is None
+    assert store.get(2) is records[2]
+    assert store.next_id == 5
+
+
+def test_evict_by_bytes():
+    store = RecordStore(max_bytes=25)
+    records = [_record(i, size=10) for i in range(4)]
+
+    assert store.add(records) == records[:2]
+    assert store.size == 20
+    # the newest record is kept even when it's over the limit on its own
+    big = _record(4, size=100)
+    assert store.add([big]) == records[2:]
+    assert list(store) == [big]
+    assert store.size == 100
+
+
+def test_clear_keeps_ids():
+    store = RecordStore()
+    store.add([_record(i, size=10) for i in range(3)])
+    store.clear()
+    assert len(store) == 0
+    assert store.size == 0
+
+    record = _record(3)
+    store.add([record])
+    assert record.id == 3
+    assert store.get(3) is record
+
+
+def _run_app(test) -> None:
+    async def run() -> None:
+        app = TrafficLightGui()
+        async with app.run_test(size=(120, 40)) as pilot:
+            await test(app, pilot)
+
+    asyncio.run(run())
+
+
+def _check_window(screen) -> None:
+    assert screen._visible == [record.id for record in screen.records]
+    _check_visible_window(screen)
+
+
+def _check_visible_window(screen) -> None:
+    assert 0 <= screen._start <= screen._end <= len(screen._visible)
+    assert len(screen._mounted) <= screen.WINDOW_SIZE
+    assert [widget.record.id for widget in screen._mounted] == screen._visible[screen._start : screen._end]
+    assert list(screen.query(RequestWidget)) == screen._mounted
+
+
+def test_window_with_eviction():
+    async def test(app, pilot) -> None:
+        screen = app.screen_widget
+        screen.records.max_records = 100
+
+        for batch in range(25):
+            await screen.add_records([_record(batch * 10 + i) for i in range(10)])
+            _check_window(screen)
+        await pilot.pause(0.1)
+
+        assert len(screen.records) == 100
+        assert screen._visible[0] == 150
+        assert len(screen._mounted) == screen.WINDOW_SIZE
+
+        # the window is kept inside the records that are left
+        await screen._set_window(10**6)
+        assert screen._end == len(screen._visible)
+        _check_window(screen)
+        await screen._set_window(-5)
+        assert screen._start == 0
+        _check_window(screen)
+
+        # evicting everything that has widgets moves the window along
+        await screen.add_records([_record(250 + i) for i in range(80)])
+        _check_window(screen)
+        assert screen._visible[0] == 230
+
+    _run_app(test)
+
+
+def test_live_drops_evicted():
+    async def test(app, pilot) -> None:
+        screen = app.screen_widget
+        screen.records.max_records = 5
+        await screen.add_records([_record(i) for i in range(8)])
+
+        matches, visible = screen._live({1: [0], 2: [0], 4: [0], 6: [0]}, [1, 2, 4, 6])
+        assert visible == [4, 6]
+        assert matches == {4: [0], 6: [0]}
+
+    _run_app(test)
+
+
+def test_new_records_are_matched_in_the_worker():
+    async def test(app, pilot) -> None:
+        screen = app.screen_widget
+        await screen.add_records([_player_record(i) for i in range(30)])
+
+        app.current_mode = Mode.FILTER_TEXT
+        app.filter_text = "worker1"
+        await pilot.pause(0.5)
+        while screen.text_search.running or screen._lock.locked():
+            await pilot.pause(0.05)
+        assert screen._visible == [1] + list(range(10, 20))
+
+        threads = set()
+        match = Record.filter
+
+        def filter_in_thread(record, *args, **kwargs):
+            threads.add(threading.current_thread())
+            return match(record, *args, **kwargs)
+
+        Record.filter = filter_in_thread
+        try:
+            await screen.add_records([_player_record(30 + i) for i in range(90)])
+            while screen._match_task is not None and not screen._match_task.done():
+                await pilot.pause(0.05)
+        finally:
+            Record.filter = match
+
+        assert threads and threading.main_thread() not in threads
+        assert screen._visible == [1] + list(range(10, 20)) + list(range(100, 120))
+        _check_visible_window(screen)
+
+    _run_app(test)
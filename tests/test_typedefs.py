@@ -0,0 +1,26 @@
+import json
+
+from trafficlight.proto_utils.proto import Request, Respone
+from trafficlight.proto_utils.typedefs import TypedefCache
+
+TYPEDEF = {"1": {"type": "int", "name": ""}}
+
+
+def test_save_keys(tmp_path):
+    path = str(tmp_path / "typedefs.json")
+    cache = TypedefCache(path)
+    cache.learn(Request.direction, 2, TYPEDEF)
+    cache.learn(Respone.direction, 2, TYPEDEF)
+    cache.save()
+
+    with open(path, encoding="utf-8") as f:
+        assert set(json.load(f)) == {"Request:2", "Response:2"}
+    assert TypedefCache(path).get("Response", 2) == TYPEDEF
+
+
+def test_load_misspelled_keys(tmp_path):
+    path = tmp_path / "typedefs.json"
+    path.write_text(json.dumps({"Respone:106": TYPEDEF}), encoding="utf-8")
+
+    cache = TypedefCache(str(path))
+    assert cache.get(Respone.direction, 106) == TYPEDEF
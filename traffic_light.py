@@ -1,3 +1,4 @@
 from trafficlight.trafficlight import run
 
-run()
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+
+def get_cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return Path(base) / "trafficlight"
+
+
+def file_stamp(path: str | Path) -> str:
+    """Changes whenever the file is replaced or modified"""
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def read_cache(name: str) -> bytes | None:
+    try:
+        return (get_cache_dir() / name).read_bytes()
+    except OSError:
+        return None
+
+
+def write_cache(name: str, data: bytes, prefix: str | None = None) -> None:
+    """Write a cache file. If given, other cache files starting with prefix are removed, since they're outdated"""
+    cache_dir = get_cache_dir()
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        if prefix is not None:
+            for old_file in cache_dir.glob(prefix + "*"):
+                old_file.unlink(missing_ok=True)
+
+        temp_path = cache_dir / (name + ".tmp")
+        temp_path.write_bytes(data)
+        temp_path.replace(cache_dir / name)
+    except OSError as e:
+        print(f"Couldn't write cache file {name}: {e}")
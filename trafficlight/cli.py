@@ -1,3 +1,5 @@
+import sys
+
 import click
 
 
@@ -8,25 +10,51 @@ def cli():
 
 @click.command()
 @click.argument("message")
-def show(message: str):
+@click.option("--top", type=click.IntRange(min=1), default=None, help="List the N closest matches and pick one of them")
+@click.option(
+    "--depth", type=click.IntRange(min=1), default=None, help="Show N levels of fields, 1 is the message's own"
+)
+@click.option("--json", "as_json", is_flag=True, help="Print the layout of the message and its nested types as JSON")
+def show(message: str, top: int | None, depth: int | None, as_json: bool):
     from rich import print
-    from thefuzz import process
 
     from trafficlight import protos
+    from trafficlight.proto_utils.name_index import NameIndex
     from trafficlight.proto_utils.proto_format import MessageFormatter
 
+    index = NameIndex.load()
+
+    if top is None:
+        name = index.search(message)[0][0]
+    else:
+        matches = index.search(message, limit=top)
+        for i, (match, score) in enumerate(matches, start=1):
+            click.echo(f"{i:>3}. {match} ({score})")
+
+        if not sys.stdin.isatty():
+            return
+        choice = click.prompt("Show", type=click.IntRange(1, len(matches)), default=1)
+        name = matches[choice - 1][0]
+
     message_map = {**protos.DESCRIPTOR.message_types_by_name, **protos.DESCRIPTOR.enum_types_by_name}
+    message_type = message_map[name]
 
-    result = process.extractOne(message, message_map.keys())
-    message = message_map[result[0]]
+    if as_json:
+        import json
+
+        from trafficlight.proto_utils.schema import get_schema
+
+        click.echo(json.dumps(get_schema(message_type, depth), indent=2))
+        return
 
     formatter = MessageFormatter(type_emphasize=True)
-    print(formatter.format_message_type(message))
+    print(formatter.format_message_type(message_type, depth))
 
 
 @click.command()
 def run():
     from trafficlight.trafficlight import run as start_tl
+
     start_tl()
 
 
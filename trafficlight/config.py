@@ -13,11 +13,30 @@ class Output(Enum):
     DISCORD = "discord"
 
 
+class Backpressure(Enum):
+    BLOCK = "block"
+    DROP_OLDEST = "drop_oldest"
+    REJECT = "reject"
+
+
 class Config(BaseModel):
     host: str = "0.0.0.0"
     port: int = 3335
     output: Output = Output.UI
     webhook: str = ""
+    queue_size: int = 1000
+    decode_workers: int = 2
+    backpressure: Backpressure = Backpressure.BLOCK
+    decode_processes: int = 0
+    decode_cache_size: int = 2048
+    decode_cache_bytes: int = 64 * 1024 * 1024
+    typedef_file: str = "typedefs.json"
+    ui_max_records: int = 10000
+    ui_max_bytes: int = 256 * 1024 * 1024
+    pause_buffer_size: int = 10000
+    pause_overflow: Backpressure = Backpressure.DROP_OLDEST
+    record_file: str = ""
+    record_sync_interval: float = 1.0
 
 
 try:
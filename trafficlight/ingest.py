@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import asyncio
+import traceback
+from typing import Awaitable, Callable, Sequence
+
+from .config import Backpressure
+from .model import RequestModel
+
+
+class QueueFull(Exception):
+    """The queue has no room left and the backpressure policy is REJECT"""
+
+
+class InOrder:
+    """Lets concurrent handlers finish their work in the order they took their ticket.
+
+    Every ticket has to be finished, whether its handler got its turn or not. Later tickets wait until then.
+    """
+
+    def __init__(self):
+        self._next: int = 0
+        self._current: int = 0
+        self._finished: set[int] = set()
+        self._changed: asyncio.Condition = asyncio.Condition()
+
+    def take(self) -> int:
+        ticket = self._next
+        self._next += 1
+        return ticket
+
+    async def wait(self, ticket: int) -> None:
+        """Wait until every earlier ticket is finished"""
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._current == ticket)
+
+    async def finish(self, ticket: int) -> None:
+        async with self._changed:
+            self._finished.add(ticket)
+            while self._current in self._finished:
+                self._finished.remove(self._current)
+                self._current += 1
+            self._changed.notify_all()
+
+
+class IngestStats:
+    def __init__(self):
+        self.received: int = 0
+        self.processed: int = 0
+        self.dropped: int = 0
+        self.rejected: int = 0
+        self.failed: int = 0
+        self.max_depth: int = 0
+
+
+class IngestQueue:
+    """Bounded queue between the HTTP handler and the decode workers.
+
+    The handler only validates incoming data and queues it, so the MITM gets its answer right away.
+    Decoding happens in the workers. Records are handed to the handler in the order they arrived, the handler
+    is started right after taking a record, with no await in between. With several workers, it's up to the
+    handler to keep its results in that order, see InOrder.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[RequestModel], Awaitable[None]],
+        maxsize: int = 1000,
+        workers: int = 2,
+        policy: Backpressure = Backpressure.BLOCK,
+    ):
+        self._handler = handler
+        self._queue: asyncio.Queue[RequestModel] = asyncio.Queue(maxsize=max(maxsize, 0))
+        self._worker_count: int = max(workers, 1)
+        self._workers: list[asyncio.Task] = []
+
+        self.policy: Backpressure = policy
+        self.stats: IngestStats = IngestStats()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def maxsize(self) -> int:
+        return self._queue.maxsize
+
+    def start(self) -> None:
+        for _ in range(self._worker_count - len(self._workers)):
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    async def put(self, record: RequestModel) -> None:
+        await self.put_many((record,))
+
+    async def put_many(self, records: Sequence[RequestModel]) -> None:
+        if self.policy == Backpressure.REJECT and self.maxsize > 0:
+            if self.maxsize - self.depth < len(records):
+                self.stats.rejected += len(records)
+                raise QueueFull(f"ingest queue is full ({self.depth}/{self.maxsize})")
+
+        for record in records:
+            if self.policy == Backpressure.DROP_OLDEST:
+                while self._queue.full():
+                    self._queue.get_nowait()
+                    self._queue.task_done()
+                    self.stats.dropped += 1
+                self._queue.put_nowait(record)
+            else:
+                await self._queue.put(record)
+
+            self.stats.received += 1
+            self.stats.max_depth = max(self.stats.max_depth, self.depth)
+
+    async def join(self) -> None:
+        await self._queue.join()
+
+    async def _worker(self) -> None:
+        while True:
+            record = await self._queue.get()
+            try:
+                await self._handler(record)
+            except Exception as e:
+                self.stats.failed += 1
+                print(f"error processing record {record.rpcid}: {e}")
+                traceback.print_exc()
+            else:
+                self.stats.processed += 1
+            finally:
+                self._queue.task_done()
+
+    def get_stats(self) -> dict[str, int | str]:
+        return {
+            "depth": self.depth,
+            "maxsize": self.maxsize,
+            "policy": self.policy.value,
+            "workers": len(self._workers),
+            **vars(self.stats),
+        }
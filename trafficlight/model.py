@@ -1,14 +1,18 @@
-from pydantic import BaseModel, Field
+from typing import Any, Type, TypeVar
+
+from pydantic import BaseModel, Field, StrictBytes
 
 
 class ProtoModel(BaseModel):
+    # str: base64 encoded (JSON), bytes: raw (msgpack). StrictBytes first, so str is never encoded to bytes
     method: int = Field(alias="type")
-    request: str | None
-    response: str | None = Field(alias="payload")
+    request: StrictBytes | str | None
+    response: StrictBytes | str | None = Field(alias="payload")
 
     class Config:
         allow_population_by_field_name = True
 
+
 class RequestModel(BaseModel):
     rpcid: int = 0
     rpchandle: int | None
@@ -17,3 +21,73 @@ class RequestModel(BaseModel):
 
     class Config:
         allow_population_by_field_name = True
+
+
+M = TypeVar("M", bound=BaseModel)
+
+_MISSING = object()
+_RAW_TYPES = (str, bytes, type(None))
+
+
+def _construct(model: Type[M], values: dict[str, Any]) -> M:
+    # like BaseModel.construct, but without its per-field default handling. values has to contain all fields
+    instance = model.__new__(model)
+    object.__setattr__(instance, "__dict__", values)
+    object.__setattr__(instance, "__fields_set__", set(values))
+    return instance
+
+
+def _get_aliased(data: dict, alias: str, name: str) -> Any:
+    # same precedence as pydantic: the alias wins if both are given
+    if alias in data:
+        return data[alias]
+    return data.get(name, _MISSING)
+
+
+def _parse_proto_fast(data: Any) -> ProtoModel | None:
+    if type(data) is not dict:
+        return None
+
+    method = _get_aliased(data, "type", "method")
+    request = data.get("request")
+    response = _get_aliased(data, "payload", "response")
+    if response is _MISSING:
+        response = None
+
+    if type(method) is not int or type(request) not in _RAW_TYPES or type(response) not in _RAW_TYPES:
+        return None
+
+    return _construct(ProtoModel, {"method": method, "request": request, "response": response})
+
+
+def _parse_request_fast(data: dict) -> RequestModel | None:
+    rpcid = data.get("rpcid", 0)
+    rpchandle = data.get("rpchandle")
+    rpcstatus = data.get("rpcstatus", 0)
+    raw_protos = _get_aliased(data, "contents", "protos")
+
+    if type(rpcid) is not int or type(rpcstatus) is not int or (rpchandle is not None and type(rpchandle) is not int):
+        return None
+    if type(raw_protos) is not list:
+        return None
+
+    protos = []
+    for raw_proto in raw_protos:
+        proto = _parse_proto_fast(raw_proto)
+        if proto is None:
+            return None
+        protos.append(proto)
+
+    return _construct(RequestModel, {"rpcid": rpcid, "rpchandle": rpchandle, "rpcstatus": rpcstatus, "protos": protos})
+
+
+def parse_request(data: dict) -> RequestModel:
+    """Parse an incoming record.
+
+    Well-formed data is checked and built without running pydantic validation. Anything the fast path
+    doesn't accept goes through RequestModel, which then also produces the usual ValidationError.
+    """
+    model = _parse_request_fast(data)
+    if model is None:
+        model = RequestModel(**data)
+    return model
@@ -1,14 +1,18 @@
 from trafficlight.config import Output as _OutputType
 from .base import BaseOutput
-from .discord import DiscordOutput
-from .print_ import PrintOutput
-from .ui import UiOutput
 
 
 def get_output(output_type: _OutputType) -> BaseOutput:
+    # outputs are imported here, so only the dependencies of the selected one are loaded
     if output_type == _OutputType.PRINT:
+        from .print_ import PrintOutput
+
         return PrintOutput()
     elif output_type == _OutputType.DISCORD:
+        from .discord import DiscordOutput
+
         return DiscordOutput()
 
+    from .ui import UiOutput
+
     return UiOutput()
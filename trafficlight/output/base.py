@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 from abc import ABCMeta, abstractmethod
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Awaitable, Callable
 
 if TYPE_CHECKING:
+    from trafficlight.proto_utils import RawProto
     from trafficlight.proto_utils.proto import Proto
 
+    Decoder = Callable[[int, list[RawProto]], Awaitable[list[Proto]]]
+
 
 class BaseOutput(metaclass=ABCMeta):
     @abstractmethod
@@ -13,5 +16,18 @@ class BaseOutput(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    async def add_record(self, rpc_id: int, rpc_status: int, protos: list[Proto], rpc_handle: int | None = None) -> None:
+    async def add_record(
+        self, rpc_id: int, rpc_status: int, protos: list[Proto], rpc_handle: int | None = None
+    ) -> None:
         pass
+
+    def wants_raw(self) -> bool:
+        """While this is True, records are passed to add_raw without decoding them first"""
+        return False
+
+    async def add_raw(
+        self, rpc_id: int, rpc_status: int, protos: list[RawProto], rpc_handle: int | None, decode: Decoder
+    ) -> None:
+        """Add a record that's still undecoded. decode turns its protos into Protos whenever they're needed"""
+        decoded = await decode(rpc_id, protos)
+        await self.add_record(rpc_id=rpc_id, rpc_status=rpc_status, protos=decoded, rpc_handle=rpc_handle)
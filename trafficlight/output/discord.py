@@ -24,7 +24,9 @@ class DiscordOutput(BaseOutput):
     async def start(self) -> None:
         pass
 
-    async def add_record(self, rpc_id: int, rpc_status: int, protos: list[Proto], rpc_handle: int | None = None) -> None:
+    async def add_record(
+        self, rpc_id: int, rpc_status: int, protos: list[Proto], rpc_handle: int | None = None
+    ) -> None:
         now = discord.utils.utcnow()
         embeds = []
 
@@ -55,7 +57,7 @@ class DiscordOutput(BaseOutput):
         def make_message_text(message: Message, prefix: str = "") -> None:
             def get_payload() -> str:
                 data = message.to_string(False)
-                if message.payload is None:
+                if not message.has_payload:
                     data = "[Blackbox]\n" + data
                 value = f"```\n{data}\n```"
                 if len(value) > 1024:
@@ -68,7 +70,7 @@ class DiscordOutput(BaseOutput):
                 name = f"{prefix}[Unknown {message.type} Message]"
             else:
                 name = f"{prefix}{message.type}: {message.name}"
-                if message.payload is not None and len(message.payload.ListFields()) == 0:
+                if message.is_empty:
                     formatted_payload = "`{}`"
                 else:
                     formatted_payload = get_payload()
@@ -13,7 +13,9 @@ class PrintOutput(BaseOutput):
     async def start(self) -> None:
         pass
 
-    async def add_record(self, rpc_id: int, rpc_status: int, protos: list[Proto], rpc_handle: int | None = None) -> None:
+    async def add_record(
+        self, rpc_id: int, rpc_status: int, protos: list[Proto], rpc_handle: int | None = None
+    ) -> None:
         time = datetime.now()
         text = f"{time} | RPC ID {rpc_id} | RPC STATUS {rpc_status}"
         if rpc_handle is not None:
@@ -33,9 +35,9 @@ class PrintOutput(BaseOutput):
                 data = f"Blackbox: {message.blackbox}"
             else:
                 name = f"{message.type} | {message.name}"
-                if message.payload is None:
+                if not message.has_payload:
                     data = f"Error decoding message. Blackbox: {message.blackbox}"
-                elif len(message.payload.ListFields()) == 0:
+                elif message.is_empty:
                     data = "{}"
                 else:
                     data = message.to_string()
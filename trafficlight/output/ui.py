@@ -7,7 +7,9 @@ from trafficlight.tui import TrafficLightGui
 from .base import BaseOutput
 
 if TYPE_CHECKING:
+    from trafficlight.proto_utils import RawProto
     from trafficlight.proto_utils.proto import Proto
+    from .base import Decoder
 
 
 class UiOutput(BaseOutput):
@@ -17,5 +19,17 @@ class UiOutput(BaseOutput):
         self.app = TrafficLightGui()
         asyncio.create_task(self.app.run_app())
 
-    async def add_record(self, rpc_id: int, rpc_status: int, protos: list[Proto], rpc_handle: int | None = None) -> None:
+    async def add_record(
+        self, rpc_id: int, rpc_status: int, protos: list[Proto], rpc_handle: int | None = None
+    ) -> None:
         self.app.add_record(rpc_id=rpc_id, rpc_status=rpc_status, protos=protos, rpc_handle=rpc_handle)
+
+    def wants_raw(self) -> bool:
+        return self.app.buffering
+
+    async def add_raw(
+        self, rpc_id: int, rpc_status: int, protos: list[RawProto], rpc_handle: int | None, decode: Decoder
+    ) -> None:
+        await self.app.buffer_record(
+            rpc_id=rpc_id, rpc_status=rpc_status, protos=protos, rpc_handle=rpc_handle, decode=decode
+        )
@@ -1,2 +1,4 @@
-from .proto import Proto, Message, ALL_ACTION_NAMES, ACTION_PREFIXES, MESSAGE_NAMES
-from .proto_format import MessageFormatter, get_method_text, REQUEST_HEADER
+from .proto import Proto, Message, ALL_ACTION_NAMES, ACTION_PREFIXES, MESSAGE_NAMES, DECODE_CACHE, TYPEDEF_CACHE
+from .proto_format import MessageFormatter, RenderedProto, format_proto_cached, get_method_text, REQUEST_HEADER
+from .decode_pool import DecodePool, RawProto, get_raw_protos
+from .query import Query, QueryError, compile_query
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING
+
+from .proto import Proto, DecodedProto
+
+if TYPE_CHECKING:
+    from trafficlight.model import ProtoModel
+
+# method, request, response
+RawProto = tuple[int, str | bytes, str | bytes]
+
+
+def get_raw_protos(protos: list[ProtoModel]) -> list[RawProto]:
+    return [(p.method, p.request if p.request else "", p.response if p.response else "") for p in protos]
+
+
+def _init_worker() -> None:
+    # loading the proto descriptors is the expensive part, do it once per worker and not per job
+    from trafficlight import protos
+
+    protos.get_file_descriptor()
+
+
+def _decode_protos(rpc_id: int, raw_protos: list[RawProto]) -> list[DecodedProto]:
+    return [
+        Proto(rpc_id=rpc_id, method_value=method, raw_request=request, raw_response=response).to_decoded()
+        for method, request, response in raw_protos
+    ]
+
+
+class DecodePool:
+    """Decodes Protos in worker processes so decoding doesn't block the event loop and can use all cores.
+
+    Workers send back a compact DecodedProto, the actual protobuf payload is only parsed again on
+    the event loop if it's needed, i.e. when a proto gets shown, searched or inspected.
+    """
+
+    def __init__(self, processes: int):
+        self._executor = ProcessPoolExecutor(
+            max_workers=processes, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker
+        )
+
+    async def decode(self, rpc_id: int, protos: list[ProtoModel]) -> list[Proto]:
+        return await self.decode_raw(rpc_id, get_raw_protos(protos))
+
+    async def decode_raw(self, rpc_id: int, raw_protos: list[RawProto]) -> list[Proto]:
+        loop = asyncio.get_running_loop()
+        decoded = await loop.run_in_executor(self._executor, _decode_protos, rpc_id, raw_protos)
+        return [Proto.from_decoded(rpc_id, d) for d in decoded]
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+from collections import Counter
+
+import msgpack
+
+from trafficlight.cache import file_stamp, read_cache, write_cache
+
+_CACHE_PREFIX = "name_index-"
+_VERSION = 1
+
+# how many trigram candidates are ranked with thefuzz
+_CANDIDATES = 50
+
+
+def _trigrams(name: str) -> set[str]:
+    padded = f"  {name.casefold()} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """Trigram index over all message and enum names, used for fuzzy search in `trafficlight show`.
+
+    Only the closest candidates from the index are ranked with thefuzz, instead of all names. The index is
+    cached on disk and rebuilt whenever pogo_pb2 changes.
+    """
+
+    def __init__(self, names: list[str], trigrams: dict[str, list[int]] | None = None):
+        self.names: list[str] = names
+        self._casefolded: dict[str, str] = {name.casefold(): name for name in names}
+
+        if trigrams is None:
+            trigrams = {}
+            for i, name in enumerate(names):
+                for trigram in _trigrams(name):
+                    trigrams.setdefault(trigram, []).append(i)
+        self.trigrams: dict[str, list[int]] = trigrams
+
+    @classmethod
+    def from_descriptors(cls) -> NameIndex:
+        from trafficlight import protos
+
+        names = [*protos.DESCRIPTOR.message_types_by_name.keys(), *protos.DESCRIPTOR.enum_types_by_name.keys()]
+        return cls(names)
+
+    @classmethod
+    def _from_cache(cls, cached: bytes) -> NameIndex:
+        data = msgpack.unpackb(cached)
+        if data["version"] != _VERSION:
+            raise ValueError(f"cached index is version {data['version']}")
+
+        names, trigrams = data["names"], data["trigrams"]
+        if not all(isinstance(name, str) for name in names):
+            raise ValueError("names have to be strings")
+        if not all(isinstance(trigram, str) and isinstance(ids, list) for trigram, ids in trigrams.items()):
+            raise ValueError("trigrams have to map to lists of names")
+        if not all(0 <= i < len(names) for ids in trigrams.values() for i in ids):
+            raise ValueError("trigrams refer to names that don't exist")
+        return cls(names, trigrams)
+
+    @classmethod
+    def load(cls) -> NameIndex:
+        from trafficlight import protos
+
+        cache_name = _CACHE_PREFIX + file_stamp(protos.get_proto_module_path()) + ".msgpack"
+        cached = read_cache(cache_name)
+
+        if cached is not None:
+            try:
+                return cls._from_cache(cached)
+            except Exception:
+                # corrupt, from another version or just not what we expect, it's rebuilt below
+                pass
+
+        index = cls.from_descriptors()
+        write_cache(
+            cache_name,
+            msgpack.packb({"version": _VERSION, "names": index.names, "trigrams": index.trigrams}),
+            prefix=_CACHE_PREFIX,
+        )
+        return index
+
+    def _candidates(self, query: str) -> list[str]:
+        counts: Counter[int] = Counter()
+        for trigram in _trigrams(query):
+            counts.update(self.trigrams.get(trigram, ()))
+        return [self.names[i] for i, _ in counts.most_common(_CANDIDATES)]
+
+    def search(self, query: str, limit: int = 1) -> list[tuple[str, int]]:
+        """Returns up to limit (name, score) pairs, best match first"""
+        from thefuzz import process
+
+        exact = self._casefolded.get(query.casefold())
+        candidates = self._candidates(query)
+
+        if not candidates:
+            # nothing in common at all, fall back to scoring every name
+            candidates = self.names
+
+        matches = process.extract(query, candidates, limit=limit)
+        if exact is not None:
+            matches = [(exact, 100)] + [m for m in matches if m[0] != exact][: limit - 1]
+        return matches
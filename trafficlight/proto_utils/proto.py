@@ -1,41 +1,63 @@
 from __future__ import annotations
 
 import base64
+import hashlib
 import json
 import sys
-from typing import Type, Iterable, TYPE_CHECKING
+import threading
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+from copy import deepcopy
+from typing import Any, Callable, Hashable, Type, TypeVar, Iterable, NamedTuple, Self, TYPE_CHECKING
 
-from blackboxprotobuf.lib.api import decode_message, _json_safe_transform
+from blackboxprotobuf.lib.api import _json_safe_transform
 from google.protobuf import text_format, descriptor
-from google.protobuf.internal.enum_type_wrapper import EnumTypeWrapper
+from google.protobuf.internal import api_implementation
 from google.protobuf.message import Message as ProtobufMessage
 
 from trafficlight import protos
+from trafficlight.config import config
+from .typedefs import TypedefCache
 
 if TYPE_CHECKING:
     from trafficlight.model import ProtoModel
 
+T = TypeVar("T")
 
-all_types = protos.AllTypesAndMessagesResponsesProto
-MESSAGES: dict[int, descriptor.FieldDescriptor] = all_types.AllMessagesProto.DESCRIPTOR.fields_by_number
-RESPONSES: dict[int, descriptor.FieldDescriptor] = all_types.AllResponsesProto.DESCRIPTOR.fields_by_number
-METHODS: dict[int, descriptor.EnumValueDescriptor] = all_types.AllResquestTypesProto.DESCRIPTOR.values_by_number
+# what lazily computed attributes are before their first access. They're cached on the instance by hand instead of
+# with functools.cached_property, which on 3.11 holds one lock for all instances of a class while computing a value:
+# a search thread decoding one message would block the event loop from decoding any other
+_UNSET: Any = object()
+
+# roughly how much memory decoded payloads and blackboxes take per byte they were decoded from. Measured, messages
+# of the pure python protobuf implementation are a lot bigger than those of the C++ one
+MESSAGE_SIZE_FACTOR = 64 if api_implementation.Type() == "python" else 8
+BLACKBOX_SIZE_FACTOR = 32
+
+all_types: descriptor.Descriptor = protos.DESCRIPTOR.message_types_by_name["AllTypesAndMessagesResponsesProto"]
+all_messages: descriptor.Descriptor = all_types.nested_types_by_name["AllMessagesProto"]
+all_responses: descriptor.Descriptor = all_types.nested_types_by_name["AllResponsesProto"]
+all_methods: descriptor.EnumDescriptor = all_types.enum_types_by_name["AllResquestTypesProto"]
+
+MESSAGES: dict[int, descriptor.FieldDescriptor] = all_messages.fields_by_number
+RESPONSES: dict[int, descriptor.FieldDescriptor] = all_responses.fields_by_number
+METHODS: dict[int, descriptor.EnumValueDescriptor] = all_methods.values_by_number
 MESSAGE_TYPE_TO_ID: dict[str, int] = {m.message_type.name: n for n, m in MESSAGES.items()}
+PROXY_REQUEST_NAME = "ProxyRequestProto"
+PROXY_RESPONSE_NAME = "ProxyResponseProto"
 
 
-def _get_method_names(method_enum: Type[EnumTypeWrapper]) -> list[str]:
-    return [d.name for d in method_enum.DESCRIPTOR.values]
+def _get_method_names(method_enum: descriptor.EnumDescriptor) -> list[str]:
+    return [d.name for d in method_enum.values]
 
 
-def _get_message_names(all_messages: Type[ProtobufMessage]) -> list[str]:
-    return [f.message_type.name for f in all_messages.DESCRIPTOR.fields]
+def _get_message_names(all_messages_type: descriptor.Descriptor) -> list[str]:
+    return [f.message_type.name for f in all_messages_type.fields]
 
 
-MESSAGE_NAMES: list[str] = _get_message_names(all_types.AllMessagesProto) + _get_message_names(
-    all_types.AllResponsesProto
-)
+MESSAGE_NAMES: list[str] = _get_message_names(all_messages) + _get_message_names(all_responses)
 
-ALL_ACTION_NAMES = _get_method_names(protos.AllTypesAndMessagesResponsesProto.AllResquestTypesProto)
+ALL_ACTION_NAMES = _get_method_names(all_methods)
 
 ACTION_PREFIXES: list[str] = [
     "METHOD_",
@@ -64,58 +86,369 @@ ACTION_PREFIXES: list[str] = [
 ]
 
 
-class Message:
-    messages: dict[int, descriptor.FieldDescriptor]
+class MethodInfo(NamedTuple):
+    name: str | None
+    method_value: int
+    request_type: descriptor.Descriptor | None
+    response_type: descriptor.Descriptor | None
+
+
+def _get_method_name_basic(value: int) -> str | None:
+    name: descriptor.EnumValueDescriptor | None = METHODS.get(value)
+
+    if name is None:
+        return None
+
+    return name.name[13:]
+
+
+def _get_message_type(field: descriptor.FieldDescriptor | None) -> descriptor.Descriptor | None:
+    if field is None:
+        return None
+    return field.message_type
+
+
+def _resolve_method(value: int) -> MethodInfo:
+    name = _get_method_name_basic(value)
+
+    if value not in MESSAGES and value not in RESPONSES and name is not None and name.startswith("SOCIAL_ACTION_"):
+        # mainly for proxy. trying to map the method name to a message name and get the method id this way
+
+        possible_base_name = "".join(s.title() for s in name[14:].split("_"))
+        # i.e. SOCIAL_ACTION_GET_INBOX to GetInbox
+
+        for possible_name in (possible_base_name + "V2Proto", possible_base_name + "Proto"):
+            method_value = MESSAGE_TYPE_TO_ID.get(possible_name)
+            if method_value is None:
+                continue
+
+            method_name = _get_method_name_basic(method_value)
+            if method_name is not None:
+                value, name = method_value, method_name
+                break
+
+    return MethodInfo(
+        name=name,
+        method_value=value,
+        request_type=_get_message_type(MESSAGES.get(value)),
+        response_type=_get_message_type(RESPONSES.get(value)),
+    )
+
+
+# method value -> everything needed to decode it, so Proto and Message only do a single lookup.
+# message classes are only created once a message of that type is decoded
+METHOD_INDEX: dict[int, MethodInfo] = {
+    value: _resolve_method(value) for value in METHODS.keys() | MESSAGES.keys() | RESPONSES.keys()
+}
+
+
+def get_method_info(value: int) -> MethodInfo:
+    info = METHOD_INDEX.get(value)
+    if info is None:
+        return MethodInfo(name=None, method_value=value, request_type=None, response_type=None)
+    return info
+
+
+class DecodedMessage(NamedTuple):
+    """Compact, picklable result of decoding a Message, i.e. in a worker process"""
+
+    raw: bytes
+    decoded: bool
+    empty: bool
+    blackbox: dict | None
+    # the blackbox typedef the worker used, so the main process learns it too
+    typedef: dict | None = None
+
+
+class DecodedProto(NamedTuple):
+    method_value: int
+    request: DecodedMessage
+    response: DecodedMessage
+    proxy: DecodedProto | None
+
+
+class DecodeCache:
+    """LRU cache for decoded messages, keyed by message class (or kind) and a hash of the raw bytes.
+
+    The game resends lots of byte-identical messages, all of them get the same cached result. Values that can be
+    changed are cached with a copy function, everyone gets their own copy and the cached value is never handed out.
+    Every entry is charged the size_of its value, which should be about the memory it takes up, so max_bytes limits
+    how much memory the cache uses.
+
+    It's used from the text search thread as well as the event loop. Values are created outside the lock, if both
+    create the same one at once, the one that's cached first is what both get.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries: int = max_entries
+        self.max_bytes: int = max_bytes
+        self.size_bytes: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+
+        self._entries: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def hash_raw(raw: bytes) -> bytes:
+        return hashlib.blake2b(raw, digest_size=16).digest()
+
+    def get_or_create(
+        self, key: Hashable, create: Callable[[], T], size_of: Callable[[T], int], copy: Callable[[T], T] | None = None
+    ) -> T:
+        if self.max_entries <= 0:
+            return create()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            else:
+                self.misses += 1
+        if entry is not None:
+            return entry[0] if copy is None else copy(entry[0])
+
+        value = create()
+        size = size_of(value)
+        if size > self.max_bytes:
+            return value
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = (value, size)
+                self.size_bytes += size
+
+                while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+                    _, (_, evicted_size) = self._entries.popitem(last=False)
+                    self.size_bytes -= evicted_size
+            else:
+                value = entry[0]
+        return value if copy is None else copy(value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def get_stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class _PreviewFull(Exception):
+    pass
+
+
+class _PreviewWriter:
+    """Collects written text until there's enough for a preview, then stops the formatter by raising"""
+
+    def __init__(self, limit: int):
+        self.limit: int = limit
+        self._parts: list[str] = []
+        self._size: int = 0
+
+    def write(self, text: str) -> None:
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size > self.limit:
+            raise _PreviewFull
+
+    def getvalue(self) -> str:
+        return "".join(self._parts)[: self.limit]
+
+
+DECODE_CACHE = DecodeCache(max_entries=config.decode_cache_size, max_bytes=config.decode_cache_bytes)
+TYPEDEF_CACHE = TypedefCache(config.typedef_file)
+
+
+class Message(metaclass=ABCMeta):
+    """A request or response message. Everything is decoded on first access and cached"""
+
+    # what blackbox typedefs of this kind of message are saved under
+    direction: str
 
     def __init__(self, method_id: int, raw: str | bytes):
+        self._method_id: int = method_id
         self._raw: str | bytes = raw
+        self._has_payload: bool | None = None
+        self._empty: bool | None = None
 
-        self.name: str | None = None
-        _message = self.messages.get(method_id)
-        if _message is not None:
-            self.name = _message.message_type.name
+        self._message_type: descriptor.Descriptor | None = _UNSET
+        self._message_class: Type[ProtobufMessage] | None = _UNSET
+        self._raw_bytes: bytes | None = None
+        self._raw_hash: bytes | None = None
+        self._payload: ProtobufMessage | None = _UNSET
+        self._blackbox: dict | None = _UNSET
 
-        self.payload: ProtobufMessage | None = None
-        if self.name is not None:
-            self.payload = self.decode_proto()
+        # start of the one-line text, and how long it was allowed to get. None if it's complete
+        self._preview: str | None = None
+        self._preview_limit: int | None = None
 
-        self.blackbox: dict | None = None
-        if self.name is None or self.payload is None:
-            self.blackbox = self.decode_blackbox()
+    @classmethod
+    def from_decoded(cls, method_id: int, decoded: DecodedMessage) -> Self:
+        message = cls(method_id, decoded.raw)
+        message._has_payload = decoded.decoded
+        message._empty = decoded.empty
+        message._blackbox = decoded.blackbox
+        if decoded.typedef is not None:
+            TYPEDEF_CACHE.learn(message.direction, method_id, decoded.typedef)
+        if not decoded.decoded:
+            message._payload = None
+        return message
+
+    def to_decoded(self) -> DecodedMessage:
+        return DecodedMessage(
+            raw=self.raw_bytes,
+            decoded=self.has_payload,
+            empty=self.is_empty,
+            blackbox=self.blackbox,
+            typedef=TYPEDEF_CACHE.get(self.direction, self._method_id) if self.blackbox is not None else None,
+        )
 
     @property
     def type(self) -> str:
         return self.__class__.__name__
 
-    def decode_b64(self) -> bytes:
-        if isinstance(self._raw, bytes):
-            return self._raw
+    @staticmethod
+    @abstractmethod
+    def get_message_type(info: MethodInfo) -> descriptor.Descriptor | None:
+        """The type of this kind of message for a method, if it's known"""
 
-        return base64.b64decode(self._raw.rstrip("\0"))
+    @property
+    def message_type(self) -> descriptor.Descriptor | None:
+        if self._message_type is _UNSET:
+            self._message_type = self.get_message_type(get_method_info(self._method_id))
+        return self._message_type
 
-    def decode_proto(self) -> ProtobufMessage | None:
-        if self.name is None:
-            return None
+    @property
+    def message_class(self) -> Type[ProtobufMessage] | None:
+        if self._message_class is _UNSET:
+            message_type = self.message_type
+            self._message_class = None if message_type is None else protos.get_message_class(message_type)
+        return self._message_class
+
+    @property
+    def name(self) -> str | None:
+        message_type = self.message_type
+        return None if message_type is None else message_type.name
+
+    @property
+    def raw_bytes(self) -> bytes:
+        if self._raw_bytes is None:
+            if isinstance(self._raw, bytes):
+                self._raw_bytes = self._raw
+            else:
+                self._raw_bytes = base64.b64decode(self._raw.rstrip("\0"))
+        return self._raw_bytes
+
+    @property
+    def raw_size(self) -> int:
+        return len(self._raw)
 
-        message = getattr(sys.modules["trafficlight.protos"], self.name)
+    @property
+    def raw_hash(self) -> bytes:
+        if self._raw_hash is None:
+            self._raw_hash = DECODE_CACHE.hash_raw(self.raw_bytes)
+        return self._raw_hash
+
+    def _get_cached(
+        self, kind: Hashable, create: Callable[[], T], size_of: Callable[[T], int], copy: Callable[[T], T] | None = None
+    ) -> T:
+        return DECODE_CACHE.get_or_create((kind, self.raw_hash), create, size_of, copy)
+
+    def _payload_size(self, payload: ProtobufMessage | None) -> int:
+        return MESSAGE_SIZE_FACTOR * len(self.raw_bytes) if payload is not None else 0
+
+    def _blackbox_size(self, _: dict) -> int:
+        return BLACKBOX_SIZE_FACTOR * len(self.raw_bytes)
+
+    @property
+    def _blackbox_kind(self) -> Hashable:
+        return self.type, self._method_id
+
+    @property
+    def payload(self) -> ProtobufMessage | None:
+        """The decoded message. Messages with the same bytes share the decoding, but each gets its own copy"""
+        if self._payload is _UNSET:
+            if self.name is None:
+                self._payload = None
+            else:
+                self._payload = self._get_cached(self.message_type, self.decode_proto, self._payload_size, deepcopy)
+        return self._payload
+
+    @property
+    def blackbox(self) -> dict | None:
+        """What bbpb made of the bytes, if they couldn't be decoded. A copy of the cached result, like payload"""
+        if self._blackbox is _UNSET:
+            if self.name is not None and self.has_payload:
+                self._blackbox = None
+            else:
+                self._blackbox = self._get_cached(
+                    self._blackbox_kind, self.decode_blackbox, self._blackbox_size, deepcopy
+                )
+        return self._blackbox
+
+    @property
+    def has_payload(self) -> bool:
+        if self._has_payload is None:
+            self._has_payload = self.payload is not None
+        return self._has_payload
+
+    @property
+    def is_empty(self) -> bool:
+        if self._empty is None:
+            self._empty = self.payload is not None and len(self.payload.ListFields()) == 0
+        return self._empty
+
+    def decode_b64(self) -> bytes:
+        return self.raw_bytes
+
+    def decode_proto(self) -> ProtobufMessage | None:
+        message = self.message_class
 
         if message is None:
             return None
 
         try:
-            decoded = self.decode_b64()
-            return message.FromString(decoded)
+            return message.FromString(self.raw_bytes)
         except Exception as e:
             print(f"error decoding {message} with {self._raw}: {e}")
             return None
 
     def decode_blackbox(self) -> dict:
-        decoded = self.decode_b64()
-
-        value, typedef = decode_message(decoded)
+        value, typedef = TYPEDEF_CACHE.decode(self.direction, self._method_id, self.raw_bytes)
         return _json_safe_transform(values=value, typedef=typedef, toBytes=False)
 
     def to_string(self, one_line: bool = True) -> str:
+        kind = self.message_type if self.has_payload else self._blackbox_kind
+        return self._get_cached(("text", one_line, kind), lambda: self._format(one_line), sys.getsizeof)
+
+    def get_preview(self, width: int) -> str:
+        """The first width characters of to_string(). Only formats as much of the message as needed for that"""
+        if self._preview is not None and (self._preview_limit is None or width <= self._preview_limit):
+            return self._preview[:width]
+
+        out = _PreviewWriter(width)
+        try:
+            if self.payload is None:
+                for chunk in json.JSONEncoder(ensure_ascii=False).iterencode(self.blackbox):
+                    out.write(chunk)
+            else:
+                text_format.PrintMessage(self.payload, out, as_one_line=True)
+        except _PreviewFull:
+            self._preview, self._preview_limit = out.getvalue(), width
+        else:
+            # same as to_string()
+            self._preview, self._preview_limit = out.getvalue().rstrip(), None
+        return self._preview
+
+    def _format(self, one_line: bool) -> str:
         if self.payload is None:
             indent = None if one_line else 2
             return json.dumps(self.blackbox, ensure_ascii=False, indent=indent)
@@ -124,37 +457,92 @@ class Message:
 
 
 class Request(Message):
-    messages = MESSAGES
+    direction = "Request"
+
+    @staticmethod
+    def get_message_type(info: MethodInfo) -> descriptor.Descriptor | None:
+        return info.request_type
 
 
 class Respone(Message):
-    messages = RESPONSES
+    direction = "Response"
+
+    @staticmethod
+    def get_message_type(info: MethodInfo) -> descriptor.Descriptor | None:
+        return info.response_type
 
 
 class Proto:
     def __init__(self, rpc_id: int, method_value: int, raw_request: str | bytes, raw_response: str | bytes):
+        info = get_method_info(method_value)
         self.rpc_id: int = rpc_id
-        self.method_value: int = method_value
-        self.method_name: str | None = self.get_method_name()
+        self.method_value: int = info.method_value
+        self.method_name: str | None = info.name
         self.request: Request = Request(self.method_value, raw_request)
         self.response: Respone = Respone(self.method_value, raw_response)
 
-        self.proxy: Proto | None = None
+        self._proxy: Proto | None = _UNSET
+        self._rendered: dict[Hashable, Any] | None = None
+
+    @property
+    def proxy(self) -> Proto | None:
+        if self._proxy is _UNSET:
+            self._proxy = self._get_proxy()
+        return self._proxy
+
+    @property
+    def rendered(self) -> dict[Hashable, Any]:
+        """Formatted versions of this proto, see format_proto_cached"""
+        if self._rendered is None:
+            self._rendered = {}
+        return self._rendered
+
+    def _get_proxy(self) -> Proto | None:
+        # only decode the payloads if this can be a proxy request at all
+        if self.request.name != PROXY_REQUEST_NAME or self.response.name != PROXY_RESPONSE_NAME:
+            return None
+
         if isinstance(self.request.payload, protos.ProxyRequestProto) and isinstance(
             self.response.payload, protos.ProxyResponseProto
         ):
-            self.proxy = Proto(
-                rpc_id=rpc_id,
+            return Proto(
+                rpc_id=self.rpc_id,
                 method_value=self.request.payload.action,
                 raw_request=self.request.payload.payload,
                 raw_response=self.response.payload.payload,
             )
+        return None
+
+    @classmethod
+    def from_decoded(cls, rpc_id: int, decoded: DecodedProto) -> Proto:
+        proto = cls.__new__(cls)
+        proto.rpc_id = rpc_id
+        proto.method_value = decoded.method_value
+        proto.method_name = get_method_info(decoded.method_value).name
+        proto.request = Request.from_decoded(decoded.method_value, decoded.request)
+        proto.response = Respone.from_decoded(decoded.method_value, decoded.response)
+
+        proto._proxy = None if decoded.proxy is None else cls.from_decoded(rpc_id, decoded.proxy)
+        proto._rendered = None
+        return proto
+
+    def to_decoded(self) -> DecodedProto:
+        return DecodedProto(
+            method_value=self.method_value,
+            request=self.request.to_decoded(),
+            response=self.response.to_decoded(),
+            proxy=self.proxy.to_decoded() if self.proxy is not None else None,
+        )
 
     @property
     def messages(self) -> Iterable[Message]:
         yield self.request
         yield self.response
 
+    @property
+    def raw_size(self) -> int:
+        return self.request.raw_size + self.response.raw_size
+
     @staticmethod
     def get_message_name(messages: dict, value: int) -> str | None:
         try:
@@ -163,41 +551,6 @@ class Proto:
         except KeyError:
             return None
 
-    @staticmethod
-    def _get_method_name_basic(value: int) -> str | None:
-        name: descriptor.EnumValueDescriptor | None = METHODS.get(value)
-
-        if name is None:
-            return None
-
-        return name.name[13:]
-
-    def get_method_name(self) -> str | None:
-        name = self._get_method_name_basic(self.method_value)
-
-        if (
-            self.method_value not in MESSAGES.keys()
-            and self.method_value not in RESPONSES.keys()
-            and name is not None
-            and name.startswith("SOCIAL_ACTION_")
-        ):
-            # mainly for proxy. trying to map the method name to a message name and get the method id this way
-
-            possible_base_name = "".join(s.title() for s in name[14:].split("_"))
-            # i.e. SOCIAL_ACTION_GET_INBOX to GetInbox
-
-            for possible_name in (possible_base_name + "V2Proto", possible_base_name + "Proto"):
-                method_value = MESSAGE_TYPE_TO_ID.get(possible_name)
-                if method_value is None:
-                    continue
-
-                name = self._get_method_name_basic(method_value)
-                if name is not None:
-                    self.method_value = method_value
-                    break
-
-        return name
-
     @classmethod
     def from_raw(cls, rpc_id: int, data: ProtoModel) -> Proto:
         return cls(
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 import json
-from typing import TYPE_CHECKING, Any
+import re
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Iterable, NamedTuple
 
 from google.protobuf import descriptor, text_encoding
 from rich.style import Style
-from rich.text import Text
+from rich.text import Span, Text
 
 if TYPE_CHECKING:
     from trafficlight.proto_utils.proto import Proto
@@ -26,6 +29,7 @@ ENUM = Style(color="#C792EA")  # light purple
 BOOLEAN = Style(color="#74D6B0")  # light cyan
 OTHERVALUE = Style(color="#D683A8")  # light magenta
 TYPE = Style(color="#606363", italic=True)  # dark bluish grey
+INDENT_GUIDE = Style(color="grey15")
 
 TYPES = {
     1: "double",
@@ -49,6 +53,235 @@ TYPES = {
 }
 
 
+# what Text strips from anything added to it
+_CONTROL_CODES = re.compile("[\x07\x08\x0b\x0c\r]")
+
+# every style a formatter used, spans refer to them by their index in here
+_STYLES: list[Style] = []
+_STYLE_IDS: dict[Style, int] = {}
+
+
+def _get_style_id(style: Style) -> int:
+    style_id = _STYLE_IDS.get(style)
+    if style_id is None:
+        style_id = _STYLE_IDS[style] = len(_STYLES)
+        _STYLES.append(style)
+    return style_id
+
+
+def _build_text(plain: str, spans: list[tuple[int, int, int]]) -> Text:
+    if _CONTROL_CODES.search(plain):
+        # Text drops control codes, so spans after them have to move back by as many characters
+        removed = [match.start() for match in _CONTROL_CODES.finditer(plain)]
+        spans = [
+            (start - bisect_left(removed, start), end - bisect_left(removed, end), style_id)
+            for start, end, style_id in spans
+        ]
+        plain = _CONTROL_CODES.sub("", plain)
+
+    # unlike the constructor, append_tokens doesn't look for control codes again. That's slow for long texts
+    text = Text().append_tokens([(plain, None)])
+    styles = _STYLES
+    text.spans.extend(Span(start, end, styles[style_id]) for start, end, style_id in spans if end > start)
+    return text
+
+
+# how a field's value is printed
+_MESSAGE, _ENUM, _STRING, _BOOL, _SCALAR = range(5)
+
+
+class _FieldPlan:
+    """Everything the formatter needs to know about a field. Worked out once per message type and options"""
+
+    __slots__ = (
+        "repeated",
+        "is_map",
+        "last",
+        "label",
+        "label_on_new_line",
+        "field_label",
+        "kind",
+        "enum_names",
+        "escape_utf8",
+        "value_style",
+    )
+
+    def __init__(self, field: descriptor.FieldDescriptor, types: bool, type_emphasize: bool):
+        FieldDescriptor = descriptor.FieldDescriptor
+
+        self.repeated: bool = field.label == FieldDescriptor.LABEL_REPEATED
+        self.is_map: bool = (
+            field.type == FieldDescriptor.TYPE_MESSAGE
+            and field.message_type.has_options
+            and field.message_type.GetOptions().map_entry
+        )
+        # message fields are printed after all others
+        self.last: int = 1 if field.cpp_type == FieldDescriptor.CPPTYPE_MESSAGE else 0
+
+        self.label_on_new_line: bool = False
+        self.label: list[tuple[str, Style | None]] = _merge_tokens(self._get_label(field, types, type_emphasize))
+        # the label followed by the space before the value
+        self.field_label: list[tuple[str, Style | None]] = _merge_tokens([*self.label, (" ", None)])
+
+        self.enum_names: dict[int, str] = {}
+        self.escape_utf8: bool = field.type != FieldDescriptor.TYPE_BYTES
+        self.value_style: Style = OTHERVALUE
+
+        if field.cpp_type == FieldDescriptor.CPPTYPE_MESSAGE:
+            self.kind: int = _MESSAGE
+        elif field.cpp_type == FieldDescriptor.CPPTYPE_ENUM:
+            self.kind = _ENUM
+            self.enum_names = {
+                value.number: f"{field.enum_type.name}.{value.name}:{value.number}" for value in field.enum_type.values
+            }
+        elif field.cpp_type == FieldDescriptor.CPPTYPE_STRING:
+            self.kind = _STRING
+        elif field.cpp_type == FieldDescriptor.CPPTYPE_BOOL:
+            self.kind = _BOOL
+        else:
+            self.kind = _SCALAR
+            if field.cpp_type in _NUMBER_TYPES:
+                self.value_style = NUMBER
+
+    def _get_label(
+        self, field: descriptor.FieldDescriptor, types: bool, type_emphasize: bool
+    ) -> list[tuple[str, Style | None]]:
+        FieldDescriptor = descriptor.FieldDescriptor
+        repeated = [(" repeated", TYPE)] if field.label == FieldDescriptor.LABEL_REPEATED else []
+
+        if field.is_extension:
+            if (
+                field.containing_type.GetOptions().message_set_wire_format
+                and field.type == FieldDescriptor.TYPE_MESSAGE
+                and field.label == FieldDescriptor.LABEL_OPTIONAL
+            ):
+                name = field.message_type.full_name
+            else:
+                name = field.full_name
+            return [("[", BRACKETS), (name, None), ("]", BRACKETS)]
+
+        if field.type == FieldDescriptor.TYPE_GROUP:
+            # For groups, use the capitalized name.
+            return [(field.message_type.name, None)]
+
+        if field.cpp_type == FieldDescriptor.CPPTYPE_MESSAGE:
+            self.label_on_new_line = True
+            if type_emphasize:
+                return [(field.name + ": ", None), (field.message_type.name, SUB_MESSAGE_NAME), *repeated]
+            if types:
+                return [(field.message_type.name + " ", SUB_MESSAGE_NAME), (field.name, None)]
+            return [(field.name, None)]
+
+        if field.enum_type is not None and type_emphasize:
+            self.label_on_new_line = True
+
+            full_name = field.enum_type.name
+            containg_type: descriptor.Descriptor | None = field.enum_type.containing_type
+            if containg_type is not None:
+                i = field.enum_type.full_name.find(containg_type.name)
+                if i > 0:
+                    full_name = field.enum_type.full_name[i:]
+            return [(field.name + ": ", None), (full_name, ENUM), *repeated]
+
+        type_name = TYPES.get(field.type)
+        if type_emphasize:
+            if field.cpp_type == FieldDescriptor.CPPTYPE_STRING:
+                style = STRING
+            elif field.cpp_type == FieldDescriptor.CPPTYPE_BOOL:
+                style = BOOLEAN
+            elif field.cpp_type in _NUMBER_TYPES:
+                style = NUMBER
+            else:
+                style = OTHERVALUE
+            return [(field.name + ": ", None), (type_name, style), *repeated]
+
+        if type_name is not None and types:
+            return [(f"{type_name} ", TYPE), (field.name, None)]
+        return [(field.name, None)]
+
+
+def _merge_tokens(tokens: list[tuple[str, Style | None]]) -> list[tuple[str, Style | None]]:
+    """Join tokens next to each other that have the same style, so they're appended at once"""
+    merged: list[tuple[str, Style | None]] = []
+    for text, style in tokens:
+        if merged and merged[-1][1] == style:
+            merged[-1] = (merged[-1][0] + text, style)
+        else:
+            merged.append((text, style))
+    return merged
+
+
+_NUMBER_TYPES = {
+    descriptor.FieldDescriptor.CPPTYPE_FLOAT,
+    descriptor.FieldDescriptor.CPPTYPE_DOUBLE,
+    descriptor.FieldDescriptor.CPPTYPE_INT32,
+    descriptor.FieldDescriptor.CPPTYPE_INT64,
+    descriptor.FieldDescriptor.CPPTYPE_UINT32,
+    descriptor.FieldDescriptor.CPPTYPE_UINT64,
+}
+
+# print_message_descriptor ops: an int writes the indent that many levels deeper, _NEW_LINE ends the line,
+# _Nested writes other ops one level deeper and (text, style) is written as is
+_NEW_LINE = None
+
+
+class _Nested(NamedTuple):
+    indent: int
+    ops: list
+
+
+# (message type, expanded types it reaches, depth, types, type_emphasize) -> ops
+_descriptor_ops: dict[tuple, list] = {}
+# message type -> names of all message types its fields lead to
+_reachable_types: dict[descriptor.Descriptor, frozenset[str]] = {}
+
+
+def _get_reachable_types(message_type: descriptor.Descriptor) -> frozenset[str]:
+    reachable = _reachable_types.get(message_type)
+    if reachable is None:
+        names = set()
+        queue = [message_type]
+        seen = set()
+        while queue:
+            for field in queue.pop().fields:
+                nested = field.message_type
+                if nested is not None and nested not in seen:
+                    seen.add(nested)
+                    names.add(nested.name)
+                    queue.append(nested)
+        reachable = _reachable_types[message_type] = frozenset(names)
+    return reachable
+
+
+def _get_enum_ops(enum: descriptor.EnumDescriptor, limit: int = 30) -> list:
+    """The ops for print_enum_values"""
+    ops = []
+    for i, value in enumerate(enum.values):
+        ops += [0, (f"{value.number}: {value.name}", OTHERVALUE), _NEW_LINE]
+        if i == limit:
+            ops += [0, ("...", None), _NEW_LINE]
+            break
+    return ops
+
+
+# (message type, types, type_emphasize) -> field number -> plan
+_plans: dict[tuple[descriptor.Descriptor, bool, bool], dict[int, _FieldPlan]] = {}
+
+
+def _get_message_plan(message_type: descriptor.Descriptor, types: bool, type_emphasize: bool) -> dict[int, _FieldPlan]:
+    key = (message_type, types, type_emphasize)
+    plan = _plans.get(key)
+    if plan is None:
+        plan = _plans[key] = {field.number: _FieldPlan(field, types, type_emphasize) for field in message_type.fields}
+    return plan
+
+
+def _get_field_plan(field: descriptor.FieldDescriptor, types: bool, type_emphasize: bool) -> _FieldPlan:
+    if field.is_extension:
+        return _FieldPlan(field, types, type_emphasize)
+    return _get_message_plan(field.containing_type, types, type_emphasize)[field.number]
+
+
 def get_method_text(proto: Proto, text: Text | None = None) -> Text:
     if text is None:
         text = Text(no_wrap=True)
@@ -59,6 +292,65 @@ def get_method_text(proto: Proto, text: Text | None = None) -> Text:
     return text
 
 
+class RenderedProto:
+    """A proto formatted for display. The text is shared by everything showing the proto, so it mustn't be changed"""
+
+    def __init__(self, text: Text):
+        self.text: Text = text
+        self._lowered: str | None = None
+
+    @property
+    def lowered(self) -> str | None:
+        """The plain text in lowercase, for finding matches by offset. None if lowercasing moved any characters"""
+        if self._lowered is None:
+            plain = self.text.plain
+            lowered = plain.lower()
+            self._lowered = lowered if len(lowered) == len(plain) else ""
+        return self._lowered or None
+
+    def find(self, word: str, within: Iterable[int] | None = None) -> list[int]:
+        """Offsets of every occurrence of word, ignoring case and including overlapping ones. If within are the
+        offsets of a prefix of word, only those are checked
+        """
+        word = word.lower()
+        lowered = self.lowered
+        if not word:
+            return []
+        if lowered is None:
+            pattern = re.compile(f"(?=({re.escape(word)}))", re.IGNORECASE)
+            return [match.start() for match in pattern.finditer(self.text.plain)]
+        if within is not None:
+            return [start for start in within if lowered.startswith(word, start)]
+
+        starts = []
+        start = lowered.find(word)
+        while start != -1:
+            starts.append(start)
+            start = lowered.find(word, start + 1)
+        return starts
+
+
+# only this many protos keep their renders, the ones shown longest ago drop them. They're a lot bigger than the
+# raw protos the log's limits count
+RENDERED_PROTOS = 8
+_rendered_protos: OrderedDict[int, Proto] = OrderedDict()
+
+
+def format_proto_cached(proto: Proto, **options: Any) -> RenderedProto:
+    """MessageFormatter(**options).format_proto(proto), kept on the proto for the next time it's shown"""
+    key = ("format", tuple(sorted(options.items())))
+    rendered = proto.rendered.get(key)
+    if rendered is None:
+        rendered = proto.rendered[key] = RenderedProto(MessageFormatter(**options).format_proto(proto))
+
+    _rendered_protos[id(proto)] = proto
+    _rendered_protos.move_to_end(id(proto))
+    while len(_rendered_protos) > RENDERED_PROTOS:
+        _, evicted = _rendered_protos.popitem(last=False)
+        evicted.rendered.clear()
+    return rendered
+
+
 class MessageFormatter:
     def __init__(
         self,
@@ -69,10 +361,11 @@ class MessageFormatter:
         types: bool = True,
         type_emphasize: bool = False,
     ):
-        if text is None:
-            self.out = Text()
-        else:
-            self.out = text
+        self._out: Text | None = text
+        # what's been written since out was last built, with (start, end, style id) spans into it
+        self._parts: list[str] = []
+        self._length: int = 0
+        self._spans: list[tuple[int, int, int]] = []
 
         self.indent_size = indent
         self.current_indent: int = 1
@@ -82,10 +375,40 @@ class MessageFormatter:
         self._one_line: bool = one_line
         self._types: bool = types
 
-        self.__current_recursin_stack: list[str] = []
+        # current_indent -> what add_indent writes for it
+        self._indents: dict[int, str] = {}
+
+    @property
+    def out(self) -> Text:
+        """Everything formatted so far. Text is only built here, in one go, as appending each token to it is slow"""
+        if self._parts or self._out is None:
+            text = _build_text("".join(self._parts), self._spans)
+            if self._out is None:
+                self._out = text
+            else:
+                self._out.append_text(text)
+
+            self._parts = []
+            self._length = 0
+            self._spans = []
+        return self._out
 
     def append(self, text: str, style: Style | None = None) -> None:
-        self.out.append(text, style)
+        start = self._length
+        end = self._length = start + len(text)
+        self._parts.append(text)
+
+        if style is not None:
+            style_id = _STYLE_IDS.get(style)
+            if style_id is None:
+                style_id = _get_style_id(style)
+
+            spans = self._spans
+            # tokens next to each other in the same style share a span
+            if spans and spans[-1][1] == start and spans[-1][2] == style_id:
+                spans[-1] = (spans[-1][0], end, style_id)
+            else:
+                spans.append((start, end, style_id))
 
     def new_line(self) -> None:
         if not self._one_line:
@@ -117,41 +440,73 @@ class MessageFormatter:
         return self.out
 
     def add_indent(self) -> None:
-        if self._one_line:
-            indent_template = " "
-        elif self._indent_guides:
-            indent_template = ("│" + " " * (self.indent_size - 1)) * self.current_indent
-        else:
-            indent_template = " " * self.indent_size * self.current_indent
+        indent_template = self._indents.get(self.current_indent)
+        if indent_template is None:
+            if self._one_line:
+                indent_template = " "
+            elif self._indent_guides:
+                indent_template = ("│" + " " * (self.indent_size - 1)) * self.current_indent
+            else:
+                indent_template = " " * self.indent_size * self.current_indent
+            self._indents[self.current_indent] = indent_template
 
-        self.append(indent_template, style=Style(color="grey15"))
+        self.append(indent_template, style=INDENT_GUIDE)
+
+    def _get_plan(self, message_type: descriptor.Descriptor) -> dict[int, _FieldPlan]:
+        return _get_message_plan(message_type, self._types, self.type_emphasize)
+
+    def _get_extension_plan(self, field: descriptor.FieldDescriptor) -> _FieldPlan:
+        return _FieldPlan(field, self._types, self.type_emphasize)
 
     def print_message(self, message: Message) -> None:
-        fields = message.ListFields()
-        fields = sorted(fields, key=lambda f: 1 if f[0].cpp_type == descriptor.FieldDescriptor.CPPTYPE_MESSAGE else 0)
+        plan = self._get_plan(message.DESCRIPTOR)
+        fields = [
+            (self._get_extension_plan(field) if field.is_extension else plan[field.number], value)
+            for field, value in message.ListFields()
+        ]
         # message fields should come last
+        fields.sort(key=lambda f: f[0].last)
 
-        for field, value in fields:
-            if self._is_map_entry(field):
+        for field_plan, value in fields:
+            if field_plan.is_map:
+                entry_class = value.GetEntryClass()
                 for key in sorted(value):
-                    entry_submsg = value.GetEntryClass()(key=key, value=value[key])
-                    self.print_field(field, entry_submsg)
-            elif field.label == descriptor.FieldDescriptor.LABEL_REPEATED:
+                    self._print_field(field_plan, entry_class(key=key, value=value[key]))
+            elif field_plan.repeated:
                 for element in value:
-                    self.print_field(field, element)
+                    self._print_field(field_plan, element)
             else:
-                self.print_field(field, value)
+                self._print_field(field_plan, value)
 
-    def format_message_type(self, message_type: descriptor.EnumDescriptor | descriptor.Descriptor) -> Text:
+    def format_message_type(
+        self, message_type: descriptor.EnumDescriptor | descriptor.Descriptor, depth: int | None = None
+    ) -> Text:
+        """The definition of a message or enum. With depth, only that many levels of fields are shown"""
         self.append(message_type.name, style=MESSAGE_NAME)
         self.new_line()
         if isinstance(message_type, descriptor.EnumDescriptor):
             self.print_enum_values(message_type, limit=None)
         elif isinstance(message_type, descriptor.Descriptor):
-            self.print_message_descriptor(message_type)
+            self.print_message_descriptor(message_type, depth)
         return self.out
 
-    def print_message_descriptor(self, message: descriptor.Descriptor) -> None:
+    def print_message_descriptor(self, message: descriptor.Descriptor, depth: int | None = None) -> None:
+        indent = self.current_indent
+        self._replay(self._get_descriptor_ops(message, (), depth), indent)
+        self.current_indent = indent
+
+    def _get_descriptor_ops(self, message: descriptor.Descriptor, stack: tuple[str, ...], depth: int | None) -> list:
+        """What print_message_descriptor writes for message, as ops that don't depend on the indent it's at.
+
+        Nested types would otherwise be formatted again wherever they're used. Those are only cut short by types
+        that are already being expanded, so only these have to match for the ops to be reused.
+        """
+        reachable = _get_reachable_types(message)
+        key = (message, frozenset(name for name in stack if name in reachable), depth, self._types, self.type_emphasize)
+        ops = _descriptor_ops.get(key)
+        if ops is not None:
+            return ops
+
         def _sort_field(field_: descriptor.FieldDescriptor) -> int:
             if field_.type == descriptor.FieldDescriptor.TYPE_MESSAGE:
                 return 2
@@ -159,32 +514,46 @@ class MessageFormatter:
                 return 1
             return 0
 
-        fields = sorted(message.fields, key=_sort_field)
+        ops = []
+        plan = self._get_plan(message)
+        expand = depth is None or depth > 1
 
-        for field in fields:
-            self._print_field_name(field)
-            self.new_line()
+        for field in sorted(message.fields, key=_sort_field):
+            field_plan = plan[field.number]
+            ops.append(0)
+            if field_plan.label_on_new_line:
+                ops += [_NEW_LINE, 0]
+            ops += field_plan.label
+            ops.append(_NEW_LINE)
+
+            if not expand:
+                continue
 
             if field.message_type is not None:
                 name = field.message_type.name
-                if name in self.__current_recursin_stack:
-                    self.add_indent()
-                    self.append("...")
-                    self.new_line()
-                    self.add_indent()
-                    continue
-
-                list_length = len(self.__current_recursin_stack)
-                self.__current_recursin_stack.append(name)
-                self.current_indent += 1
-                self.print_message_descriptor(field.message_type)
-                self.current_indent -= 1
-                del self.__current_recursin_stack[list_length:]
+                if name in stack:
+                    ops += [0, ("...", None), _NEW_LINE, 0]
+                else:
+                    nested = self._get_descriptor_ops(field.message_type, stack + (name,), depth and depth - 1)
+                    ops.append(_Nested(1, nested))
 
             elif field.enum_type is not None:
-                self.current_indent += 1
-                self.print_enum_values(field.enum_type)
-                self.current_indent -= 1
+                ops.append(_Nested(1, _get_enum_ops(field.enum_type)))
+
+        _descriptor_ops[key] = ops
+        return ops
+
+    def _replay(self, ops: list, indent: int) -> None:
+        for op in ops:
+            if op is _NEW_LINE:
+                self.new_line()
+            elif op.__class__ is int:
+                self.current_indent = indent + op
+                self.add_indent()
+            elif op.__class__ is _Nested:
+                self._replay(op.ops, indent + op.indent)
+            else:
+                self.append(*op)
 
     def print_enum_values(self, enum: descriptor.EnumDescriptor, limit: int | None = 30) -> None:
         for i, value in enumerate(enum.values):
@@ -198,100 +567,23 @@ class MessageFormatter:
                 self.new_line()
                 break
 
-    @staticmethod
-    def _is_map_entry(field: descriptor.FieldDescriptor) -> bool:
-        return (
-            field.type == descriptor.FieldDescriptor.TYPE_MESSAGE
-            and field.message_type.has_options
-            and field.message_type.GetOptions().map_entry
-        )
-
     def print_field(self, field: descriptor.FieldDescriptor, value: Any) -> None:
         """Print a single field name/value pair."""
-        self._print_field_name(field)
-        self.append(" ")
-        self.print_field_value(field, value)
+        self._print_field(_get_field_plan(field, self._types, self.type_emphasize), value)
+
+    def _print_field(self, plan: _FieldPlan, value: Any) -> None:
+        self._print_field_name(plan, plan.field_label)
+        self._print_field_value(plan, value)
         self.new_line()
 
-    def _print_field_name(self, field: descriptor.FieldDescriptor) -> None:
+    def _print_field_name(self, plan: _FieldPlan, label: list[tuple[str, Style | None]] | None = None) -> None:
         self.add_indent()
-
-        def _add_repeated():
-            if field.label == descriptor.FieldDescriptor.LABEL_REPEATED:
-                self.append(" repeated", style=TYPE)
-
-        if field.is_extension:
-            self.append("[", style=BRACKETS)
-            if (
-                field.containing_type.GetOptions().message_set_wire_format
-                and field.type == descriptor.FieldDescriptor.TYPE_MESSAGE
-                and field.label == descriptor.FieldDescriptor.LABEL_OPTIONAL
-            ):
-                self.append(field.message_type.full_name)
-            else:
-                self.append(field.full_name)
-            self.append("]", style=BRACKETS)
-        elif field.type == descriptor.FieldDescriptor.TYPE_GROUP:
-            # For groups, use the capitalized name.
-            self.append(field.message_type.name)
-        elif field.cpp_type == descriptor.FieldDescriptor.CPPTYPE_MESSAGE:
-            self.new_line()
-            self.add_indent()
-
-            if self.type_emphasize:
-                self.append(field.name + ": ")
-                self.append(field.message_type.name, style=SUB_MESSAGE_NAME)
-                _add_repeated()
-            else:
-                if self._types:
-                    self.append(field.message_type.name + " ", style=SUB_MESSAGE_NAME)
-                self.append(field.name)
-        elif field.enum_type is not None and self.type_emphasize:
+        if plan.label_on_new_line:
             self.new_line()
             self.add_indent()
 
-            self.append(field.name + ": ")
-
-            full_name = field.enum_type.name
-            containg_type: descriptor.Descriptor | None = field.enum_type.containing_type
-
-            if containg_type is not None:
-                i = field.enum_type.full_name.find(field.enum_type.containing_type.name)
-                if i > 0:
-                    full_name = field.enum_type.full_name[i:]
-            self.append(full_name, style=ENUM)
-            _add_repeated()
-        else:
-            type_name = TYPES.get(field.type)
-
-            if self.type_emphasize:
-                self.append(field.name + ": ")
-
-                if field.cpp_type == descriptor.FieldDescriptor.CPPTYPE_STRING:
-                    style = STRING
-                elif field.cpp_type == descriptor.FieldDescriptor.CPPTYPE_BOOL:
-                    style = BOOLEAN
-                elif field.cpp_type in (
-                    descriptor.FieldDescriptor.CPPTYPE_FLOAT,
-                    descriptor.FieldDescriptor.CPPTYPE_DOUBLE,
-                ):
-                    style = NUMBER
-                elif field.cpp_type in (
-                    descriptor.FieldDescriptor.CPPTYPE_INT32,
-                    descriptor.FieldDescriptor.CPPTYPE_INT64,
-                    descriptor.FieldDescriptor.CPPTYPE_UINT32,
-                    descriptor.FieldDescriptor.CPPTYPE_UINT64,
-                ):
-                    style = NUMBER
-                else:
-                    style = OTHERVALUE
-
-                self.append(type_name, style=style)
-                _add_repeated()
-            else:
-                if type_name is not None and self._types:
-                    self.append(f"{type_name} ", style=TYPE)
-                self.append(field.name)
+        for text, style in plan.label if label is None else label:
+            self.append(text, style)
 
     def print_field_value(self, field: descriptor.FieldDescriptor, value: Any) -> None:
         """Print a single field value (not including name).
@@ -302,39 +594,20 @@ class MessageFormatter:
           field: The descriptor of the field to be printed.
           value: The value of the field.
         """
-        if field.cpp_type == descriptor.FieldDescriptor.CPPTYPE_MESSAGE:
+        self._print_field_value(_get_field_plan(field, self._types, self.type_emphasize), value)
+
+    def _print_field_value(self, plan: _FieldPlan, value: Any) -> None:
+        kind = plan.kind
+        if kind == _MESSAGE:
             self.print_message_field_value(value)
-        elif field.cpp_type == descriptor.FieldDescriptor.CPPTYPE_ENUM:
-            enum_value = field.enum_type.values_by_number.get(value, None)
-            if enum_value is not None:
-                self.append(f"{field.enum_type.name}.{enum_value.name}:{value}", style=ENUM)
-            else:
-                self.append(str(value), style=ENUM)
-        elif field.cpp_type == descriptor.FieldDescriptor.CPPTYPE_STRING:
-            self.append('"', style=STRING)
-            if field.type == descriptor.FieldDescriptor.TYPE_BYTES:
-                # We always need to escape all binary data in TYPE_BYTES fields.
-                out_as_utf8 = False
-            else:
-                out_as_utf8 = True
-            self.append(text_encoding.CEscape(value, out_as_utf8), style=STRING)
-            self.append('"', style=STRING)
-        elif field.cpp_type == descriptor.FieldDescriptor.CPPTYPE_BOOL:
-            if value:
-                self.append("true", style=BOOLEAN)
-            else:
-                self.append("false", style=BOOLEAN)
-        elif field.cpp_type in (descriptor.FieldDescriptor.CPPTYPE_FLOAT, descriptor.FieldDescriptor.CPPTYPE_DOUBLE):
-            self.append(str(value), style=NUMBER)
-        elif field.cpp_type in (
-            descriptor.FieldDescriptor.CPPTYPE_INT32,
-            descriptor.FieldDescriptor.CPPTYPE_INT64,
-            descriptor.FieldDescriptor.CPPTYPE_UINT32,
-            descriptor.FieldDescriptor.CPPTYPE_UINT64,
-        ):
-            self.append(str(value), style=NUMBER)
+        elif kind == _ENUM:
+            self.append(plan.enum_names.get(value) or str(value), style=ENUM)
+        elif kind == _STRING:
+            self.append('"' + text_encoding.CEscape(value, plan.escape_utf8) + '"', style=STRING)
+        elif kind == _BOOL:
+            self.append("true" if value else "false", style=BOOLEAN)
         else:
-            self.append(str(value), style=OTHERVALUE)
+            self.append(str(value), style=plan.value_style)
 
     def print_message_field_value(self, value: Message) -> None:
         if not value.ListFields():
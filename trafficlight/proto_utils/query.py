@@ -0,0 +1,339 @@
+"""Structured queries over decoded messages.
+
+A query is one or more conditions joined by "and" or "or", where "and" binds tighter:
+
+    GetMapObjectsOutProto.map_cell.wild_pokemon.pokemon.pokemon_id == PIKACHU
+    response.status != SUCCESS and request.level >= 30
+
+Paths start at a message name, or at "request", "response" or "message" to look at any message of that kind.
+Conditions are ==, !=, <, <=, > and >=. Without one, the field only has to be set. Everything is case-insensitive.
+
+Paths and values are checked against the descriptors when compiling, matching then only walks the fields a
+query refers to. A repeated field along the path matches if any of its elements does, != only if none does.
+"""
+
+from __future__ import annotations
+
+import operator
+import re
+from typing import Any, Callable, Iterator, NamedTuple, Type
+
+from google.protobuf import descriptor
+from google.protobuf.message import Message as ProtobufMessage
+
+from trafficlight import protos
+from .proto import MESSAGES, RESPONSES, Message, Proto, Request, Respone
+
+_TOKEN = re.compile(r"\s*(?:(==|!=|<=|>=|<|>)|\"((?:[^\"\\]|\\.)*)\"|'((?:[^'\\]|\\.)*)'|([^\s=!<>\"']+))")
+
+_OPERATORS: dict[str, Callable[[Any, Any], bool]] = {
+    "==": operator.eq,
+    "!=": operator.eq,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+_KINDS: dict[str, Type[Message] | None] = {"request": Request, "response": Respone, "message": None}
+
+_INT_TYPES = {
+    descriptor.FieldDescriptor.TYPE_INT32,
+    descriptor.FieldDescriptor.TYPE_INT64,
+    descriptor.FieldDescriptor.TYPE_UINT32,
+    descriptor.FieldDescriptor.TYPE_UINT64,
+    descriptor.FieldDescriptor.TYPE_SINT32,
+    descriptor.FieldDescriptor.TYPE_SINT64,
+    descriptor.FieldDescriptor.TYPE_FIXED32,
+    descriptor.FieldDescriptor.TYPE_FIXED64,
+    descriptor.FieldDescriptor.TYPE_SFIXED32,
+    descriptor.FieldDescriptor.TYPE_SFIXED64,
+}
+_FLOAT_TYPES = {descriptor.FieldDescriptor.TYPE_FLOAT, descriptor.FieldDescriptor.TYPE_DOUBLE}
+
+# casefolded names -> descriptors, filled on first use
+_message_types: dict[str, descriptor.Descriptor] = {}
+_fields: dict[str, dict[str, descriptor.FieldDescriptor]] = {}
+
+
+class QueryError(ValueError):
+    pass
+
+
+class _PathError(QueryError):
+    """A path that doesn't work for one message type, after resolving depth of its fields"""
+
+    def __init__(self, message: str, depth: int):
+        super().__init__(message)
+        self.depth: int = depth
+
+
+class _Plan(NamedTuple):
+    fields: list[descriptor.FieldDescriptor]
+    value: Any
+
+
+class Condition:
+    """A single path and comparison, already resolved for every message type it can apply to"""
+
+    def __init__(self, kind: Type[Message] | None, plans: dict[str, _Plan], op: str | None):
+        self.kind: Type[Message] | None = kind
+        # full name of the message type -> how to get to the value there
+        self.plans: dict[str, _Plan] = plans
+        self.op: str | None = op
+
+    @property
+    def message_name(self) -> str | None:
+        """Name of the only message type this can apply to, if there's just one"""
+        if self.kind is None and len(self.plans) == 1:
+            return next(iter(self.plans)).rpartition(".")[2]
+        return None
+
+    def matches(self, message: Message) -> bool:
+        if self.kind is not None and not isinstance(message, self.kind):
+            return False
+        if message.message_type is None:
+            return False
+        plan = self.plans.get(message.message_type.full_name)
+        if plan is None:
+            return False
+
+        payload = message.payload
+        if payload is None:
+            return False
+
+        values = _walk(payload, plan.fields)
+        if self.op is None:
+            return any(_is_set(value) for value in values)
+
+        compare = _OPERATORS[self.op]
+        if self.op == "!=":
+            found = list(values)
+            return bool(found) and not any(compare(_normalize(value), plan.value) for value in found)
+        return any(compare(_normalize(value), plan.value) for value in values)
+
+
+class Query:
+    """A compiled query. Matches a proto if its messages, or the ones of its proxy, fulfill it"""
+
+    def __init__(self, text: str, groups: list[list[Condition]]):
+        self.text: str = text
+        # conditions in a group are joined by "and", groups by "or"
+        self.groups: list[list[Condition]] = groups
+
+    @property
+    def message_names(self) -> set[str] | None:
+        """Names of the message types a record needs one of to match, None if that's not known"""
+        names = set()
+        for group in self.groups:
+            name = next((condition.message_name for condition in group if condition.message_name), None)
+            if name is None:
+                return None
+            names.add(name)
+        return names
+
+    def matches(self, proto: Proto) -> bool:
+        messages = list(_get_messages(proto))
+        return any(
+            all(any(condition.matches(message) for message in messages) for condition in group) for group in self.groups
+        )
+
+
+def _get_messages(proto: Proto) -> Iterator[Message]:
+    yield from proto.messages
+    if proto.proxy is not None:
+        yield from _get_messages(proto.proxy)
+
+
+def _walk(message: ProtobufMessage, fields: list[descriptor.FieldDescriptor]) -> Iterator[Any]:
+    field, rest = fields[0], fields[1:]
+
+    if field.label == descriptor.FieldDescriptor.LABEL_REPEATED:
+        values = getattr(message, field.name)
+    elif field.message_type is not None:
+        if not message.HasField(field.name):
+            return
+        values = (getattr(message, field.name),)
+    else:
+        values = (getattr(message, field.name),)
+
+    for value in values:
+        if rest:
+            yield from _walk(value, rest)
+        else:
+            yield value
+
+
+def _is_set(value: Any) -> bool:
+    if isinstance(value, ProtobufMessage):
+        return True
+    return bool(value)
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return value.casefold()
+    return value
+
+
+def _get_message_type(name: str) -> descriptor.Descriptor | None:
+    if not _message_types:
+        for message_type in protos.DESCRIPTOR.message_types_by_name.values():
+            _message_types[message_type.name.casefold()] = message_type
+    return _message_types.get(name)
+
+
+def _get_field(message_type: descriptor.Descriptor, name: str) -> descriptor.FieldDescriptor | None:
+    fields = _fields.get(message_type.full_name)
+    if fields is None:
+        fields = _fields[message_type.full_name] = {field.name.casefold(): field for field in message_type.fields}
+    return fields.get(name)
+
+
+def _convert(field: descriptor.FieldDescriptor, op: str | None, value: str | None) -> Any:
+    if op is None or value is None:
+        return None
+    if field.message_type is not None:
+        raise QueryError(f"{field.name} is a message, it can only be checked for being set")
+
+    if field.type == descriptor.FieldDescriptor.TYPE_ENUM:
+        for enum_value in field.enum_type.values:
+            if enum_value.name.casefold() == value:
+                return enum_value.number
+        try:
+            return int(value)
+        except ValueError:
+            raise QueryError(f"{value} isn't a value of {field.enum_type.name}") from None
+
+    if field.type == descriptor.FieldDescriptor.TYPE_BOOL:
+        if value not in ("true", "false"):
+            raise QueryError(f"{field.name} is a bool, compare it to true or false")
+        return value == "true"
+
+    if field.type in _INT_TYPES or field.type in _FLOAT_TYPES:
+        try:
+            return int(value) if field.type in _INT_TYPES else float(value)
+        except ValueError:
+            raise QueryError(f"{field.name} is a number, {value} isn't") from None
+
+    if field.type == descriptor.FieldDescriptor.TYPE_STRING:
+        return value
+    raise QueryError(f"{field.name} can't be compared")
+
+
+def _plan(message_type: descriptor.Descriptor | None, path: list[str], op: str | None, value: str | None) -> _Plan:
+    fields: list[descriptor.FieldDescriptor] = []
+    for name in path:
+        if message_type is None:
+            raise _PathError(f"{fields[-1].name} isn't a message, it has no field {name}", len(fields))
+
+        field = _get_field(message_type, name)
+        if field is None:
+            raise _PathError(f"{message_type.name} has no field {name}", len(fields))
+        if field.message_type is not None and field.message_type.GetOptions().map_entry:
+            raise _PathError(f"{field.name} is a map, those aren't supported", len(fields))
+
+        fields.append(field)
+        message_type = field.message_type
+
+    if not fields:
+        raise _PathError("a path needs at least one field", 0)
+    try:
+        return _Plan(fields, _convert(fields[-1], op, value))
+    except QueryError as e:
+        raise _PathError(str(e), len(fields)) from None
+
+
+def _compile_condition(path: str, op: str | None, value: str | None) -> Condition:
+    root, *names = path.split(".")
+
+    message_type = _get_message_type(root)
+    if message_type is not None:
+        return Condition(None, {message_type.full_name: _plan(message_type, names, op, value)}, op)
+
+    if root not in _KINDS:
+        raise QueryError(f"unknown message {root}, paths start at a message name, request, response or message")
+
+    kind = _KINDS[root]
+    fields: list[descriptor.FieldDescriptor] = []
+    if kind is not Respone:
+        fields.extend(MESSAGES.values())
+    if kind is not Request:
+        fields.extend(RESPONSES.values())
+
+    plans = {}
+    errors: list[_PathError] = []
+    for field in fields:
+        try:
+            plans[field.message_type.full_name] = _plan(field.message_type, names, op, value)
+        except _PathError as e:
+            errors.append(e)
+
+    if not plans:
+        # the message type that got furthest along the path is most likely the one that was meant
+        error = max(errors, key=lambda e: e.depth, default=None)
+        raise QueryError(f"no {root} matches {path}: {error}")
+    return Condition(kind, plans, op)
+
+
+def _tokenize(text: str) -> list[tuple[str, str]]:
+    """Splits text into (kind, token) pairs, kind being "op", "string" or "word" """
+    tokens = []
+    position = 0
+    text = text.strip()
+
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            raise QueryError(f"can't read {text[position:]}")
+        position = match.end()
+
+        op, double_quoted, single_quoted, word = match.groups()
+        if op is not None:
+            tokens.append(("op", op))
+        elif word is not None:
+            tokens.append(("word", word))
+        else:
+            string = double_quoted if double_quoted is not None else single_quoted
+            tokens.append(("string", re.sub(r"\\(.)", r"\1", string)))
+    return tokens
+
+
+def compile_query(text: str) -> Query:
+    """Parse and check a query. Raises QueryError with a message meant for the user if it's invalid"""
+    tokens = _tokenize(text.casefold())
+    if not tokens:
+        raise QueryError("empty query")
+
+    groups: list[list[Condition]] = [[]]
+    position = 0
+    while True:
+        kind, path = tokens[position]
+        if kind != "word" or path in ("and", "or"):
+            raise QueryError(f"expected a path instead of {path}")
+        position += 1
+
+        op = value = None
+        if position < len(tokens) and tokens[position][0] == "op":
+            op = tokens[position][1]
+            if position + 1 == len(tokens) or tokens[position + 1][0] == "op":
+                raise QueryError(f"{op} needs a value")
+            value = tokens[position + 1][1]
+            position += 2
+
+        groups[-1].append(_compile_condition(path, op, value))
+
+        if position == len(tokens):
+            break
+
+        joiner = tokens[position][1]
+        if joiner == "or":
+            groups.append([])
+        elif joiner != "and":
+            raise QueryError(f'expected "and" or "or" instead of {joiner}')
+
+        position += 1
+        if position == len(tokens):
+            raise QueryError(f"{joiner} needs another condition")
+
+    return Query(text, groups)
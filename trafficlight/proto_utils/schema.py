@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from typing import Any
+
+from google.protobuf import descriptor
+
+from .proto_format import TYPES
+
+_LABELS = {
+    descriptor.FieldDescriptor.LABEL_OPTIONAL: "optional",
+    descriptor.FieldDescriptor.LABEL_REQUIRED: "required",
+    descriptor.FieldDescriptor.LABEL_REPEATED: "repeated",
+}
+
+# full name -> schema of that type alone, the types it refers to are only named
+_type_schemas: dict[str, dict[str, Any]] = {}
+
+
+def _field_schema(field: descriptor.FieldDescriptor) -> dict[str, Any]:
+    schema = {"name": field.name, "number": field.number, "type": TYPES.get(field.type, str(field.type))}
+
+    if field.message_type is not None and field.message_type.GetOptions().map_entry:
+        key, value = field.message_type.fields_by_name["key"], field.message_type.fields_by_name["value"]
+        schema["type"] = "map"
+        schema["key"] = TYPES.get(key.type, str(key.type))
+        schema["value"] = _type_reference(value) or TYPES.get(value.type, str(value.type))
+        return schema
+
+    schema["label"] = _LABELS.get(field.label, str(field.label))
+    reference = _type_reference(field)
+    if reference is not None:
+        schema["type_name"] = reference
+    if field.containing_oneof is not None:
+        schema["oneof"] = field.containing_oneof.name
+    return schema
+
+
+def _type_reference(field: descriptor.FieldDescriptor) -> str | None:
+    if field.message_type is not None:
+        return field.message_type.full_name
+    if field.enum_type is not None:
+        return field.enum_type.full_name
+    return None
+
+
+def _referenced_types(
+    type_: descriptor.Descriptor | descriptor.EnumDescriptor,
+) -> list[descriptor.Descriptor | descriptor.EnumDescriptor]:
+    if isinstance(type_, descriptor.EnumDescriptor):
+        return []
+
+    referenced = []
+    for field in type_.fields:
+        if field.message_type is not None and field.message_type.GetOptions().map_entry:
+            # maps are shown as key and value, their entry type isn't listed
+            referenced += _referenced_types(field.message_type)
+        elif field.message_type is not None:
+            referenced.append(field.message_type)
+        elif field.enum_type is not None:
+            referenced.append(field.enum_type)
+    return referenced
+
+
+def get_type_schema(type_: descriptor.Descriptor | descriptor.EnumDescriptor) -> dict[str, Any]:
+    """The schema of a single message or enum. Fields refer to other types by their full name"""
+    schema = _type_schemas.get(type_.full_name)
+    if schema is None:
+        if isinstance(type_, descriptor.EnumDescriptor):
+            schema = {"kind": "enum", "values": {value.name: value.number for value in type_.values}}
+        else:
+            schema = {"kind": "message", "fields": [_field_schema(field) for field in type_.fields]}
+        _type_schemas[type_.full_name] = schema
+    return schema
+
+
+def get_schema(type_: descriptor.Descriptor | descriptor.EnumDescriptor, depth: int | None = None) -> dict[str, Any]:
+    """The layout of a message or enum and everything its fields lead to, each type listed once by its full name.
+
+    With depth, only types up to that many levels deep are listed, counting the same as format_message_type:
+    at 1 that's type_ alone, at 2 also the types its fields refer to.
+    """
+    types = {}
+    level = [type_]
+    distance = 1
+
+    while level and (depth is None or distance <= depth):
+        next_level = []
+        for current in level:
+            if current.full_name in types:
+                continue
+            types[current.full_name] = get_type_schema(current)
+            next_level += _referenced_types(current)
+        level = next_level
+        distance += 1
+
+    return {"type": type_.full_name, "types": types}
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+
+from blackboxprotobuf.lib.api import decode_message
+
+
+class TypedefCache:
+    """Remembers the blackbox typedef per method and direction.
+
+    bbpb has to guess the type of every field when decoding without a typedef. After the first successful
+    decode of a method, the learned typedef is used for later payloads, so only new fields need guessing.
+    If a payload doesn't match the learned typedef, it's decoded from scratch and that typedef is learned instead.
+
+    Messages are decoded both on the event loop and in the text search thread, so the typedefs are only touched
+    while holding a lock. Decode pool workers have their own copy, they send what they learned back with their
+    results (see learn()).
+    """
+
+    def __init__(self, path: str = ""):
+        self.path: str = path
+        self.hits: int = 0
+        self.mismatches: int = 0
+        self._typedefs: dict[tuple[str, int], dict] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def decode(self, direction: str, method_id: int, raw: bytes) -> tuple[dict, dict]:
+        key = (direction, method_id)
+        typedef = self.get(direction, method_id)
+
+        # decoding happens outside the lock, typedefs are never changed in place so it's fine if it's replaced
+        if typedef is not None:
+            try:
+                value, new_typedef = decode_message(raw, typedef)
+            except Exception:
+                with self._lock:
+                    self.mismatches += 1
+            else:
+                with self._lock:
+                    self.hits += 1
+                    if new_typedef != typedef:
+                        # the payload had fields we didn't know about yet
+                        self._typedefs[key] = new_typedef
+                return value, new_typedef
+
+        value, typedef = decode_message(raw)
+        self.learn(direction, method_id, typedef)
+        return value, typedef
+
+    def get(self, direction: str, method_id: int) -> dict | None:
+        with self._lock:
+            return self._typedefs.get((direction, method_id))
+
+    def learn(self, direction: str, method_id: int, typedef: dict) -> None:
+        """Use typedef for this method and direction from now on, i.e. one a decode pool worker learned"""
+        with self._lock:
+            self._typedefs[(direction, method_id)] = typedef
+
+    def load(self, path: str) -> None:
+        """Load typedefs saved before. If the file can't be read, it's ignored and typedefs are learned from scratch"""
+        try:
+            with open(path, encoding="utf-8") as f:
+                raw_typedefs: dict[str, dict] = json.load(f)
+
+            typedefs = {}
+            for key, typedef in raw_typedefs.items():
+                direction, method_id = key.rsplit(":", 1)
+                # files saved before the spelling was fixed
+                if direction == "Respone":
+                    direction = "Response"
+                typedefs[(direction, int(method_id))] = typedef
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"Couldn't load typedefs from {path}, starting without them: {e}")
+            return
+
+        with self._lock:
+            self._typedefs.update(typedefs)
+
+    def save(self, path: str | None = None) -> None:
+        path = path or self.path
+        with self._lock:
+            typedefs = list(self._typedefs.items())
+        if not path or not typedefs:
+            return
+
+        raw_typedefs = {f"{direction}:{method_id}": typedef for (direction, method_id), typedef in typedefs}
+
+        # written next to it first, so an interrupted save doesn't leave a broken file behind
+        temp_path = path + ".tmp"
+        try:
+            with open(temp_path, mode="w", encoding="utf-8") as f:
+                json.dump(raw_typedefs, f, indent=2)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Couldn't save typedefs to {path}: {e}")
+
+    def get_stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"typedefs": len(self._typedefs), "hits": self.hits, "mismatches": self.mismatches}
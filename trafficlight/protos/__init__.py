@@ -1 +1,111 @@
-from .pogo_pb2 import *
+"""Lazy access to everything in pogo_pb2.
+
+Importing pogo_pb2 builds a class for every single message, which takes a while. After the first import,
+its serialized file descriptor is cached on disk. Later starts only load that into the descriptor pool and
+create message classes once they're first accessed, i.e. protos.GetMapObjectsOutProto.
+"""
+
+from __future__ import annotations
+
+import importlib
+import importlib.util
+import sys
+from types import ModuleType
+from typing import Any, Type
+
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import message_factory as _message_factory
+from google.protobuf.internal.enum_type_wrapper import EnumTypeWrapper
+from google.protobuf.message import Message as _ProtobufMessage
+
+from trafficlight.cache import file_stamp, read_cache, write_cache
+
+_MODULE_NAME = __name__ + ".pogo_pb2"
+_CACHE_PREFIX = "pogo_descriptor-"
+
+_factory = _message_factory.MessageFactory(_descriptor_pool.Default())
+_file_descriptor: _descriptor.FileDescriptor | None = None
+_enum_values: dict[str, int] | None = None
+
+
+def _get_module() -> ModuleType | None:
+    return sys.modules.get(_MODULE_NAME)
+
+
+def get_proto_module_path() -> str:
+    spec = importlib.util.find_spec(_MODULE_NAME)
+    if spec is None or spec.origin is None:
+        raise ImportError(f"{_MODULE_NAME} not found")
+    return spec.origin
+
+
+def get_file_descriptor() -> _descriptor.FileDescriptor:
+    global _file_descriptor
+
+    if _file_descriptor is not None:
+        return _file_descriptor
+
+    cache_name = _CACHE_PREFIX + file_stamp(get_proto_module_path()) + ".bin"
+    serialized = read_cache(cache_name)
+
+    if serialized is None:
+        module = importlib.import_module(_MODULE_NAME)
+        _file_descriptor = module.DESCRIPTOR
+        write_cache(cache_name, module.DESCRIPTOR.serialized_pb, prefix=_CACHE_PREFIX)
+    else:
+        _file_descriptor = _descriptor_pool.Default().AddSerializedFile(serialized)
+
+    return _file_descriptor
+
+
+def get_message_class(message_type: _descriptor.Descriptor) -> Type[_ProtobufMessage]:
+    module = _get_module()
+    if module is None:
+        return _factory.GetPrototype(message_type)
+
+    # pogo_pb2 was imported already, its classes have to be used so isinstance checks keep working
+    if message_type.containing_type is None:
+        return getattr(module, message_type.name)
+    return getattr(get_message_class(message_type.containing_type), message_type.name)
+
+
+def _get_enum_value(name: str) -> int | None:
+    global _enum_values
+
+    if _enum_values is None:
+        _enum_values = {
+            value.name: value.number
+            for enum_type in get_file_descriptor().enum_types_by_name.values()
+            for value in enum_type.values
+        }
+    return _enum_values.get(name)
+
+
+def _resolve(name: str) -> Any:
+    if name == "DESCRIPTOR":
+        return get_file_descriptor()
+
+    module = _get_module()
+    if module is not None:
+        return getattr(module, name)
+
+    file_descriptor = get_file_descriptor()
+    if name in file_descriptor.message_types_by_name:
+        return get_message_class(file_descriptor.message_types_by_name[name])
+    if name in file_descriptor.enum_types_by_name:
+        return EnumTypeWrapper(file_descriptor.enum_types_by_name[name])
+
+    value = _get_enum_value(name)
+    if value is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return value
+
+
+def __getattr__(name: str) -> Any:
+    if name.startswith("__"):
+        raise AttributeError(name)
+
+    value = _resolve(name)
+    globals()[name] = value
+    return value
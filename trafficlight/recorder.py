@@ -0,0 +1,313 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import bisect
+import os
+import queue
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, BinaryIO, Iterator
+
+import msgpack
+
+from .model import RequestModel
+
+MAGIC = b"TLREC\x01"
+INDEX_MAGIC = b"TLIDX\x01"
+
+# every frame is a big-endian length followed by that many bytes of msgpack
+_FRAME_HEADER = struct.Struct(">I")
+# one entry per proto of a record: receive time, method, offset of the record's frame. The receiver takes any int
+# as method, so it gets the same range msgpack has for it
+_INDEX_ENTRY = struct.Struct(">dqQ")
+
+_STOP = object()
+
+
+def _get_index_path(path: str | Path) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + ".idx")
+
+
+def _to_bytes(raw: bytes | str | None) -> bytes | str:
+    # the same as Message.raw_bytes. Anything that isn't valid base64 is kept as it came in
+    if raw is None or isinstance(raw, bytes):
+        return raw or b""
+    try:
+        return base64.b64decode(raw.rstrip("\0"))
+    except binascii.Error:
+        return raw
+
+
+def _pack_record(received: float, record: RequestModel) -> bytes:
+    # the same layout the receiver accepts, so recorded bodies can be sent to it again
+    return msgpack.packb(
+        {
+            "time": received,
+            "rpcid": record.rpcid,
+            "rpchandle": record.rpchandle,
+            "rpcstatus": record.rpcstatus,
+            "protos": [
+                {"method": proto.method, "request": _to_bytes(proto.request), "response": _to_bytes(proto.response)}
+                for proto in record.protos
+            ],
+        }
+    )
+
+
+def _read_frame(file: BinaryIO) -> bytes | None:
+    """The next frame's body, or None at the end of the file or if the frame was only partly written"""
+    header = file.read(_FRAME_HEADER.size)
+    if len(header) < _FRAME_HEADER.size:
+        return None
+    (length,) = _FRAME_HEADER.unpack(header)
+    body = file.read(length)
+    if len(body) < length:
+        return None
+    return body
+
+
+class RecorderStats:
+    def __init__(self):
+        self.recorded: int = 0
+        self.bytes: int = 0
+        self.syncs: int = 0
+        self.failed: int = 0
+
+
+class SessionRecorder:
+    """Appends every received record to a capture file, next to an index of where to find them.
+
+    record() only hands the record to a writer thread, so recording adds next to nothing to ingest. The thread
+    writes whatever piled up in one go and only fsyncs once every sync_interval seconds. Records are kept in the
+    order they arrived, undecoded, with base64 payloads turned into bytes.
+
+    The index at <path>.idx has a fixed size entry per proto with the time its record arrived, the method and the
+    offset of the record's frame. Appending to an existing capture first drops whatever a crash left half written.
+    """
+
+    def __init__(self, path: str | Path, sync_interval: float = 1.0):
+        self.path: Path = Path(path)
+        self.index_path: Path = _get_index_path(path)
+        self.sync_interval: float = sync_interval
+        self.stats: RecorderStats = RecorderStats()
+
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        data_file, index_file = self._open()
+        self._thread = threading.Thread(
+            target=self._run, args=(data_file, index_file), name="session-recorder", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def record(self, records: list[RequestModel], received: float | None = None) -> None:
+        if not self.running:
+            # nothing would ever take them off the queue
+            self.stats.failed += len(records)
+            return
+        self._queue.put((time.time() if received is None else received, records))
+
+    def close(self) -> None:
+        """Write everything that's still queued, sync and close the files"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def get_stats(self) -> dict[str, int | str]:
+        return {"file": str(self.path), "running": self.running, "pending": self.pending, **vars(self.stats)}
+
+    def _open(self) -> tuple[BinaryIO, BinaryIO]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        files = []
+        try:
+            for path, magic in ((self.path, MAGIC), (self.index_path, INDEX_MAGIC)):
+                file = open(path, "a+b")
+                files.append(file)
+                if file.seek(0, os.SEEK_END) == 0:
+                    file.write(magic)
+                    file.flush()
+                    continue
+                file.seek(0)
+                if file.read(len(magic)) != magic:
+                    raise ValueError(f"{path} exists and is not a session recording")
+
+            data_file, index_file = files
+            self._recover(data_file, index_file)
+        except Exception:
+            for file in files:
+                file.close()
+            raise
+        return data_file, index_file
+
+    @staticmethod
+    def _recover(data_file: BinaryIO, index_file: BinaryIO) -> None:
+        """Index the frames the index doesn't have yet and cut off anything that was only partly written"""
+        entries = (index_file.seek(0, os.SEEK_END) - len(INDEX_MAGIC)) // _INDEX_ENTRY.size
+
+        def get_offset(entry: int) -> int:
+            index_file.seek(len(INDEX_MAGIC) + entry * _INDEX_ENTRY.size)
+            return _INDEX_ENTRY.unpack(index_file.read(_INDEX_ENTRY.size))[2]
+
+        # the last indexed frame might only have some of its entries, they're all dropped and it's indexed again.
+        # So are frames that didn't make it to the disk at all
+        offset = len(MAGIC)
+        while entries:
+            last_offset = get_offset(entries - 1)
+            while entries and get_offset(entries - 1) == last_offset:
+                entries -= 1
+            data_file.seek(last_offset)
+            if _read_frame(data_file) is not None:
+                offset = last_offset
+                break
+        index_file.truncate(len(INDEX_MAGIC) + entries * _INDEX_ENTRY.size)
+        index_file.seek(0, os.SEEK_END)
+
+        data_file.seek(offset)
+        while (body := _read_frame(data_file)) is not None:
+            record = msgpack.unpackb(body)
+            index_file.write(b"".join(_INDEX_ENTRY.pack(record["time"], p["method"], offset) for p in record["protos"]))
+            offset = data_file.tell()
+
+        data_file.truncate(offset)
+        data_file.seek(0, os.SEEK_END)
+        index_file.flush()
+
+    def _run(self, data_file: BinaryIO, index_file: BinaryIO) -> None:
+        last_sync = time.monotonic()
+        unsynced = False
+
+        with data_file, index_file:
+            while True:
+                # with nothing to sync, there's nothing to do until the next record
+                timeout = max(0.0, last_sync + self.sync_interval - time.monotonic()) if unsynced else None
+                try:
+                    batch = [self._queue.get(timeout=timeout)]
+                except queue.Empty:
+                    batch = []
+                # everything else that piled up goes into the same write
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                stopping = _STOP in batch
+                if stopping:
+                    batch = [entry for entry in batch if entry is not _STOP]
+
+                try:
+                    if batch:
+                        self._write(data_file, index_file, batch)
+                        unsynced = True
+                    if unsynced and (stopping or time.monotonic() - last_sync >= self.sync_interval):
+                        self._sync(data_file, index_file)
+                        unsynced = False
+                        last_sync = time.monotonic()
+                except Exception as e:
+                    # the thread keeps going, whatever comes next might be fine
+                    self.stats.failed += sum(len(records) for _, records in batch)
+                    print(f"error recording to {self.path}: {e}")
+
+                if stopping:
+                    return
+
+    def _write(self, data_file: BinaryIO, index_file: BinaryIO, batch: list[tuple[float, list[RequestModel]]]) -> None:
+        if not batch:
+            return
+
+        offset = data_file.tell()
+        frames: list[bytes] = []
+        index: list[bytes] = []
+        recorded = 0
+        for received, records in batch:
+            for record in records:
+                try:
+                    body = _pack_record(received, record)
+                    entries = [_INDEX_ENTRY.pack(received, proto.method, offset) for proto in record.protos]
+                except (ValueError, TypeError, OverflowError, struct.error) as e:
+                    # one record that can't be stored doesn't take the rest of the batch with it
+                    self.stats.failed += 1
+                    print(f"error recording record {record.rpcid}: {e}")
+                    continue
+                frames += (_FRAME_HEADER.pack(len(body)), body)
+                index += entries
+                offset += _FRAME_HEADER.size + len(body)
+                recorded += 1
+
+        # frames go first, the index never points past what's written
+        data = b"".join(frames)
+        data_file.write(data)
+        data_file.flush()
+        index_file.write(b"".join(index))
+        index_file.flush()
+
+        self.stats.recorded += recorded
+        self.stats.bytes += len(data)
+
+    def _sync(self, data_file: BinaryIO, index_file: BinaryIO) -> None:
+        os.fsync(data_file.fileno())
+        os.fsync(index_file.fileno())
+        self.stats.syncs += 1
+
+
+class SessionReader:
+    """Reads a capture written by SessionRecorder. The index is loaded once, records are read when asked for"""
+
+    def __init__(self, path: str | Path):
+        self.path: Path = Path(path)
+
+        with open(_get_index_path(path), "rb") as index_file:
+            if index_file.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                raise ValueError(f"{_get_index_path(path)} is not a session index")
+            data = index_file.read()
+        entries = list(_INDEX_ENTRY.iter_unpack(data[: len(data) - len(data) % _INDEX_ENTRY.size]))
+
+        # sorted by time, recorded in arrival order means they pretty much are already
+        entries.sort(key=lambda entry: entry[0])
+        self.times: list[float] = [entry[0] for entry in entries]
+        self.methods: list[int] = [entry[1] for entry in entries]
+        self.offsets: list[int] = [entry[2] for entry in entries]
+
+    def find(self, method: int | None = None, start: float | None = None, end: float | None = None) -> list[int]:
+        """Offsets of the records that arrived between start and end and have a proto with method, oldest first"""
+        low = 0 if start is None else bisect.bisect_left(self.times, start)
+        high = len(self.times) if end is None else bisect.bisect_right(self.times, end)
+
+        offsets: dict[int, None] = {}
+        for i in range(low, high):
+            if method is None or self.methods[i] == method:
+                offsets[self.offsets[i]] = None
+        return list(offsets)
+
+    def read(self, offset: int) -> dict[str, Any]:
+        with open(self.path, "rb") as data_file:
+            data_file.seek(offset)
+            body = _read_frame(data_file)
+        if body is None:
+            raise ValueError(f"no record at offset {offset} of {self.path}")
+        return msgpack.unpackb(body)
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        """Every record in the file, in the order they were recorded"""
+        with open(self.path, "rb") as data_file:
+            if data_file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} is not a session recording")
+            while (body := _read_frame(data_file)) is not None:
+                yield msgpack.unpackb(body)
@@ -1,61 +1,185 @@
 import asyncio
 import json
+import time
+from typing import Any
 
-from aiohttp import web
+import msgpack
+from aiohttp import web, WSMsgType
 from pydantic import ValidationError
 
 from .config import config
-from .model import RequestModel
-from .output import get_output
-from .proto_utils import Proto
+from .ingest import IngestQueue, InOrder, QueueFull
+from .model import RequestModel, parse_request
+from .output import BaseOutput, get_output
+from .proto_utils import Proto, DecodePool, RawProto, get_raw_protos, DECODE_CACHE, TYPEDEF_CACHE
+from .recorder import SessionRecorder
 
-output = get_output(config.output)
+MSGPACK_CONTENT_TYPE = "application/x-msgpack"
 
 
 class TrafficReceiver:
-    @staticmethod
-    async def process_data(data: RequestModel):
-        processed_protos = [Proto.from_raw(data.rpcid, p) for p in data.protos]
-        await output.add_record(rpc_id=data.rpcid, rpc_status=data.rpcstatus, protos=processed_protos, rpc_handle=data.rpchandle)
+    def __init__(self, output: BaseOutput):
+        self.output: BaseOutput = output
+        self.queue = IngestQueue(
+            self.process_data, maxsize=config.queue_size, workers=config.decode_workers, policy=config.backpressure
+        )
+        # records are decoded concurrently, but passed to the output in the order they arrived
+        self._delivery: InOrder = InOrder()
+
+        self.decode_pool: DecodePool | None = None
+        if config.decode_processes > 0:
+            self.decode_pool = DecodePool(config.decode_processes)
+
+        self.recorder: SessionRecorder | None = None
+        if config.record_file:
+            self.recorder = SessionRecorder(config.record_file, config.record_sync_interval)
+
+    async def decode(self, rpc_id: int, raw_protos: list[RawProto]) -> list[Proto]:
+        if self.decode_pool is not None:
+            return await self.decode_pool.decode_raw(rpc_id, raw_protos)
+        return [
+            Proto(rpc_id=rpc_id, method_value=method, raw_request=request, raw_response=response)
+            for method, request, response in raw_protos
+        ]
+
+    async def process_data(self, data: RequestModel):
+        # the queue starts this right after taking the record, so tickets are in the order records arrived
+        ticket = self._delivery.take()
+        try:
+            raw_protos = get_raw_protos(data.protos)
+            processed_protos = None if self.output.wants_raw() else await self.decode(data.rpcid, raw_protos)
+            await self._delivery.wait(ticket)
+
+            # the output might have started wanting raw records while this one was decoded
+            if processed_protos is None or self.output.wants_raw():
+                await self.output.add_raw(
+                    rpc_id=data.rpcid,
+                    rpc_status=data.rpcstatus,
+                    protos=raw_protos,
+                    rpc_handle=data.rpchandle,
+                    decode=self.decode,
+                )
+                return
+
+            await self.output.add_record(
+                rpc_id=data.rpcid, rpc_status=data.rpcstatus, protos=processed_protos, rpc_handle=data.rpchandle
+            )
+        finally:
+            await self._delivery.finish(ticket)
 
     @staticmethod
-    async def __traffic_post(request: web.Request):
+    async def _read_body(request: web.Request) -> Any:
+        if request.content_type == MSGPACK_CONTENT_TYPE:
+            # bin fields stay bytes and are passed on to Message as they are, no base64 involved
+            return msgpack.unpackb(await request.read())
+        return await request.json()
+
+    async def _ingest(self, data: Any) -> tuple[int, str]:
+        received = time.time()
+        entries = data if isinstance(data, list) else [data]
+        if not all(isinstance(entry, dict) for entry in entries):
+            return 400, "malformed data: expected an object or a list of objects"
+
+        try:
+            models = [parse_request(entry) for entry in entries]
+        except ValidationError as e:
+            return 400, f"malformed data: {e}"
+
         try:
-            data = await request.json()
-        except json.JSONDecodeError:
-            return web.Response(status=400, text="bad json")
+            await self.queue.put_many(models)
+        except QueueFull as e:
+            return 503, str(e)
 
-        async def _handle_data(data: dict):
-            model = RequestModel(**data)
-            await TrafficReceiver.process_data(model)
+        # rejected requests are sent again by the MITM, only the accepted ones are recorded
+        if self.recorder is not None:
+            self.recorder.record(models, received)
 
+        return 200, "OK"
+
+    async def __traffic_post(self, request: web.Request):
         try:
-            if isinstance(data, list):
-                for entry in data:
-                    await _handle_data(entry)
+            data = await self._read_body(request)
+        except ValueError:
+            body_type = "msgpack" if request.content_type == MSGPACK_CONTENT_TYPE else "json"
+            return web.Response(status=400, text=f"bad {body_type}")
+
+        status, text = await self._ingest(data)
+        return web.Response(status=status, text=text)
+
+    async def __traffic_ws(self, request: web.Request):
+        """Long-lived alternative to POST /. Every frame is acked with its number, in the same format it was sent in"""
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+
+        frame = 0
+        async for ws_message in ws:
+            if ws_message.type == WSMsgType.TEXT:
+                loads, body_type = json.loads, "json"
+            elif ws_message.type == WSMsgType.BINARY:
+                loads, body_type = msgpack.unpackb, "msgpack"
             else:
-                await _handle_data(data)
-        except ValidationError as e:
-            return web.Response(status=400, text=f"malformed data: {e}")
+                continue
 
-        return web.Response(text="OK")
+            frame += 1
+            try:
+                data = loads(ws_message.data)
+            except ValueError:
+                status, text = 400, f"bad {body_type}"
+            else:
+                status, text = await self._ingest(data)
+
+            ack = {"frame": frame, "status": status, "message": text}
+            if ws_message.type == WSMsgType.BINARY:
+                await ws.send_bytes(msgpack.packb(ack))
+            else:
+                await ws.send_json(ack)
+
+        return ws
+
+    async def __stats_get(self, _: web.Request):
+        return web.json_response(
+            {
+                **self.queue.get_stats(),
+                "decode_cache": DECODE_CACHE.get_stats(),
+                "typedef_cache": TYPEDEF_CACHE.get_stats(),
+                **({"recorder": self.recorder.get_stats()} if self.recorder is not None else {}),
+            }
+        )
 
     def get_app(self):
         app = web.Application()
-        app.add_routes([web.post("/", self.__traffic_post)])
+        app.add_routes(
+            [
+                web.post("/", self.__traffic_post),
+                web.get("/ws", self.__traffic_ws),
+                web.get("/stats", self.__stats_get),
+            ]
+        )
 
         return app
 
 
-t = TrafficReceiver()
-server = t.get_app()
-
-
 async def main():
+    output = get_output(config.output)
+    receiver = TrafficReceiver(output)
+    server = receiver.get_app()
+
+    if receiver.recorder is not None:
+        receiver.recorder.start()
     await output.start()
+    receiver.queue.start()
     asyncio.create_task(web._run_app(server, host=config.host, port=config.port, print=lambda _: _))
-    await asyncio.Event().wait()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        if receiver.recorder is not None:
+            receiver.recorder.close()
+        if receiver.decode_pool is not None:
+            receiver.decode_pool.shutdown()
 
 
 def run():
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    finally:
+        TYPEDEF_CACHE.save()
@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import asyncio
+import time
+import traceback
 from datetime import datetime
 from typing import TYPE_CHECKING
 
@@ -9,15 +12,19 @@ from textual.app import App, ComposeResult
 from textual.containers import Horizontal
 from textual.reactive import reactive, Reactive, var
 
+from trafficlight.config import config
 from .models import Mode, Toggle, Action
+from .pause_buffer import PauseBuffer, RawRecord
 from .widget_command_overview import CommandOverview, CommandReceived
-from .widget_input import InputWidget
+from .widget_input import InputWidget, StatusWidget
 from .widget_inspect import InspectWidget
-from .widget_request import RequestWidget, ProtoWidget
+from .records import Record
+from .widget_request import ProtoWidget
 from .widget_screen import ScreenWidget
 
 if TYPE_CHECKING:
-    from trafficlight.proto_utils import Proto
+    from trafficlight.output.base import Decoder
+    from trafficlight.proto_utils import Proto, RawProto
 
 
 class TrafficLightGui(App):
@@ -25,12 +32,33 @@ class TrafficLightGui(App):
     current_mode: Reactive[Mode] = var(Mode.WATCH)
     filter_text: Reactive[str] = reactive("")
 
+    # records arriving within this long of each other are added to the log together
+    COALESCE_DELAY = 0.05
+    # adding records may take this long per frame, the rest of the frame is left for handling input
+    FRAME_TIME = 1 / 30
+    FRAME_BUDGET = 0.01
+    BATCH_SIZE = 50
+    # while working through a backlog, the log's widgets are only updated this often
+    WINDOW_INTERVAL = 0.5
+    # records buffered while paused are decoded this many at a time
+    FLUSH_BATCH_SIZE = 100
+    # after an error, flushing is tried again this much later
+    FLUSH_RETRY_DELAY = 1.0
+
     def __init__(self):
         super().__init__(css_path="_style.css")
 
-        self.incoming_requests: list[RequestWidget] = []
+        self.incoming_requests: list[Record] = []
         self.toggles: dict[Toggle, bool] = {t: False for t in Toggle}
 
+        self._records_arrived: asyncio.Event = asyncio.Event()
+        self._scheduler: asyncio.Task | None = None
+        self._window_updated: float = 0.0
+
+        self.pause_buffer: PauseBuffer = PauseBuffer(config.pause_buffer_size, config.pause_overflow)
+        self._decode: Decoder | None = None
+        self._flusher: asyncio.Task | None = None
+
     def compose(self) -> ComposeResult:
         yield Horizontal(ScreenWidget(), InspectWidget())
         yield InputWidget()
@@ -51,8 +79,18 @@ class TrafficLightGui(App):
     def input_widget(self) -> InputWidget:
         return self.query_one(InputWidget)
 
+    @property
+    def status_widget(self) -> StatusWidget:
+        return self.query_one(StatusWidget)
+
     def on_mount(self) -> None:
-        self.set_interval(0.2, self.process_queue)
+        self._scheduler = asyncio.create_task(self._schedule_records())
+
+    def on_unmount(self) -> None:
+        if self._scheduler is not None:
+            self._scheduler.cancel()
+        if self._flusher is not None:
+            self._flusher.cancel()
 
     async def on_key(self, event: events.Key) -> None:
         await self.input_widget.input_key(event)
@@ -60,52 +98,159 @@ class TrafficLightGui(App):
     async def on_proto_widget_clicked(self, event: ProtoWidget.Clicked) -> None:
         await self.inspect_widget.set_proto(event.proto)
 
-    def on_command_received(self, event: CommandReceived) -> None:
+    async def on_command_received(self, event: CommandReceived) -> None:
         if isinstance(event.command, Mode):
             self.current_mode = event.command
         elif isinstance(event.command, Toggle):
-            self.toggle_toggle(event.command)
+            await self.toggle_toggle(event.command)
         elif isinstance(event.command, Action):
-            self.trigger_action(event.command)
+            await self.trigger_action(event.command)
 
-    def watch_filter_text(self, _) -> None:
-        self.screen_widget.filter()
+    async def watch_filter_text(self, _) -> None:
+        await self.screen_widget.filter(debounce=True)
         if self.current_mode == Mode.FILTER_TEXT:
             self.inspect_widget.search_text(self.filter_text)
 
-    def watch_current_mode(self, _) -> None:
-        self.screen_widget.filter()
+    async def watch_current_mode(self, _) -> None:
+        await self.screen_widget.filter()
         self.inspect_widget.search_text(self.filter_text if self.current_mode == Mode.FILTER_TEXT else "")
 
-    def toggle_toggle(self, toggle: Toggle) -> None:
+    async def toggle_toggle(self, toggle: Toggle) -> None:
         self.toggles[toggle] = result = not self.toggles.get(toggle, False)
 
         if toggle == Toggle.FIRST_PROTO_ONLY:
-            self.screen_widget.filter()
+            await self.screen_widget.filter()
+        elif toggle == Toggle.TREE_INSPECT:
+            await self.inspect_widget.set_tree(result)
+        elif toggle == Toggle.PAUSE and not result:
+            self._records_arrived.set()
+            self._start_flush()
 
         self.command_overview.update_toggle(toggle, result)
 
-    def trigger_action(self, action: Action) -> None:
+    async def trigger_action(self, action: Action) -> None:
         if action == Action.COPY_INSPECTED:
             text = self.inspect_widget.get_copyable_text()
             if text:
                 pyperclip.copy(text)
                 pyperclip.paste()
         elif action == Action.EMPTY_LOG:
-            self.screen_widget.clear()
+            self.pause_buffer.clear()
+            self._update_buffered()
+            await self.screen_widget.clear()
             self.inspect_widget.clear()
 
-    async def process_queue(self) -> None:
-        if self.incoming_requests:
-            await self.screen_widget.add_requests(self.incoming_requests)
-            self.incoming_requests.clear()
+    async def _schedule_records(self) -> None:
+        while True:
+            await self._records_arrived.wait()
+            await asyncio.sleep(self.COALESCE_DELAY)
+            self._records_arrived.clear()
+
+            # the log stays as it is while paused
+            while self.incoming_requests and not self.toggles[Toggle.PAUSE]:
+                frame_start = time.perf_counter()
+                try:
+                    await self.process_queue(frame_start + self.FRAME_BUDGET)
+                except Exception as e:
+                    # the batch is lost, but the log keeps taking new records
+                    print(f"error adding records to the log: {e}")
+                    traceback.print_exc()
+                await asyncio.sleep(max(0.0, frame_start + self.FRAME_TIME - time.perf_counter()))
+
+    async def process_queue(self, deadline: float) -> None:
+        """Add incoming records to the log until the deadline. Whatever's left is added on the next frame"""
+        while self.incoming_requests and time.perf_counter() < deadline:
+            batch = self.incoming_requests[: self.BATCH_SIZE]
+            del self.incoming_requests[: self.BATCH_SIZE]
+            await self.screen_widget.add_records(batch, update_window=False)
+        self.status_widget.backlog = len(self.incoming_requests)
+
+        if not self.incoming_requests or time.perf_counter() - self._window_updated > self.WINDOW_INTERVAL:
+            await self.screen_widget.update_window()
+            self._window_updated = time.perf_counter()
 
     def add_record(self, rpc_id: int, rpc_status: int, protos: list[Proto], rpc_handle: int | None = None) -> None:
-        if self.toggles[Toggle.PAUSE]:
+        record = Record(time=datetime.now(), rpc_id=rpc_id, rpc_status=rpc_status, protos=protos, rpc_handle=rpc_handle)
+        self.incoming_requests.append(record)
+        self._records_arrived.set()
+
+    @property
+    def buffering(self) -> bool:
+        """New records have to go through the pause buffer, to stay in order with the ones already in there"""
+        return self.toggles[Toggle.PAUSE] or len(self.pause_buffer) > 0 or self._flushing
+
+    @property
+    def _flushing(self) -> bool:
+        return self._flusher is not None and not self._flusher.done()
+
+    async def buffer_record(
+        self, rpc_id: int, rpc_status: int, protos: list[RawProto], rpc_handle: int | None, decode: Decoder
+    ) -> None:
+        """Add a record that's still undecoded. It's only decoded once it's added to the log"""
+        self._decode = decode
+        await self.pause_buffer.put(
+            RawRecord(time=datetime.now(), rpc_id=rpc_id, rpc_status=rpc_status, rpc_handle=rpc_handle, protos=protos)
+        )
+        self._update_buffered()
+
+        if not self.toggles[Toggle.PAUSE]:
+            self._start_flush()
+
+    def _update_buffered(self) -> None:
+        self.status_widget.buffered = len(self.pause_buffer)
+        self.status_widget.dropped = self.pause_buffer.dropped
+
+    def _start_flush(self) -> None:
+        if self.pause_buffer and not self._flushing:
+            self._flusher = asyncio.create_task(self._flush())
+
+    async def _flush(self) -> None:
+        """Decode the buffered records and add them to the log, a batch at a time"""
+        decode = self._decode
+        if decode is None:
             return
 
-        request = RequestWidget(time=datetime.now(), rpc_id=rpc_id, rpc_status=rpc_status, protos=protos, rpc_handle=rpc_handle)
-        self.incoming_requests.append(request)
+        while self.pause_buffer and not self.toggles[Toggle.PAUSE]:
+            records = self.pause_buffer.take(self.FLUSH_BATCH_SIZE)
+            added = 0
+            try:
+                results = await asyncio.gather(
+                    *(decode(record.rpc_id, record.protos) for record in records), return_exceptions=True
+                )
+
+                for record, protos in zip(records, results):
+                    if isinstance(protos, BaseException):
+                        print(f"error decoding buffered record {record.rpc_id}: {protos}")
+                    else:
+                        self.incoming_requests.append(
+                            Record(
+                                time=record.time,
+                                rpc_id=record.rpc_id,
+                                rpc_status=record.rpc_status,
+                                protos=protos,
+                                rpc_handle=record.rpc_handle,
+                            )
+                        )
+                    added += 1
+            except Exception as e:
+                # the records that didn't make it stay buffered, and flushing them is tried again later
+                self.pause_buffer.put_back(records[added:])
+                print(f"error adding buffered records: {e}")
+                traceback.print_exc()
+                asyncio.get_running_loop().call_later(self.FLUSH_RETRY_DELAY, self._start_flush)
+                return
+            finally:
+                self._records_arrived.set()
+                self._update_buffered()
+
+            # the next batch is decoded once the log caught up, until then it's kept undecoded
+            while len(self.incoming_requests) > self.FLUSH_BATCH_SIZE and not self.toggles[Toggle.PAUSE]:
+                await asyncio.sleep(self.FRAME_TIME)
+
+        if not self.pause_buffer:
+            # everything that's left got added, the dropped count belonged to this pause
+            self.pause_buffer.dropped = 0
+            self._update_buffered()
 
     async def run_app(self) -> None:
         await self._process_messages()
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import threading
+from array import array
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator
+
+from .models import Mode
+from .records import get_message_names
+
+if TYPE_CHECKING:
+    from .records import Record, RecordStore
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def _method_names(record: Record) -> set[str]:
+    names = set()
+    for proto in record.protos:
+        names.add((proto.method_name or "Unknown Method").casefold())
+        if proto.proxy is not None and proto.proxy.method_name:
+            names.add(proto.proxy.method_name.casefold())
+    return names
+
+
+def _message_names(record: Record) -> set[str]:
+    return {name.casefold() for proto in record.protos for name in get_message_names(proto)}
+
+
+class FilterIndex:
+    """Finds the records that can match a filter, without looking at every single one.
+
+    Method and message names are indexed as records arrive. The text of a record is only known after decoding
+    all its messages, so it's left to the text search worker: records are queued as they arrive, and each
+    search first adds the queued ones to the trigram index with update_text. Candidates still have to be
+    checked with Record.filter.
+
+    Text searches run in a worker thread, everything touching the trigram index holds a lock. Nothing is
+    decoded while holding it.
+    """
+
+    def __init__(self, records: RecordStore):
+        self._records: RecordStore = records
+
+        self._methods: dict[str, set[int]] = {}
+        self._messages: dict[str, set[int]] = {}
+
+        # trigram -> ids of records with that trigram in their text, ascending. Evicted ids are only
+        # dropped from the start once enough of them piled up. None until the first text search
+        self._trigrams: dict[str, array] | None = None
+        self._min_id: int = 0
+        self._evicted: int = 0
+
+        # records that aren't in the trigram index yet, oldest first
+        self._unindexed: list[Record] = []
+        # changes with every clear, so an update that was running doesn't add records from before it
+        self._generation: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def _add_names(index: dict[str, set[int]], names: Iterable[str], record_id: int) -> None:
+        for name in names:
+            index.setdefault(name, set()).add(record_id)
+
+    @staticmethod
+    def _remove_names(index: dict[str, set[int]], names: Iterable[str], record_id: int) -> None:
+        for name in names:
+            ids = index.get(name)
+            if ids is not None:
+                ids.discard(record_id)
+                if not ids:
+                    del index[name]
+
+    @staticmethod
+    def _text_trigrams(record: Record) -> set[str]:
+        # decodes the record's messages
+        return _trigrams("\n".join([record.header_text, *(record.get_text(i) for i in range(len(record.protos)))]))
+
+    def add(self, records: list[Record]) -> None:
+        for record in records:
+            self._add_names(self._methods, _method_names(record), record.id)
+            self._add_names(self._messages, _message_names(record), record.id)
+
+        with self._lock:
+            if self._trigrams is not None:
+                self._unindexed.extend(records)
+
+    def remove(self, records: list[Record]) -> None:
+        """Remove evicted records. They have to be the oldest ones"""
+        for record in records:
+            self._remove_names(self._methods, _method_names(record), record.id)
+            self._remove_names(self._messages, _message_names(record), record.id)
+
+        with self._lock:
+            self._min_id = records[-1].id + 1
+            del self._unindexed[: bisect_left(self._unindexed, self._min_id, key=lambda record: record.id)]
+            self._evicted += len(records)
+            if self._trigrams is not None and self._evicted > len(self._records):
+                self._compact(self._trigrams)
+
+    def update_text(self, cancelled: Callable[[], bool] | None = None) -> None:
+        """Add the records that arrived since the last update to the trigram index, the first time all of them.
+        Meant to run in the worker thread. Whatever isn't added before cancelled returns True stays queued
+        """
+        with self._lock:
+            if self._trigrams is None:
+                self._trigrams = {}
+                self._unindexed = list(self._records)
+                self._evicted = 0
+            records = list(self._unindexed)
+            generation = self._generation
+
+        texts = []
+        for record in records:
+            if cancelled is not None and cancelled():
+                break
+            texts.append((record.id, self._text_trigrams(record)))
+        if not texts:
+            return
+
+        with self._lock:
+            if self._trigrams is None or generation != self._generation:
+                # cleared in the meantime
+                return
+            for record_id, trigrams in texts:
+                if record_id < self._min_id:
+                    continue
+                for trigram in trigrams:
+                    ids = self._trigrams.get(trigram)
+                    if ids is None:
+                        self._trigrams[trigram] = array("I", (record_id,))
+                    else:
+                        ids.append(record_id)
+            last_id = texts[-1][0]
+            del self._unindexed[: bisect_left(self._unindexed, last_id + 1, key=lambda record: record.id)]
+
+    def _compact(self, trigrams: dict[str, array]) -> None:
+        for trigram, ids in list(trigrams.items()):
+            start = bisect_left(ids, self._min_id)
+            if start == len(ids):
+                del trigrams[trigram]
+            elif start:
+                del ids[:start]
+        self._evicted = 0
+
+    def clear(self) -> None:
+        self._methods.clear()
+        self._messages.clear()
+
+        with self._lock:
+            self._trigrams = None
+            self._unindexed = []
+            self._generation += 1
+            self._evicted = 0
+            self._min_id = 0
+
+    @staticmethod
+    def _search_names(index: dict[str, set[int]], text: str) -> set[int]:
+        result = set()
+        for name, ids in index.items():
+            if text in name:
+                result |= ids
+        return result
+
+    def _search_text(self, text: str) -> Iterable[int] | None:
+        with self._lock:
+            if len(text) < 3 or self._trigrams is None:
+                return None
+
+            # anything that isn't indexed yet can match
+            candidates = {record.id for record in self._unindexed}
+            postings = []
+            for trigram in _trigrams(text):
+                ids = self._trigrams.get(trigram)
+                if ids is None:
+                    return candidates
+                postings.append(ids)
+
+            postings.sort(key=len)
+            indexed = set(postings[0][bisect_left(postings[0], self._min_id) :])
+            for ids in postings[1:3]:
+                indexed.intersection_update(ids)
+            return candidates | indexed
+
+    def candidates(self, mode: Mode, text: str) -> Iterable[int] | None:
+        """Ids of all records that can match, in no particular order. None if every record can"""
+        if not text:
+            return None
+
+        if mode == Mode.FILTER_METHODS:
+            return self._search_names(self._methods, text)
+        if mode == Mode.FILTER_MESSAGES:
+            return self._search_names(self._messages, text)
+        if mode == Mode.FILTER_TEXT:
+            return self._search_text(text)
+        return None
+
+    def with_messages(self, names: Iterable[str]) -> set[int]:
+        """Ids of all records with a message of one of these types"""
+        result = set()
+        for name in names:
+            result |= self._messages.get(name.casefold(), set())
+        return result
+
+    def iter_candidates(self, mode: Mode, text: str) -> Iterator[Record]:
+        """Records that can match, oldest first"""
+        yield from self.iter_records(self.candidates(mode, text))
+
+    def iter_records(self, ids: Iterable[int] | None) -> Iterator[Record]:
+        """Records with these ids, oldest first. All of them if ids is None"""
+        if ids is None:
+            yield from self._records
+            return
+
+        for record_id in sorted(ids):
+            record = self._records.get(record_id)
+            if record is not None:
+                yield record
@@ -28,12 +28,14 @@ class Mode(CommandEnum):
     FILTER_TEXT = "t"
     FILTER_METHODS = "m"
     FILTER_MESSAGES = "s"
+    FILTER_QUERY = "q"
 
 
 class Toggle(CommandEnum):
     PAUSE = "p"
     FIRST_PROTO_ONLY = "1"
     FOLLOW = "f"
+    TREE_INSPECT = "i"
 
 
 class Action(CommandEnum):
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from datetime import datetime
+from typing import TYPE_CHECKING, NamedTuple
+
+from trafficlight.config import Backpressure
+
+if TYPE_CHECKING:
+    from trafficlight.proto_utils import RawProto
+
+
+class RawRecord(NamedTuple):
+    time: datetime
+    rpc_id: int
+    rpc_status: int
+    rpc_handle: int | None
+    protos: list[RawProto]
+
+
+class PauseBuffer:
+    """Records that arrived while the log was paused, oldest first.
+
+    They're kept undecoded, which is a lot smaller than decoded ones and means nothing is spent on records that
+    might be dropped anyway. Once maxsize records are buffered, policy decides what happens to new ones.
+    """
+
+    def __init__(self, maxsize: int = 0, policy: Backpressure = Backpressure.DROP_OLDEST):
+        self.maxsize: int = maxsize
+        self.policy: Backpressure = policy
+        self.dropped: int = 0
+
+        self._records: deque[RawRecord] = deque()
+        self._not_full: asyncio.Event = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @property
+    def full(self) -> bool:
+        return self.maxsize > 0 and len(self._records) >= self.maxsize
+
+    async def put(self, record: RawRecord) -> None:
+        if self.full:
+            if self.policy == Backpressure.DROP_OLDEST:
+                self._records.popleft()
+                self.dropped += 1
+            elif self.policy == Backpressure.REJECT:
+                self.dropped += 1
+                return
+            else:
+                while self.full:
+                    self._not_full.clear()
+                    await self._not_full.wait()
+
+        self._records.append(record)
+
+    def take(self, count: int) -> list[RawRecord]:
+        """Remove and return up to count of the oldest records"""
+        records = [self._records.popleft() for _ in range(min(count, len(self._records)))]
+        if records:
+            self._not_full.set()
+        return records
+
+    def put_back(self, records: list[RawRecord]) -> None:
+        """Return records that were taken but couldn't be added, they're the oldest again"""
+        self._records.extendleft(reversed(records))
+
+    def clear(self) -> None:
+        self._records.clear()
+        self.dropped = 0
+        self._not_full.set()
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+from collections import deque
+from datetime import datetime
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+from rich.text import Text
+
+from trafficlight.proto_utils import get_method_text, REQUEST_HEADER
+from .models import Mode
+
+if TYPE_CHECKING:
+    from trafficlight.proto_utils import Proto, Message, Query
+
+
+def get_message_summary(message: Message, width: int | None = None) -> tuple[str, str]:
+    """The name and data line shown for a message in the log. With width, the data is cut off after that many
+    characters
+    """
+    if message.name is None or not message.has_payload:
+        # blackboxes are shown as the same JSON they're formatted to everywhere else, so they can be cut off too
+        name = "[Unknown Message]" if message.name is None else message.name
+        prefix = "Blackbox: " if message.name is None else "Error decoding message. Blackbox: "
+        if width is None:
+            return name, prefix + message.to_string()
+        return name, prefix + message.get_preview(max(width - len(prefix), 0))
+
+    if message.is_empty:
+        data = "{}"
+    elif width is None:
+        data = message.to_string()
+    else:
+        data = message.get_preview(width)
+    return message.name, data
+
+
+def get_proto_text(proto: Proto) -> str:
+    """Plain text of everything shown for a proto in the log"""
+    text = get_method_text(proto).plain + "\n"
+    for message in proto.messages:
+        name, data = get_message_summary(message)
+        text += name + "\n" + data
+
+    if proto.proxy:
+        text += get_proto_text(proto.proxy)
+    return text
+
+
+def get_message_names(proto: Proto) -> Iterator[str]:
+    for message in proto.messages:
+        if message.name:
+            yield message.name
+
+    if proto.proxy:
+        yield from get_message_names(proto.proxy)
+
+
+class Record:
+    """A received request as it's kept in the log. Widgets are only created for records that are on screen"""
+
+    __slots__ = (
+        "id",
+        "time",
+        "rpc_id",
+        "rpc_status",
+        "rpc_handle",
+        "protos",
+        "size",
+        "_header",
+        "_header_text",
+        "_texts",
+    )
+
+    def __init__(
+        self, time: datetime, rpc_id: int, rpc_status: int, protos: list[Proto], rpc_handle: int | None = None
+    ):
+        self.id: int = -1
+        self.time: datetime = time
+        self.rpc_id: int = rpc_id
+        self.rpc_status: int = rpc_status
+        self.rpc_handle: int | None = rpc_handle
+        self.protos: list[Proto] = protos
+        self.size: int = sum(proto.raw_size for proto in protos)
+
+        self._header: Text | None = None
+        self._header_text: str | None = None
+        self._texts: list[str | None] | None = None
+
+    @property
+    def header(self) -> Text:
+        if self._header is None:
+            text = Text("\n", no_wrap=True)
+            text.append(self.time.strftime("%H:%M:%S"), style=REQUEST_HEADER)
+            text.append(" | ")
+            text.append(f"RPC ID {self.rpc_id}", style=REQUEST_HEADER)
+            text.append(" | ")
+            text.append(f"RPC Status {self.rpc_status}", style=REQUEST_HEADER)
+
+            if self.rpc_handle is not None:
+                text.append(" | ")
+                text.append(f"RPC Handle {self.rpc_handle}", style=REQUEST_HEADER)
+
+            text.append("\n")
+            self._header = text
+        return self._header
+
+    @property
+    def header_text(self) -> str:
+        """Casefolded plain text of the header, as text filters search it"""
+        if self._header_text is None:
+            self._header_text = self.header.plain.casefold()
+        return self._header_text
+
+    def get_text(self, index: int) -> str:
+        """Casefolded plain text of the proto at index, as text filters search it.
+
+        Building it decodes the messages, so it's only done when needed. Text filters run in a worker thread,
+        this has to stay safe to call from there.
+        """
+        if self._texts is None:
+            self._texts = [None] * len(self.protos)
+
+        text = self._texts[index]
+        if text is None:
+            text = self._texts[index] = get_proto_text(self.protos[index]).casefold()
+        return text
+
+    def filter(self, mode: Mode, first_only: bool, text: str, query: Query | None = None) -> list[int]:
+        """Indexes of the protos that should be shown. Empty if the whole record is hidden.
+
+        In Mode.FILTER_QUERY, query is the compiled text. Without one, everything is shown.
+        """
+        shown = []
+
+        for index, proto in enumerate(self.protos[: 1 if first_only else None]):
+            if mode == Mode.FILTER_METHODS:
+                proxy_name = proto.proxy.method_name if proto.proxy is not None else None
+                matches = (
+                    text in (proto.method_name or "Unknown Method").casefold() or text in (proxy_name or "").casefold()
+                )
+            elif mode == Mode.FILTER_MESSAGES:
+                matches = any(text in name.casefold() for name in get_message_names(proto))
+            elif mode == Mode.FILTER_TEXT:
+                matches = (not first_only and text in self.header_text) or text in self.get_text(index)
+            elif mode == Mode.FILTER_QUERY:
+                matches = query is None or query.matches(proto)
+            else:
+                matches = True
+
+            if matches:
+                shown.append(index)
+        return shown
+
+
+class RecordStore:
+    """All records in the log, oldest first.
+
+    Once there are more than max_records records, or their raw protos add up to more than max_bytes,
+    the oldest ones are dropped. 0 means no limit.
+    """
+
+    def __init__(self, max_records: int = 0, max_bytes: int = 0):
+        self.max_records: int = max_records
+        self.max_bytes: int = max_bytes
+        self.size: int = 0
+
+        self._records: deque[Record] = deque()
+        self._next_id: int = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @property
+    def next_id(self) -> int:
+        """Id the next added record will get"""
+        return self._next_id
+
+    def __iter__(self) -> Iterator[Record]:
+        return iter(self._records)
+
+    def get(self, record_id: int) -> Record | None:
+        if not self._records:
+            return None
+
+        # ids are consecutive, so they map directly to a position
+        index = record_id - self._records[0].id
+        if 0 <= index < len(self._records):
+            return self._records[index]
+        return None
+
+    def add(self, records: Iterable[Record]) -> list[Record]:
+        """Add new records. Returns the records that had to be dropped for them, oldest first"""
+        for record in records:
+            record.id = self._next_id
+            self._next_id += 1
+            self._records.append(record)
+            self.size += record.size
+
+        evicted = []
+        while len(self._records) > 1 and (
+            (self.max_records and len(self._records) > self.max_records)
+            or (self.max_bytes and self.size > self.max_bytes)
+        ):
+            record = self._records.popleft()
+            self.size -= record.size
+            evicted.append(record)
+        return evicted
+
+    def clear(self) -> None:
+        self._records.clear()
+        self.size = 0
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, AsyncIterator, Callable
+
+from .models import Mode
+
+if TYPE_CHECKING:
+    from .filter_index import FilterIndex
+    from .records import Record
+
+# record id and indexes of its protos that match
+Match = tuple[int, list[int]]
+
+
+class SearchJob:
+    """A search running in the worker thread. Iterating results() gives its matches as they're found"""
+
+    # matches are sent to the event loop once there are this many, or this long after the last ones
+    CHUNK_SIZE = 100
+    CHUNK_INTERVAL = 0.1
+
+    def __init__(
+        self,
+        records: list[Record],
+        match: Callable[[Record], list[int]],
+        first_only: bool,
+        text: str | None,
+    ):
+        self.records: list[Record] = records
+        self.first_only: bool = first_only
+        self.cancelled: bool = False
+
+        # returns the indexes of the protos to show, like Record.filter
+        self._match: Callable[[Record], list[int]] = match
+        # text to look up candidates for in the trigram index
+        self._text: str | None = text
+
+        self._loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        self._chunks: asyncio.Queue[list[Match] | Exception | None] = asyncio.Queue()
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        self._chunks.put_nowait(None)
+
+    def _send(self, chunk: list[Match] | Exception | None) -> None:
+        if not self.cancelled:
+            self._loop.call_soon_threadsafe(self._chunks.put_nowait, chunk)
+
+    def run(self, index: FilterIndex) -> None:
+        """Runs in the worker thread"""
+        try:
+            if self._text:
+                index.update_text(lambda: self.cancelled)
+
+            records = self.records
+            candidates = index.candidates(Mode.FILTER_TEXT, self._text) if self._text else None
+            if candidates is not None:
+                candidates = set(candidates)
+                records = [record for record in records if record.id in candidates]
+
+            chunk = []
+            sent = time.perf_counter()
+            for record in records:
+                if self.cancelled:
+                    return
+
+                shown = self._match(record)
+                if shown:
+                    chunk.append((record.id, shown))
+                if chunk and (len(chunk) >= self.CHUNK_SIZE or time.perf_counter() - sent > self.CHUNK_INTERVAL):
+                    self._send(chunk)
+                    chunk = []
+                    sent = time.perf_counter()
+
+            if chunk:
+                self._send(chunk)
+        except Exception as e:
+            self._send(e)
+        finally:
+            self._send(None)
+
+    async def results(self) -> AsyncIterator[list[Match]]:
+        while True:
+            chunk = await self._chunks.get()
+            if chunk is None or self.cancelled:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+
+def _match_records(records: list[Record], match: Callable[[Record], list[int]]) -> list[Match]:
+    matches = []
+    for record in records:
+        shown = match(record)
+        if shown:
+            matches.append((record.id, shown))
+    return matches
+
+
+class TextSearch:
+    """Runs text filters and queries in a worker thread.
+
+    Searching means decoding and going through the text or payload of every candidate, which takes long enough
+    for big messages to block key handling. Starting a new search cancels the one before.
+
+    The event loop might decode the same messages meanwhile. The decode and typedef caches are locked, and
+    whatever a Message, Proto or Record caches on itself is a plain attribute without a lock: it comes out the
+    same no matter which thread computes it first, at worst both do. Neither thread waits for the other to
+    decode an unrelated message.
+    """
+
+    def __init__(self, index: FilterIndex):
+        self._index: FilterIndex = index
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="text-search")
+        self._job: SearchJob | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._job is not None
+
+    def start(
+        self, records: list[Record], match: Callable[[Record], list[int]], first_only: bool, text: str | None = None
+    ) -> SearchJob:
+        """Search records, which have to be sorted by id. With text, only the ones the trigram index has for it
+        are passed to match
+        """
+        self.cancel()
+        self._job = SearchJob(records, match, first_only, text)
+        self._executor.submit(self._job.run, self._index)
+        return self._job
+
+    async def match(self, records: list[Record], match: Callable[[Record], list[int]]) -> list[Match]:
+        """Match records in the worker thread, once it's done with what it's busy with. Used for records that
+        arrive while no search is running, matching them can decode just as much
+        """
+        return await asyncio.wrap_future(self._executor.submit(_match_records, records, match))
+
+    def finished(self, job: SearchJob) -> None:
+        if self._job is job:
+            self._job = None
+
+    def cancel(self) -> None:
+        if self._job is not None:
+            self._job.cancel()
+            self._job = None
+
+    def shutdown(self) -> None:
+        self.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -2,12 +2,13 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
+from rich.text import Text
 from textual import events
 from textual.app import ComposeResult
 from textual.binding import Binding
 from textual.color import Color
 from textual.keys import Keys
-from textual.reactive import Reactive
+from textual.reactive import reactive, Reactive
 from textual.widget import Widget
 from textual.widgets import Input
 from textual.widgets import Static
@@ -58,9 +59,8 @@ if TYPE_CHECKING:
 #         return text
 #
 #     def insert(self, text: str) -> bool:
-#         new_text = (
-#             self._editor.content[: self._editor.cursor_index] + text + self._editor.content[self._editor.cursor_index :]
-#         )
+#         cursor = self._editor.cursor_index
+#         new_text = self._editor.content[:cursor] + text + self._editor.content[cursor:]
 #         self._editor.content = self.filter_text(new_text)
 #         self._editor.cursor_index = min(len(self._editor.content), self._editor.cursor_index + len(text))
 #         return True
@@ -107,6 +107,29 @@ class InputContainer(Widget):
     pass
 
 
+class StatusWidget(Static):
+    backlog: Reactive[int] = reactive(0, layout=True)
+    buffered: Reactive[int] = reactive(0, layout=True)
+    dropped: Reactive[int] = reactive(0, layout=True)
+    error: Reactive[str] = reactive("", layout=True)
+
+    def render(self) -> Text:
+        text = Text()
+        if self.error:
+            text.append(self.error, style="rgb(230, 90, 90)")
+        if self.backlog:
+            if text:
+                text.append("  ")
+            text.append(f"{self.backlog} queued")
+        if self.buffered or self.dropped:
+            if text:
+                text.append("  ")
+            text.append(f"{self.buffered} buffered")
+            if self.dropped:
+                text.append(f" ({self.dropped} dropped)", style="rgb(230, 90, 90)")
+        return text
+
+
 class CustomInput(Input):
     DEFAULT_CSS = ""
     can_focus = False
@@ -156,7 +179,7 @@ class InputWidget(Widget):
 
     def compose(self) -> ComposeResult:
         yield CommandOverview()
-        yield InputContainer(CommandInput(), CustomInput())
+        yield InputContainer(CommandInput(), CustomInput(), StatusWidget())
 
     @property
     def text_input(self) -> CustomInput:
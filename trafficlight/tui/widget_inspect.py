@@ -4,12 +4,13 @@ from typing import TYPE_CHECKING
 
 from rich.padding import Padding
 from rich.style import Style
-from rich.text import Text
+from rich.text import Span, Text
 from textual.app import ComposeResult
 from textual.containers import Vertical
 
-from trafficlight.proto_utils import MessageFormatter, get_method_text
+from trafficlight.proto_utils import RenderedProto, format_proto_cached, get_method_text
 from .models import NoPostStatic, Mode
+from .widget_inspect_tree import InspectTree
 
 if TYPE_CHECKING:
     from trafficlight.proto_utils import Proto
@@ -40,11 +41,15 @@ class InspectHeader(_ProtoUpdater):
 
 class InspectBody(_ProtoUpdater):
     app: TrafficLightGui
-    _text: Text = Text()
+    _rendered: RenderedProto = RenderedProto(Text())
+    # the last highlighted word and where it occurs, typing on only has to check those offsets again
+    _highlighted: tuple[str, list[int]] = ("", [])
+
+    HIGHLIGHT = Style(bgcolor="rgb(250, 250, 135)", color="black")
 
     async def update_proto(self, proto: Proto):
-        formatter = MessageFormatter()
-        self._text = formatter.format_proto(proto)
+        self._rendered = format_proto_cached(proto)
+        self._highlighted = ("", [])
 
         if self.app.current_mode == Mode.FILTER_TEXT:
             self.highlight_text(self.app.filter_text)
@@ -52,53 +57,81 @@ class InspectBody(_ProtoUpdater):
             self.update_text()
 
     def update_text(self, text: Text | None = None) -> None:
-        self.update(Padding(self._text if text is None else text, (1, 0, 0, 1)))
+        self.update(Padding(self._rendered.text if text is None else text, (1, 0, 0, 1)))
 
     def highlight_text(self, text: str) -> None:
-        copied_text = self._text.copy()
-        copied_text.highlight_words(
-            (text.strip(),), style=Style(bgcolor="rgb(250, 250, 135)", color="black"), case_sensitive=False
-        )
-        self.update_text(copied_text)
+        word = text.strip().lower()
+        if not word:
+            self._highlighted = ("", [])
+            self.update_text()
+            return
+
+        last_word, last_starts = self._highlighted
+        within = last_starts if last_word and word.startswith(last_word) else None
+        starts = self._rendered.find(word, within)
+        self._highlighted = (word, starts)
+
+        # like highlight_words, matches don't overlap
+        spans = []
+        end = 0
+        for start in starts:
+            if start >= end:
+                end = start + len(word)
+                spans.append(Span(start, end, self.HIGHLIGHT))
+
+        highlighted = self._rendered.text.copy()
+        highlighted.spans.extend(spans)
+        self.update_text(highlighted)
 
     def clear(self) -> None:
-        self._text = Text()
+        self._rendered = RenderedProto(Text())
+        self._highlighted = ("", [])
         self.update_text()
 
 
 class InspectWidget(Vertical):
     proto: Proto | None = None
+    show_tree: bool = False
     _composed: bool = False
 
     def compose(self) -> ComposeResult:
         yield InspectHeader("")
-        yield Vertical(InspectBody())
+        yield Vertical(InspectBody(), id="inspect-body")
+        yield InspectTree(id="inspect-tree")
         self._composed = True
 
+    @property
+    def _content(self) -> InspectBody | InspectTree:
+        return self.query_one(InspectTree) if self.show_tree else self.query_one(InspectBody)
+
     def get_copyable_text(self) -> str:
         if self.proto is None:
             return ""
 
-        text = Text()
-        get_method_text(self.proto, text)
-        text.append("\n\n")
-
-        formatter = MessageFormatter(text=text, indent_guides=False, types=False)
-        text = formatter.format_proto(self.proto)
-        return text.plain
+        rendered = format_proto_cached(self.proto, indent_guides=False, types=False)
+        return get_method_text(self.proto).plain + "\n\n" + rendered.text.plain
 
     async def set_proto(self, proto: Proto) -> None:
         self.proto = proto
-        for element in (InspectHeader, InspectBody):
-            await self.query_one(element).update_proto(proto)
+        await self.query_one(InspectHeader).update_proto(proto)
+        await self._content.update_proto(proto)
+
+    async def set_tree(self, tree: bool) -> None:
+        # the view that's hidden isn't kept up to date, switching fills it with the current proto
+        self._content.clear()
+        self.show_tree = tree
+        self.query_one("#inspect-body").display = not tree
+        self.query_one(InspectTree).display = tree
+        if self.proto is not None:
+            await self._content.update_proto(self.proto)
 
     def clear(self) -> None:
         if self.proto is None:
             return
 
         self.proto = None
-        for element in (InspectHeader, InspectBody):
-            self.query_one(element).clear()
+        self.query_one(InspectHeader).clear()
+        self._content.clear()
 
     def search_text(self, text: str) -> None:
         if not self._composed:
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING, Any
+
+from google.protobuf import descriptor
+from google.protobuf.message import Message as ProtobufMessage
+from rich.style import Style
+from rich.text import Text
+from textual.widgets import Tree, TreeNode
+
+from trafficlight.proto_utils import MessageFormatter
+from trafficlight.proto_utils.proto_format import BRACKETS, MESSAGE_NAME, SUB_MESSAGE_NAME, TYPE
+
+if TYPE_CHECKING:
+    from trafficlight.proto_utils import Proto
+
+
+class _Entry:
+    """A value whose children are only added to the tree once its node is expanded"""
+
+    __slots__ = ("value", "field", "start", "stop", "loaded")
+
+    def __init__(
+        self,
+        value: Any,
+        field: descriptor.FieldDescriptor | None = None,
+        start: int = 0,
+        stop: int | None = None,
+    ):
+        self.value: Any = value
+        # set for repeated fields and maps, their elements are labelled by it
+        self.field: descriptor.FieldDescriptor | None = field
+        # the part of a repeated field this node holds
+        self.start: int = start
+        self.stop: int | None = stop
+        self.loaded: bool = False
+
+    def release(self) -> None:
+        self.value = None
+        self.field = None
+        self.loaded = True
+
+
+def _is_map(field: descriptor.FieldDescriptor) -> bool:
+    return field.message_type is not None and field.message_type.GetOptions().map_entry
+
+
+def _format_size(size: int) -> str:
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / 1024 / 1024:.1f} MB"
+
+
+def _message_summary(message: ProtobufMessage) -> Text:
+    count = len(message.ListFields())
+    if count == 0:
+        return Text("{}", style=BRACKETS)
+    return Text(f"{{{count} field{'s' if count != 1 else ''}, {_format_size(message.ByteSize())}}}", style=TYPE)
+
+
+def _repeated_summary(values: Any) -> Text:
+    # just the count, the size would mean going through every element before the field is even expanded
+    return Text(f"[{len(values)} item{'s' if len(values) != 1 else ''}]", style=TYPE)
+
+
+def _value_text(field: descriptor.FieldDescriptor, value: Any) -> Text:
+    formatter = MessageFormatter(one_line=True)
+    formatter.print_field_value(field, value)
+    return formatter.out
+
+
+class InspectTree(Tree[_Entry]):
+    """The inspected proto as a tree. Only top-level fields are formatted at first, everything below once it's
+    expanded, so huge messages cost as much as the part of them that's opened
+    """
+
+    # repeated fields with more elements than this are split into ranges of this many
+    RANGE_SIZE = 100
+
+    def __init__(self, id: str | None = None):
+        super().__init__("", id=id)
+        # every entry added since the last clear
+        self._entries: list[_Entry] = []
+        self.show_root = False
+        self.display = False
+
+    async def update_proto(self, proto: Proto) -> None:
+        self.clear()
+        self._add_messages(proto, "")
+        if proto.proxy:
+            self._add_messages(proto.proxy, "Proxy ")
+        self.scroll_home(animate=False)
+
+    def clear(self) -> None:
+        # the tree holds on to old nodes until new ones take their ids, they shouldn't keep the proto alive with them
+        for entry in self._entries:
+            entry.release()
+        self._entries.clear()
+        super().clear()
+        self.cursor_line = -1
+
+    def on_tree_node_expanded(self, event: Tree.NodeExpanded) -> None:
+        event.stop()
+        entry = event.node.data
+        if entry is not None and not entry.loaded:
+            self._load(event.node)
+
+    def _add_messages(self, proto: Proto, prefix: str) -> None:
+        for message in proto.messages:
+            label = Text(prefix + message.type + " ", style=Style(color="grey50"))
+
+            if message.name is None or message.payload is None:
+                label.append("Unknown Message " if message.name is None else message.name + " ", style=MESSAGE_NAME)
+                value = message.blackbox
+                label.append(self._json_summary(value))
+                expandable = isinstance(value, (dict, list)) and bool(value)
+            else:
+                label.append(message.name + " ", style=MESSAGE_NAME)
+                value = message.payload
+                label.append(_message_summary(value))
+                expandable = not message.is_empty
+
+            node = self.root.add(label, self._entry(value), expand=expandable, allow_expand=expandable)
+            if expandable:
+                self._load(node)
+
+    def _entry(self, *args: Any) -> _Entry:
+        entry = _Entry(*args)
+        self._entries.append(entry)
+        return entry
+
+    def _load(self, node: TreeNode[_Entry]) -> None:
+        entry = node.data
+        if entry is None or entry.loaded:
+            return
+        entry.loaded = True
+
+        if entry.field is not None and _is_map(entry.field):
+            self._add_map(node, entry.field, entry.value)
+        elif entry.field is not None:
+            stop = len(entry.value) if entry.stop is None else entry.stop
+            self._add_repeated(node, entry.field, entry.value, entry.start, stop)
+        elif isinstance(entry.value, ProtobufMessage):
+            self._add_fields(node, entry.value)
+        else:
+            self._add_json(node, entry.value)
+
+    def _add_fields(self, node: TreeNode[_Entry], message: ProtobufMessage) -> None:
+        # same order as the text view, message fields last
+        fields = sorted(
+            message.ListFields(), key=lambda f: 1 if f[0].cpp_type == descriptor.FieldDescriptor.CPPTYPE_MESSAGE else 0
+        )
+
+        for field, value in fields:
+            label = Text(field.name + " ")
+
+            if field.label == descriptor.FieldDescriptor.LABEL_REPEATED:
+                if field.message_type is not None and not _is_map(field):
+                    label.append(field.message_type.name + " ", style=SUB_MESSAGE_NAME)
+                label.append(_repeated_summary(value))
+                node.add(label, self._entry(value, field, 0, len(value)))
+            elif field.message_type is not None:
+                label.append(field.message_type.name + " ", style=SUB_MESSAGE_NAME)
+                label.append(_message_summary(value))
+                node.add(label, self._entry(value), allow_expand=bool(value.ListFields()))
+            else:
+                label.append(_value_text(field, value))
+                node.add_leaf(label)
+
+    def _add_repeated(
+        self, node: TreeNode[_Entry], field: descriptor.FieldDescriptor, values: Any, start: int, stop: int
+    ) -> None:
+        if stop - start > self.RANGE_SIZE:
+            # split into ranges, then into ranges of those ranges, until they're small enough
+            step = self.RANGE_SIZE
+            while (stop - start) / step > self.RANGE_SIZE:
+                step *= self.RANGE_SIZE
+
+            for range_start in range(start, stop, step):
+                range_stop = min(range_start + step, stop)
+                label = Text(f"[{range_start}…{range_stop - 1}]", style=BRACKETS)
+                node.add(label, self._entry(values, field, range_start, range_stop))
+            return
+
+        for index in range(start, stop):
+            value = values[index]
+            label = Text(f"[{index}] ", style=BRACKETS)
+
+            if field.message_type is not None:
+                label.append(_message_summary(value))
+                node.add(label, self._entry(value), allow_expand=bool(value.ListFields()))
+            else:
+                label.append(_value_text(field, value))
+                node.add_leaf(label)
+
+    def _add_map(self, node: TreeNode[_Entry], field: descriptor.FieldDescriptor, values: Any) -> None:
+        value_field = field.message_type.fields_by_name["value"]
+
+        for key in sorted(values):
+            value = values[key]
+            label = Text(f"{key}: ")
+
+            if value_field.message_type is not None:
+                label.append(_message_summary(value))
+                node.add(label, self._entry(value), allow_expand=bool(value.ListFields()))
+            else:
+                label.append(_value_text(value_field, value))
+                node.add_leaf(label)
+
+    def _add_json(self, node: TreeNode[_Entry], value: Any) -> None:
+        """Blackbox messages are dicts and lists"""
+        items = value.items() if isinstance(value, dict) else enumerate(value)
+
+        for key, item in items:
+            label = Text(f"{key}: ")
+
+            if isinstance(item, (dict, list)):
+                label.append(self._json_summary(item))
+                node.add(label, self._entry(item), allow_expand=bool(item))
+            else:
+                label.append(json.dumps(item, ensure_ascii=False), style=Style(color="grey70"))
+                node.add_leaf(label)
+
+    @staticmethod
+    def _json_summary(value: Any) -> Text:
+        if isinstance(value, dict):
+            return Text(f"{{{len(value)} field{'s' if len(value) != 1 else ''}}}", style=TYPE)
+        if isinstance(value, list):
+            return Text(f"[{len(value)} item{'s' if len(value) != 1 else ''}]", style=TYPE)
+        return Text(json.dumps(value, ensure_ascii=False))
@@ -1,7 +1,6 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import TYPE_CHECKING, Iterable
+from typing import TYPE_CHECKING
 
 from rich.console import Group
 from rich.padding import Padding
@@ -16,11 +15,13 @@ from textual.reactive import reactive, Reactive
 from textual.widget import Widget
 from textual.widgets import Static
 
-from trafficlight.proto_utils import get_method_text, REQUEST_HEADER
-from .models import NoPostStatic, Mode, HOVER_CLASS
+from trafficlight.proto_utils import get_method_text
+from .models import NoPostStatic, HOVER_CLASS
+from .records import get_message_summary
 
 if TYPE_CHECKING:
     from trafficlight.proto_utils import Proto, Message as ProtoMessage
+    from .records import Record
 
 
 class ProtoContainer(Container):
@@ -30,6 +31,9 @@ class ProtoContainer(Container):
 class ProtoWidget(NoPostStatic):
     mouse_over: Reactive[bool] = reactive(False)
 
+    # message previews are formatted for the widget's width, rounded up to this so resizing rarely rebuilds them
+    PREVIEW_STEP = 64
+
     class Clicked(Message):
         """Inspect this proto"""
 
@@ -42,70 +46,43 @@ class ProtoWidget(NoPostStatic):
         self._proto: Proto = proto
 
         self._middle_column_text = Padding("|", (0, 1))
-        self.plain_text: str = ""
-        self._content: Group = self._get_content(proto)
-
-    @property
-    def method_name(self) -> str:
-        return self._proto.method_name if self._proto.method_name is not None else "Unknown Method"
-
-    @property
-    def proxy_method_name(self) -> str:
-        return (
-            self._proto.proxy.method_name
-            if self._proto.proxy is not None and self._proto.proxy.method_name is not None
-            else ""
-        )
-
-    @property
-    def message_names(self) -> Iterable[str]:
-        for message in self._proto.messages:
-            if message.name:
-                yield message.name.casefold()
-
-        if self._proto.proxy:
-            for message in self._proto.proxy.messages:
-                if message.name:
-                    yield message.name.casefold()
-
-    def _get_content(self, this_proto: Proto) -> Group:
+        self._content: Group | None = None
+        self._content_width: int = 0
+
+    def get_content(self, width: int) -> Group:
+        # building the content decodes the messages, so only do it once it's actually shown. The previews are
+        # cached on the messages, so building it again for another filter or a wider screen is cheap
+        if self._content is None or width > self._content_width:
+            self._content_width = -(-max(width, 1) // self.PREVIEW_STEP) * self.PREVIEW_STEP
+            self._content = self._get_content(self._proto, self._content_width)
+        return self._content
+
+    def _get_content(self, this_proto: Proto, width: int) -> Group:
         text = get_method_text(this_proto)
         text.append("\n")
-        self.plain_text += text.plain
 
         table = Table.grid(Column(), Column(), Column())
-        self._make_message_text(this_proto.request, table)
-        self._make_message_text(this_proto.response, table)
+        self._make_message_text(this_proto.request, table, width)
+        self._make_message_text(this_proto.response, table, width)
 
         if this_proto.proxy:
-            proxy_group = self._get_content(this_proto.proxy)
+            proxy_group = self._get_content(this_proto.proxy, width)
             table.add_row()
             table.add_row("Proxy", self._middle_column_text, proxy_group)
 
         return Group(text, table)
 
-    def _make_message_text(self, message: ProtoMessage, table: Table) -> None:
-        if message.name is None:
-            name = f"[Unknown Message]"
-            data = f"Blackbox: {message.blackbox}"
-        else:
-            name = message.name
-            if message.payload is None:
-                data = f"Error decoding message. Blackbox: {message.blackbox}"
-            elif len(message.payload.ListFields()) == 0:
-                data = "{}"
-            else:
-                data = message.to_string()
+    def _make_message_text(self, message: ProtoMessage, table: Table, width: int) -> None:
+        name, data = get_message_summary(message, width)
 
         text = Text(no_wrap=True)
         text.append(name + "\n")
         text.append(data, style=Style(color="grey50"))
-        self.plain_text += text.plain
         table.add_row(message.type, self._middle_column_text, text)
 
     def render(self) -> Group:
         self.set_class(self.mouse_over, HOVER_CLASS)
-        return self._content
+        return self.get_content(self.size.width)
 
     async def on_enter(self) -> None:
         self.mouse_over = True
@@ -118,71 +95,17 @@ class ProtoWidget(NoPostStatic):
 
 
 class RequestWidget(Widget):
-    text: Text
+    """The widget for a record that's currently on screen. Only the protos matching the filter are created"""
 
-    def __init__(self, time: datetime, rpc_id: int, rpc_status: int, protos: list[Proto], rpc_handle: int | None = None):
+    def __init__(self, record: Record, shown: list[int], first_only: bool = False):
         super().__init__()
 
-        self.protos: list[ProtoWidget] = []
-        self._composed: bool = False
-
-        self._rpc_id: int = rpc_id
-        self._rpc_status: int = rpc_status
-        self._rpc_handle: int | None = rpc_handle
-        self._time: datetime = time
-
-        self.make_text()
-
-        for proto in protos:
-            self.protos.append(ProtoWidget(proto))
-
-    def make_text(self) -> None:
-        self.text = Text("\n", no_wrap=True)
-        self.text.append(self._time.strftime("%H:%M:%S"), style=REQUEST_HEADER)
-        self.text.append(" | ")
-        self.text.append(f"RPC ID {self._rpc_id}", style=REQUEST_HEADER)
-        self.text.append(" | ")
-        self.text.append(f"RPC Status {self._rpc_status}", style=REQUEST_HEADER)
-
-        if self._rpc_handle is not None:
-            self.text.append(" | ")
-            self.text.append(f"RPC Handle {self._rpc_handle}", style=REQUEST_HEADER)
-
-        self.text.append("\n")
+        self.record: Record = record
+        self.text: Text = Text() if first_only else record.header
+        self.protos: list[ProtoWidget] = [ProtoWidget(record.protos[index]) for index in shown]
 
     def compose(self) -> ComposeResult:
         yield NoPostStatic(self.text, id="request-head")
         for proto in self.protos:
             yield proto
         yield Static(Rule(style=Style(color="grey15")))
-        self._composed = True
-
-    def update_head(self) -> None:
-        if self._composed:
-            self.query_one("#request-head", NoPostStatic).update(self.text)
-
-    def filter(self, mode: Mode, first_only: bool, text: str) -> None:
-        self.display = False
-
-        if first_only:
-            self.text = Text()
-            self.update_head()
-
-            for proto in self.protos[1:]:
-                proto.display = False
-        elif not self.text:
-            self.make_text()
-            self.update_head()
-
-        for proto in self.protos[: 1 if first_only else None]:
-            if mode == Mode.FILTER_METHODS:
-                proto.display = text in proto.method_name.casefold() or text in proto.proxy_method_name.casefold()
-            elif mode == Mode.FILTER_MESSAGES:
-                proto.display = text in "".join(proto.message_names)
-            elif mode == Mode.FILTER_TEXT:
-                proto.display = text in self.text.plain.casefold() or text in proto.plain_text.casefold()
-            else:
-                proto.display = True
-
-            if proto.display:
-                self.display = True
@@ -1,10 +1,19 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Iterable
+import asyncio
+import traceback
+from bisect import bisect_left, bisect_right
+from typing import TYPE_CHECKING, Callable, Iterable
 
 from textual.containers import Vertical
+from textual.timer import Timer
 
-from .models import Toggle
+from trafficlight.config import config
+from trafficlight.proto_utils import Query, QueryError, compile_query
+from .filter_index import FilterIndex
+from .models import Mode, Toggle
+from .records import Record, RecordStore
+from .text_search import Match, SearchJob, TextSearch
 from .widget_request import RequestWidget
 
 if TYPE_CHECKING:
@@ -12,25 +21,505 @@ if TYPE_CHECKING:
 
 
 class ScreenWidget(Vertical):
+    """The request log.
+
+    All records live in a RecordStore, only a window of the ones matching the filter has widgets. The window
+    moves along when scrolling close to its edges, so the DOM stays small no matter how long the log gets.
+    """
+
     app: TrafficLightGui
 
-    def _filter_requests(self, requests: Iterable[RequestWidget]) -> None:
-        text = self.app.filter_text.casefold().strip()
-        first_only = self.app.toggles[Toggle.FIRST_PROTO_ONLY]
+    # how many records have widgets, and by how many records the window moves at once
+    WINDOW_SIZE = 60
+    WINDOW_STEP = 20
+
+    # after an edit of the filter text that can't just narrow down the current matches, the whole log is only
+    # filtered again once there was no other edit for this long
+    FILTER_DELAY = 0.15
+
+    def __init__(self):
+        super().__init__()
+        self.records: RecordStore = RecordStore(max_records=config.ui_max_records, max_bytes=config.ui_max_bytes)
+        self.index: FilterIndex = FilterIndex(self.records)
+        self.text_search: TextSearch = TextSearch(self.index)
+        self._search_task: asyncio.Task | None = None
+        # matches new records in the search worker, for filters that have to decode them
+        self._match_task: asyncio.Task | None = None
+        # records with lower ids were matched against the current filter already, or are being searched
+        self._matched_until: int = 0
+        # changes whenever the filter is applied again, results for an older one are thrown away
+        self._generation: int = 0
+
+        # record id -> indexes of its protos that match the filter
+        self._matches: dict[int, list[int]] = {}
+        # ids of all matching records, oldest first
+        self._visible: list[int] = []
+
+        # widgets for self._visible[self._start:self._start + len(self._mounted)]
+        self._mounted: list[RequestWidget] = []
+        self._start: int = 0
+        # everything changing the window has to wait for other changes to finish
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+        # the widget at the top of the view and how far it's scrolled past. Widgets being added or removed
+        # above it would make the view jump, so the scroll position follows it around
+        self._anchor: tuple[RequestWidget, int] | None = None
+        self._adjusting: bool = False
+
+        # mode, first only toggle and text of the filter self._visible was built with
+        self._applied: tuple[Mode, bool, str] | None = None
+        # compiled text in Mode.FILTER_QUERY
+        self._query: Query | None = None
+        # first only toggle the widgets were built with
+        self._shown_first_only: bool = False
+        self._filter_timer: Timer | None = None
+
+    def on_mount(self) -> None:
+        self._applied = self._filter_args()
+        self._shown_first_only = self._applied[1]
+
+    def on_unmount(self) -> None:
+        self.text_search.shutdown()
+
+    @property
+    def _end(self) -> int:
+        return self._start + len(self._mounted)
+
+    @property
+    def visible_count(self) -> int:
+        return len(self._visible)
+
+    @property
+    def _filter_text(self) -> str:
+        return self.app.filter_text.casefold().strip()
+
+    def _filter_args(self) -> tuple[Mode, bool, str]:
+        return self.app.current_mode, self.app.toggles[Toggle.FIRST_PROTO_ONLY], self._filter_text
+
+    def _match(self, record: Record) -> list[int]:
+        mode, first_only, text = self._filter_args()
+        return record.filter(mode=mode, first_only=first_only, text=text, query=self._query)
+
+    def _matcher(self) -> Callable[[Record], list[int]]:
+        """_match for the worker thread, it can't look at the app's current filter"""
+        mode, first_only, text = self._filter_args()
+        query = self._query
+        return lambda record: record.filter(mode=mode, first_only=first_only, text=text, query=query)
+
+    def _matching_decodes(self) -> bool:
+        mode, _, text = self._filter_args()
+        return (mode == Mode.FILTER_TEXT and bool(text)) or (mode == Mode.FILTER_QUERY and self._query is not None)
+
+    def _make_widget(self, record_id: int) -> RequestWidget:
+        # only live records are visible, _evict drops the others
+        record = self.records.get(record_id)
+        assert record is not None
+        return RequestWidget(
+            record,
+            self._matches[record_id],
+            first_only=self.app.toggles[Toggle.FIRST_PROTO_ONLY],
+        )
+
+    def _first_shown(self) -> int | None:
+        """Index in self._mounted of the first widget that's at least partially on screen"""
+        for index, widget in enumerate(self._mounted):
+            region = widget.virtual_region
+            if region.y + region.height > self.scroll_y:
+                return index
+        return None
+
+    def _scroll_to(self, y: float) -> None:
+        self._adjusting = True
+        try:
+            self.scroll_to(y=y, animate=False)
+        finally:
+            self._adjusting = False
+
+    def _update_anchor(self) -> None:
+        index = self._first_shown()
+        if index is None:
+            self._anchor = None
+        else:
+            widget = self._mounted[index]
+            self._anchor = widget, round(self.scroll_y) - widget.virtual_region.y
+
+    def _restore_anchor(self) -> None:
+        if self.app.toggles[Toggle.FOLLOW]:
+            self.scroll_end(animate=False)
+            return
+
+        if self._anchor is None:
+            return
+        widget, offset = self._anchor
+        region = widget.virtual_region
+        if region.area and widget in self._mounted and region.y + offset != self.scroll_y:
+            self._scroll_to(region.y + offset)
+
+    def watch_scroll_y(self, new_value: float) -> None:
+        super().watch_scroll_y(new_value)
+        if not self._adjusting:
+            self._update_anchor()
+        self.call_later(self._move_window)
+
+    def watch_virtual_size(self, _) -> None:
+        # widgets were added, removed or changed their size
+        self._restore_anchor()
+
+    async def _remove(self, widgets: list[RequestWidget]) -> None:
+        if widgets:
+            await asyncio.gather(*(widget.remove() for widget in widgets))
+
+    async def _remove_start(self, count: int) -> None:
+        """Remove the first count widgets, without moving the ones below on screen"""
+        if count <= 0:
+            return
+
+        removed, self._mounted = self._mounted[:count], self._mounted[count:]
+        self._start += count
+
+        if self._mounted and removed[0].virtual_region.area and self._mounted[0].virtual_region.area:
+            # the size of the log doesn't change if just as much is added at the end, so scroll right away
+            height = self._mounted[0].virtual_region.y - removed[0].virtual_region.y
+            self._scroll_to(self.scroll_y - height)
+        await self._remove(removed)
+
+    async def _remove_end(self, count: int) -> None:
+        if count <= 0:
+            return
+
+        removed, self._mounted = self._mounted[-count:], self._mounted[:-count]
+        await self._remove(removed)
+
+    async def _set_window(self, start: int) -> None:
+        await self._remove(self._mounted)
+
+        self._start = max(0, min(start, len(self._visible) - self.WINDOW_SIZE))
+        self._mounted = [
+            self._make_widget(record_id) for record_id in self._visible[self._start : self._start + self.WINDOW_SIZE]
+        ]
+        self._anchor = None
+        if self._mounted:
+            await self.mount(*self._mounted)
+
+    async def _extend_end(self, count: int) -> None:
+        widgets = [self._make_widget(record_id) for record_id in self._visible[self._end : self._end + count]]
+        if widgets:
+            self._mounted.extend(widgets)
+            await self.mount(*widgets)
+
+    async def _extend_start(self, count: int) -> None:
+        new_start = max(0, self._start - count)
+        widgets = [self._make_widget(record_id) for record_id in self._visible[new_start : self._start]]
+        if widgets:
+            first = self._mounted[0]
+            self._mounted[0:0] = widgets
+            self._start = new_start
+            await self.mount(*widgets, before=first)
+
+    async def _move_window(self) -> None:
+        """Move the window along if the view got close to one of its edges"""
+        if self._lock.locked() or not self._mounted:
+            return
+
+        async with self._lock:
+            margin = self.size.height
 
-        for request in requests:
-            request.filter(mode=self.app.current_mode, first_only=first_only, text=text)
+            if len(self._mounted) > self.WINDOW_SIZE:
+                # left over from adding widgets at the start. They're removed separately, otherwise the size
+                # of the log might not change and the view wouldn't be moved along with the added widgets
+                await self._remove_end(len(self._mounted) - self.WINDOW_SIZE)
+            elif self.scroll_y < margin and self._start > 0:
+                await self._extend_start(self.WINDOW_STEP)
+            elif (
+                self.max_scroll_y - self.scroll_y < margin
+                and self._end < len(self._visible)
+                and not self.app.toggles[Toggle.FOLLOW]
+            ):
+                # when following, new records are shown as part of adding them
+                await self._extend_end(self.WINDOW_STEP)
+                await self._remove_start(len(self._mounted) - self.WINDOW_SIZE)
+            else:
+                return
 
-    def filter(self) -> None:
-        self._filter_requests((c for c in self.children if isinstance(c, RequestWidget)))
+        # scrolling fast can need more than one step
+        self.call_after_refresh(self._move_window)
 
-    async def add_requests(self, requests: list[RequestWidget]) -> None:
-        self._filter_requests(requests)
-        await self.mount(*requests)
+    async def _follow(self) -> None:
+        if len(self._visible) - self._start > 2 * self.WINDOW_SIZE:
+            # too far behind to move the window, start over at the end
+            await self._set_window(len(self._visible))
+        else:
+            await self._extend_end(len(self._visible) - self._end)
+            await self._remove_start(len(self._mounted) - self.WINDOW_SIZE)
 
+        self.scroll_end(animate=False)
+
+    async def _evict(self, evicted: list[Record]) -> None:
+        self.index.remove(evicted)
+        for record in evicted:
+            self._matches.pop(record.id, None)
+
+        # evicted records are always the oldest ones
+        count = bisect_right(self._visible, evicted[-1].id)
+        del self._visible[:count]
+
+        await self._remove_start(min(len(self._mounted), count - self._start))
+        self._start = max(0, self._start - count)
+
+    async def add_records(self, records: list[Record], update_window: bool = True) -> None:
+        """Add new records to the log. Without update_window, they only get widgets on the next update"""
+        async with self._lock:
+            evicted = self.records.add(records)
+            records = [record for record in records if self.records.get(record.id) is record]
+            self.index.add(records)
+            if evicted:
+                await self._evict(evicted)
+
+            if not self.text_search.running:
+                # otherwise they're matched once the search is done
+                self._match_new()
+
+            if update_window:
+                await self._show_new()
+
+    def _match_new(self) -> None:
+        """Match the records that arrived since the filter was last applied. Filters that have to decode them
+        match in the search worker, the matches are shown once they're back
+        """
+        if self._matching_decodes():
+            if self._match_task is None or self._match_task.done():
+                self._match_task = asyncio.create_task(self._match_in_worker())
+            return
+
+        until = self.records.next_id
+        records = self.index.iter_records(range(self._matched_until, until))
+        self._add_matches((record.id, self._match(record)) for record in records)
+        self._matched_until = until
+
+    async def _match_in_worker(self) -> None:
+        try:
+            while not self.text_search.running and self._matched_until < self.records.next_id:
+                generation, until = self._generation, self.records.next_id
+                records = list(self.index.iter_records(range(self._matched_until, until)))
+                matches = await self.text_search.match(records, self._matcher())
+
+                async with self._lock:
+                    # a search that started meanwhile matches these itself
+                    if generation != self._generation or self.text_search.running:
+                        continue
+                    self._add_matches(matches)
+                    self._matched_until = until
+                    await self._show_new()
+        except Exception as e:
+            # nothing awaits this task. The records stay unmatched until the filter is applied again
+            print(f"error matching new records: {e}")
+            traceback.print_exception(e)
+
+    def _add_matches(self, matches: Iterable[Match]) -> None:
+        """Add matches of records newer than all the others"""
+        for record_id, shown in matches:
+            if shown and self.records.get(record_id) is not None:
+                self._matches[record_id] = shown
+                self._visible.append(record_id)
+
+    async def update_window(self) -> None:
+        async with self._lock:
+            await self._show_new()
+
+    async def _show_new(self) -> None:
         if self.app.toggles[Toggle.FOLLOW]:
-            requests[-1].scroll_visible()
+            await self._follow()
+        elif len(self._mounted) < self.WINDOW_SIZE:
+            await self._extend_end(self.WINDOW_SIZE - len(self._mounted))
+
+    def _extends_applied(self, mode: Mode, first_only: bool, text: str) -> bool:
+        # every record matching the extended text also matched the old one. Not true for queries
+        return (
+            mode != Mode.FILTER_QUERY
+            and self._applied is not None
+            and self._applied[:2] == (mode, first_only)
+            and self._applied[2] in text
+        )
+
+    async def _filter_delayed(self) -> None:
+        # the timer runs this in its own task, stopping the timer now would cancel the filter
+        self._filter_timer = None
+        await self.filter()
+
+    async def filter(self, debounce: bool = False) -> None:
+        """Filter the log again. With debounce, a full pass is delayed until the filter text stops changing"""
+        if self._filter_timer is not None:
+            self._filter_timer.stop_no_wait()
+            self._filter_timer = None
+        if debounce and not self._extends_applied(*self._filter_args()):
+            self._filter_timer = self.set_timer(self.FILTER_DELAY, self._filter_delayed)
+            return
+
+        async with self._lock:
+            # the filter might have changed again while waiting for the lock
+            mode, first_only, text = self._filter_args()
+            extends = self._extends_applied(mode, first_only, text)
+            if debounce and not extends:
+                if self._filter_timer is None:
+                    self._filter_timer = self.set_timer(self.FILTER_DELAY, self._filter_delayed)
+                return
+
+            query = None
+            if mode == Mode.FILTER_QUERY and text:
+                try:
+                    query = compile_query(text)
+                except QueryError as e:
+                    # keep showing what the last valid query matched
+                    self.app.status_widget.error = f"Invalid query: {e}"
+                    return
+            self.app.status_widget.error = ""
+            self._query = query
+
+            # the matches of a search that's still running aren't complete
+            candidates: list[Record]
+            if extends and self._applied is not None and self._applied[2] and not self.text_search.running:
+                candidates = list(self.index.iter_records(self._visible))
+            elif mode == Mode.FILTER_TEXT and text:
+                candidates = list(self.records)
+            elif query is not None:
+                names = query.message_names
+                candidates = list(self.index.iter_records(self.index.with_messages(names) if names else None))
+            else:
+                candidates = list(self.index.iter_candidates(mode, text))
+
+            first_id = self._first_shown_id()
+            self._applied = mode, first_only, text
+            self._generation += 1
+            # everything up to here is matched as part of this
+            self._matched_until = self.records.next_id
+
+            if mode == Mode.FILTER_TEXT and text:
+                job = self.text_search.start(
+                    candidates, lambda record: record.filter(mode, first_only, text), first_only, text=text
+                )
+            elif query is not None:
+                job = self.text_search.start(
+                    candidates, lambda record: record.filter(mode, first_only, text, query=query), first_only
+                )
+            else:
+                self.text_search.cancel()
+                matches: dict[int, list[int]] = {}
+                visible: list[int] = []
+                for record in candidates:
+                    shown = self._match(record)
+                    if shown:
+                        matches[record.id] = shown
+                        visible.append(record.id)
+
+                await self._apply(matches, visible, first_only, first_id)
+                return
+
+        # the matches come in on their own, key handling shouldn't wait for them
+        self._search_task = asyncio.create_task(self._run_search(job, first_id))
+
+    def _first_shown_id(self) -> int | None:
+        index = self._first_shown()
+        return self._visible[self._start + index] if index is not None else None
+
+    async def _run_search(self, job: SearchJob, first_id: int | None) -> None:
+        try:
+            await self._show_search(job, first_id)
+        except Exception as e:
+            # nothing awaits this task. What was shown until then stays, but it's not everything that matches
+            print(f"error in text search: {e}")
+            traceback.print_exception(e)
+            self.text_search.finished(job)
+            if not job.cancelled:
+                self.app.status_widget.error = f"Search failed: {e}"
+                # so the next filter doesn't narrow down incomplete matches
+                self._applied = None
+
+    async def _show_search(self, job: SearchJob, first_id: int | None) -> None:
+        """Show the matches of a text search as they come in.
+
+        The current matches stay on screen until there are enough new ones to fill the window from where the
+        view is now, or until the search is done. Records added in the meantime are matched at the end.
+        """
+        matches: dict[int, list[int]] = {}
+        visible: list[int] = []
+        shown = False
+
+        async for chunk in job.results():
+            async with self._lock:
+                if job.cancelled:
+                    return
+
+                if shown:
+                    self._add_matches(chunk)
+                    await self._show_new()
+                    continue
+
+                for record_id, indexes in chunk:
+                    matches[record_id] = indexes
+                    visible.append(record_id)
+
+                position = bisect_left(visible, first_id) if first_id is not None else 0
+                if len(visible) - position >= self.WINDOW_SIZE and not self.app.toggles[Toggle.FOLLOW]:
+                    await self._apply(*self._live(matches, visible), job.first_only, first_id, changed=True)
+                    shown = True
+
+        async with self._lock:
+            if job.cancelled:
+                return
+            self.text_search.finished(job)
+
+            if not shown:
+                await self._apply(*self._live(matches, visible), job.first_only, first_id)
+            # records that arrived during the search
+            self._match_new()
+            await self._show_new()
+
+    def _live(self, matches: dict[int, list[int]], visible: list[int]) -> tuple[dict[int, list[int]], list[int]]:
+        """Drop matches of records that were evicted in the meantime"""
+        count = 0
+        while count < len(visible) and self.records.get(visible[count]) is None:
+            matches.pop(visible[count])
+            count += 1
+        return matches, visible[count:]
+
+    async def _apply(
+        self,
+        matches: dict[int, list[int]],
+        visible: list[int],
+        first_only: bool,
+        first_id: int | None,
+        changed: bool = False,
+    ) -> None:
+        """Show new matches, keeping the record with first_id in view if it still matches"""
+        changed = changed or self._shown_first_only != first_only or matches != self._matches
+        self._shown_first_only = first_only
+        if not changed:
+            return
+        self._matches, self._visible = matches, visible
+
+        if first_id is None or self.app.toggles[Toggle.FOLLOW]:
+            await self._set_window(len(self._visible) if self.app.toggles[Toggle.FOLLOW] else 0)
+            self._scroll_to(self.max_scroll_y if self.app.toggles[Toggle.FOLLOW] else 0)
+            return
+
+        # keep the record that was on top in view, or whatever comes after it now
+        position = bisect_left(self._visible, first_id)
+        await self._set_window(position - self.WINDOW_STEP)
+        if self._start <= position < self._end:
+            self._anchor = self._mounted[position - self._start], 0
+            self.call_after_refresh(self._restore_anchor)
+
+    async def clear(self) -> None:
+        self.text_search.cancel()
+        async with self._lock:
+            self.records.clear()
+            self.index.clear()
+            self._matches.clear()
+            self._visible.clear()
+            self._generation += 1
+            self._matched_until = self.records.next_id
 
-    def clear(self) -> None:
-        children = self.query(RequestWidget)
-        children.remove()
+            await self._remove(self._mounted)
+            self._mounted = []
+            self._start = 0
+            self._anchor = None